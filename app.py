@@ -1,22 +1,207 @@
 import logging
 import os
 import json
-from typing import List, Dict, Any
+import threading
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, Optional
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 
 # --- IMPORTS ---
 # Ensure pipeline.py exists and exports DataTransformer and dead_letter_path
 from pipeline import DataTransformer, dead_letter_path
-from embedding_v3 import EmbeddingModel
-from vectordb_v3 import VectorDatabase
+from state_store import IngestionState
+from retry_queue import RetryQueue
+from embedding_v3 import EmbeddingModel, EmbeddingCache, get_backend
+from vectordb_v3 import VectorDatabase, to_epoch
+from near_dupes import group_near_duplicates
+from vector_codec import VECTOR_FORMATS, NPZ_MEDIA_TYPE, encode_documents, decode_npz, document_vector
 
 # --- CONFIG & LOGGING ---
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("fault-tolerant-ingestion-pipeline")
 
-app = FastAPI(title="resilient-ingestion-pipeline")
 COLLECTION_NAME = "pipeline"
+# Incremental run_full: last ingested revision per _id
+STATE_DB_PATH = os.getenv("PIPELINE_STATE_DB", "output/ingestion_state.sqlite")
+# Embedding throughput: concurrent requests and optional rate budgets (0 = unpaced)
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+EMBED_RPM = float(os.getenv("EMBED_RPM", "0")) or None
+EMBED_TPM = float(os.getenv("EMBED_TPM", "0")) or None
+# Persistent embedding cache shared by all workers ("" disables it)
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "output/embedding_cache.sqlite")
+EMBED_CACHE_MAX_MB = int(os.getenv("EMBED_CACHE_MAX_MB", "1024"))
+# Documents whose embedding failed for good wait here for /pipeline/retry_failed
+RETRY_QUEUE_PATH = os.getenv("EMBED_RETRY_QUEUE", "output/embedding_retry_queue.sqlite")
+# Qdrant bulk upload: points per upsert request and requests in flight
+QDRANT_UPSERT_BATCH = int(os.getenv("QDRANT_UPSERT_BATCH", "256"))
+QDRANT_UPSERT_PARALLEL = int(os.getenv("QDRANT_UPSERT_PARALLEL", "4"))
+# Near-duplicate stage (?near_duplicates=true): MinHash similarity threshold, and
+# whether duplicates get metadata.duplicate_of = external_id of the embedded copy
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.9"))
+NEAR_DUP_LINK = os.getenv("NEAR_DUP_LINK", "1") == "1"
+# Embedding backend: "openai" (API), "sentence-transformers" or "onnx" (local CPU inference),
+# "hash" (offline deterministic vectors for benchmarks / CI)
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "openai")
+EMBED_LOCAL_MODEL = os.getenv("EMBED_LOCAL_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_THREADS = int(os.getenv("EMBED_THREADS", "0")) or None
+EMBED_PROCESSES = int(os.getenv("EMBED_PROCESSES", "0"))
+EMBED_ONNX_DIR = os.getenv("EMBED_ONNX_DIR", "output/onnx/all-MiniLM-L6-v2")
+EMBED_HASH_DIM = int(os.getenv("EMBED_HASH_DIM", "1536"))
+EMBED_HASH_LATENCY_MS = float(os.getenv("EMBED_HASH_LATENCY_MS", "0"))
+
+def make_backend():
+    """None for the OpenAI API, otherwise the configured local backend."""
+    if EMBED_BACKEND == "openai":
+        return None
+    if EMBED_BACKEND == "hash":
+        options = {"dimension": EMBED_HASH_DIM, "latency": EMBED_HASH_LATENCY_MS / 1000.0}
+    else:
+        options = {"model": EMBED_LOCAL_MODEL, "batch_size": EMBED_BATCH_SIZE, "num_threads": EMBED_THREADS}
+        if EMBED_BACKEND == "onnx":
+            options["model_dir"] = EMBED_ONNX_DIR
+        else:
+            options["processes"] = EMBED_PROCESSES
+    return get_backend(EMBED_BACKEND, **options)
+
+
+def queue_failed(failed: List[Any]) -> int:
+    """Parks (doc, reason) pairs in the retry queue instead of dropping them. Returns how many."""
+    failed = [(doc, reason) for doc, reason in failed if doc.get("metadata", {}).get("external_id")]
+    if not failed:
+        return 0
+    queue = RetryQueue(RETRY_QUEUE_PATH)
+    try:
+        for doc, reason in failed:
+            queue.push(doc["metadata"]["external_id"], doc, reason or "unknown")
+    finally:
+        queue.close()
+    return len(failed)
+
+
+def dequeue_indexed(docs: List[Dict[str, Any]]):
+    """
+    Drops freshly indexed documents from the retry queue, so /pipeline/retry_failed
+    never re-embeds an older failed version over them.
+    """
+    if not os.path.exists(RETRY_QUEUE_PATH):
+        return
+    queue = RetryQueue(RETRY_QUEUE_PATH)
+    try:
+        queue.remove(doc["metadata"]["external_id"] for doc in docs
+                     if doc.get("metadata", {}).get("external_id"))
+    finally:
+        queue.close()
+
+
+def embed_texts(embedder: EmbeddingModel, texts: List[str], near_duplicates: bool = False):
+    """
+    generate_embeddings, optionally sending only the first text of each
+    near-duplicate group and reusing its vector (and error) for the rest.
+    Returns (vectors, errors, representative, report); the last two are
+    None without near_duplicates.
+    """
+    if not near_duplicates:
+        vectors, errors = embedder.generate_embeddings(texts)
+        return vectors, errors, None, None
+
+    representative, report = group_near_duplicates(texts, NEAR_DUP_THRESHOLD)
+    unique = sorted(set(representative))
+    position = {idx: pos for pos, idx in enumerate(unique)}
+    unique_vectors, unique_errors = embedder.generate_embeddings([texts[i] for i in unique])
+    vectors = [unique_vectors[position[rep]] for rep in representative]
+    errors = {i: unique_errors[position[rep]] for i, rep in enumerate(representative) if position[rep] in unique_errors}
+    logger.info(f"Near-duplicates: {report}")
+    return vectors, errors, representative, report
+
+
+def link_near_duplicates(docs: List[Dict[str, Any]], representative: List[int]):
+    """metadata.duplicate_of = external_id of the document whose vector was reused."""
+    for doc, rep in zip(docs, representative):
+        if doc is not docs[rep]:
+            doc.setdefault("metadata", {})["duplicate_of"] = docs[rep].get("metadata", {}).get("external_id")
+
+
+def upload(vector_db: VectorDatabase, docs: List[Dict[str, Any]], bulk: bool = False) -> Dict[str, Any]:
+    """
+    Chunked, pipelined upsert (wait=False + final barrier) with the configured
+    batch size / parallelism. bulk=True pauses HNSW indexing during the upload
+    and waits for the rebuild, adding its timing to the report.
+    """
+    if not bulk:
+        return vector_db.upsert_documents(docs, batch_size=QDRANT_UPSERT_BATCH, parallel=QDRANT_UPSERT_PARALLEL,
+                                          wait=False)
+    with vector_db.bulk_load() as index_report:
+        report = vector_db.upsert_documents(docs, batch_size=QDRANT_UPSERT_BATCH, parallel=QDRANT_UPSERT_PARALLEL,
+                                            wait=False)
+    report.update(index_report)
+    return report
+
+
+def make_embedder() -> EmbeddingModel:
+    cache = EmbeddingCache(EMBED_CACHE_PATH, max_bytes=EMBED_CACHE_MAX_MB << 20) if EMBED_CACHE_PATH else None
+    return EmbeddingModel(max_concurrency=EMBED_CONCURRENCY, rpm=EMBED_RPM, tpm=EMBED_TPM, cache=cache,
+                          backend=make_backend())
+
+
+# --- SHARED CLIENTS ---
+# One EmbeddingModel (OpenAI client pool / local model) and one VectorDatabase
+# (Qdrant client pool) per process, so requests reuse keep-alive connections
+# instead of paying connection + TLS setup each time.
+_clients_lock = threading.Lock()
+
+
+def shared_embedder() -> EmbeddingModel:
+    """The process-wide embedder; built on first use if startup couldn't (e.g. no API key yet)."""
+    with _clients_lock:
+        if getattr(app.state, "embedder", None) is None:
+            app.state.embedder = make_embedder()
+        return app.state.embedder
+
+
+def shared_vector_db() -> VectorDatabase:
+    with _clients_lock:
+        if getattr(app.state, "vector_db", None) is None:
+            app.state.vector_db = VectorDatabase(collection_name=COLLECTION_NAME)
+        return app.state.vector_db
+
+
+def close_shared_clients():
+    with _clients_lock:
+        embedder = getattr(app.state, "embedder", None)
+        vector_db = getattr(app.state, "vector_db", None)
+        app.state.embedder = app.state.vector_db = None
+    if embedder is not None:
+        embedder.close()
+        if embedder.cache is not None:
+            embedder.cache.close()
+        if embedder.backend is not None:
+            embedder.backend.close()
+    if vector_db is not None:
+        vector_db.close()
+    logger.info("Closed shared embedding and Qdrant clients")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        shared_embedder()
+    except ValueError as e:
+        # Keep serving /pipeline/transform; embedding endpoints retry and report it
+        logger.warning(f"Embedder not available at startup: {e}")
+    shared_vector_db()
+    yield
+    close_shared_clients()
+
+
+app = FastAPI(title="resilient-ingestion-pipeline", lifespan=lifespan)
+
+
+def stats_delta(before: Dict[str, int], after: Dict[str, int]) -> Dict[str, int]:
+    """This request's share of the shared embedder's counters."""
+    return {key: after[key] - before.get(key, 0) for key in after}
 
 
 @app.get("/")
@@ -104,16 +289,28 @@ def api_transform_data(raw_data: List[Any]):  # 1. Use List[Any] to accept mixed
 # 2. EMBED ENDPOINT (Robust)
 # ==============================================================================
 @app.post("/pipeline/embed", response_model=List[Dict[str, Any]])
-def api_embed_documents(processed_docs: List[Any]): # 1. Use List[Any]
+def api_embed_documents(processed_docs: List[Any], vector_format: str = "float", ids_only: bool = False,
+                        near_duplicates: bool = False): # 1. Use List[Any]
+    """
+    vector_format: "float" (JSON lists), "base64" (float32 as "vector_b64")
+    or "npz" (binary body, see vector_codec). ids_only=true returns only
+    external_id + vector instead of echoing text and metadata back; that
+    output is for callers that keep the text themselves and cannot be sent
+    to /pipeline/index.
+    near_duplicates=true embeds one document per near-duplicate group.
+    """
     try:
         if not isinstance(processed_docs, list):
              raise HTTPException(status_code=400, detail="Input must be a list")
+        if vector_format not in VECTOR_FORMATS:
+            raise HTTPException(status_code=400, detail=f"vector_format must be one of: {', '.join(VECTOR_FORMATS)}")
 
-        embedder = EmbeddingModel()
+        embedder = shared_embedder()
         embedded_docs = []
 
         logger.info(f"Embedding {len(processed_docs)} items...")
 
+        to_embed = []
         for idx, doc in enumerate(processed_docs):
             # 2. Guard against garbage
             if not isinstance(doc, dict):
@@ -123,17 +320,32 @@ def api_embed_documents(processed_docs: List[Any]): # 1. Use List[Any]
             text = doc.get("text", "")
             if not text:
                 continue
-
-            try:
-                vector = embedder.generate_embedding(text)
-                doc["vector"] = vector
-                embedded_docs.append(doc)
-            except Exception as e:
-                logger.error(f"Failed to embed doc index {idx}: {e}")
+            to_embed.append((idx, doc))
+
+        # 3. One batched call; results come back in input order
+        vectors, errors, representative, _ = embed_texts(embedder, [doc["text"] for _, doc in to_embed], near_duplicates)
+        if representative is not None and NEAR_DUP_LINK:
+            link_near_duplicates([doc for _, doc in to_embed], representative)
+        failed = []
+        for pos, (idx, doc) in enumerate(to_embed):
+            if vectors[pos] is None:
+                logger.error(f"Failed to embed doc index {idx}: {errors.get(pos)}")
+                failed.append((doc, errors.get(pos)))
                 continue
+            doc["vector"] = vectors[pos]
+            embedded_docs.append(doc)
+        queue_failed(failed)
+        logger.info(f"Embedding stats (process total): {embedder.stats}")
+
+        if vector_format == "float" and not ids_only:
+            return embedded_docs
+        encoded = encode_documents(embedded_docs, vector_format, ids_only)
+        if vector_format == "npz":
+            return Response(content=encoded, media_type=NPZ_MEDIA_TYPE)
+        return encoded
 
-        return embedded_docs
-
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Embedding failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -142,29 +354,80 @@ def api_embed_documents(processed_docs: List[Any]): # 1. Use List[Any]
 # ==============================================================================
 # 3. INDEX ENDPOINT (Robust)
 # ==============================================================================
-@app.post("/pipeline/index")
-def api_index_documents(embedded_docs: List[Any]): # 1. Use List[Any]
+INDEX_BODY_SCHEMA = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {"schema": {"type": "array", "items": {"type": "object"}}},
+            NPZ_MEDIA_TYPE: {"schema": {"type": "string", "format": "binary"}},
+        },
+    }
+}
+
+
+@app.post("/pipeline/index", openapi_extra=INDEX_BODY_SCHEMA)
+async def api_index_documents(request: Request, recreate: bool = False, bulk: bool = False):
+    """
+    Body: a JSON array of embedded docs (`vector` list or `vector_b64`), or
+    the npz body of /pipeline/embed?vector_format=npz with
+    Content-Type: application/x-npz.
+    Upserts into the existing collection; recreate=true drops it first.
+    bulk=true (backfills) defers HNSW indexing until the upload is done.
+    """
+    body = await request.body()
+    try:
+        if request.headers.get("content-type", "").startswith(NPZ_MEDIA_TYPE):
+            embedded_docs = decode_npz(body)
+        else:
+            embedded_docs = json.loads(body)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Unreadable body: {e}")
+    return await run_in_threadpool(index_documents, embedded_docs, recreate, bulk)
+
+
+def index_documents(embedded_docs: List[Any], recreate: bool = False, bulk: bool = False):
     try:
         if not isinstance(embedded_docs, list):
              raise HTTPException(status_code=400, detail="Input must be a list")
 
-        # 2. Filter valid docs immediately
-        valid_inputs = [d for d in embedded_docs if isinstance(d, dict) and d.get("vector")]
+        # 2. Filter valid docs immediately (vectors may arrive as base64)
+        valid_inputs = []
+        textless = 0
+        for d in embedded_docs:
+            if not isinstance(d, dict):
+                continue
+            vector = document_vector(d)
+            if vector:
+                if not d.get("text"):
+                    textless += 1
+                    continue
+                d.pop("vector_b64", None)
+                d["vector"] = vector
+                valid_inputs.append(d)
+
+        # ids_only output from /pipeline/embed has nothing to store as the point payload
+        if textless:
+            raise HTTPException(status_code=422, detail=(
+                f"{textless} document(s) have a vector but no text; ids_only output from "
+                "/pipeline/embed cannot be indexed, embed without ids_only=true"))
 
         if not valid_inputs:
             return {"indexed": 0, "message": "No valid documents with vectors found"}
 
-        vector_db = VectorDatabase(collection_name=COLLECTION_NAME)
+        vector_db = shared_vector_db()
 
         # Check vector size from first valid doc
         sample_vector = valid_inputs[0].get("vector")
         vector_size = len(sample_vector) if sample_vector else 384
 
-        vector_db.get_or_create_collection(vector_size=vector_size)
-        vector_db.upsert_documents(valid_inputs)
+        vector_db.get_or_create_collection(vector_size=vector_size, recreate=recreate)
+        upload_report = upload(vector_db, valid_inputs, bulk)
+        dequeue_indexed(valid_inputs)
 
-        return {"indexed": len(valid_inputs)}
+        return {"indexed": upload_report["points"], "upload": upload_report}
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Indexing failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -174,13 +437,37 @@ def api_index_documents(embedded_docs: List[Any]): # 1. Use List[Any]
 # 4. FULL PIPELINE (Robust)
 # ==============================================================================
 @app.post("/pipeline/run_full")
-def api_run_full_pipeline(raw_data: List[Any]): # 1. Use List[Any]
+def api_run_full_pipeline(raw_data: List[Any], incremental: bool = False, near_duplicates: bool = False,
+                          recreate: bool = False, bulk: bool = False): # 1. Use List[Any]
+    """
+    Indexed documents are upserted in place by external_id; recreate=true
+    drops the collection first (full rebuild), bulk=true defers HNSW
+    indexing until the upload is done.
+    incremental=true skips documents whose revision was already indexed by a
+    previous call (state in PIPELINE_STATE_DB); only indexed docs are recorded.
+    Nothing is skipped when the collection is (re)created by this call.
+    near_duplicates=true embeds one document per near-duplicate group and
+    reuses its vector for the others (see near_dupes.py).
+    """
+    state = None
     try:
         # --- STAGE 1: TRANSFORM ---
         transformer = DataTransformer()
         clean_docs = []
         # seen_ids = set()
         valid_docs_map = {}
+        raw_by_id = {}
+        skipped_unchanged = 0
+        if incremental:
+            state = IngestionState(STATE_DB_PATH)
+            # The state only vouches for points that are still in Qdrant: after a
+            # drop (recreate=true, or a collection deleted behind our back) every
+            # document has to go through again, so nothing is skipped this run.
+            if recreate or not shared_vector_db().collection_exists(cached=False):
+                logger.info("🔁 Incremental run on a new collection: re-indexing every document")
+                skip_unchanged = False
+            else:
+                skip_unchanged = True
 
         if not isinstance(raw_data, list):
              raise HTTPException(status_code=400, detail="Input must be a list")
@@ -190,6 +477,15 @@ def api_run_full_pipeline(raw_data: List[Any]): # 1. Use List[Any]
         if output_dir:
             os.makedirs(output_dir, exist_ok=True)
 
+        # Incremental runs keep only the last occurrence of each _id before the
+        # unchanged check: an older revision earlier in the batch must not be
+        # processed while the newer one is skipped as already indexed.
+        last_position = {}
+        if state is not None:
+            for idx, doc in enumerate(raw_data):
+                if isinstance(doc, dict) and doc.get('_id') is not None:
+                    last_position[str(doc['_id'])] = idx
+
         for idx, doc in enumerate(raw_data):
             # 2. Guard against garbage
             if not isinstance(doc, dict):
@@ -199,6 +495,12 @@ def api_run_full_pipeline(raw_data: List[Any]): # 1. Use List[Any]
             doc_id = doc.get('_id')
             # if doc_id in seen_ids: continue
             # if doc_id: seen_ids.add(doc_id)
+            if doc_id is not None and last_position.get(str(doc_id), idx) != idx:
+                continue
+
+            if state is not None and skip_unchanged and state.is_unchanged(doc):
+                skipped_unchanged += 1
+                continue
 
             res, report = transformer.process_document(doc)
             if res:
@@ -210,6 +512,7 @@ def api_run_full_pipeline(raw_data: List[Any]): # 1. Use List[Any]
                         logger.info(f"   🔄 UPDATING: Overwriting existing record for ID {ext_id}")
                     
                     valid_docs_map[ext_id] = res
+                    raw_by_id[ext_id] = doc
                 
             else:
                 # Log failures
@@ -224,48 +527,136 @@ def api_run_full_pipeline(raw_data: List[Any]): # 1. Use List[Any]
         clean_docs = list(valid_docs_map.values())
         
         if not clean_docs:
-            return {"processed": 0, "indexed": 0}
+            return {"processed": 0, "indexed": 0, "skipped_unchanged": skipped_unchanged}
 
         # --- STAGE 2: EMBED ---
-        embedder = EmbeddingModel()
+        embedder = shared_embedder()
+        stats_before = dict(embedder.stats)
         embedded_docs = []
-        for doc in clean_docs:
-            try:
-                doc["vector"] = embedder.generate_embedding(doc.get("text", ""))
-                embedded_docs.append(doc)
-            except Exception as e:
-                logger.error(f"RunFull: Embedding failed for doc {doc.get('external_id')}: {e}")
+        failed = []
+        vectors, errors, representative, dedupe_report = embed_texts(
+            embedder, [doc.get("text", "") for doc in clean_docs], near_duplicates)
+        if representative is not None and NEAR_DUP_LINK:
+            link_near_duplicates(clean_docs, representative)
+        for pos, doc in enumerate(clean_docs):
+            if vectors[pos] is None:
+                logger.error(f"RunFull: Embedding failed for doc {doc['metadata'].get('external_id')}: {errors.get(pos)}")
+                failed.append((doc, errors.get(pos)))
                 continue
+            doc["vector"] = vectors[pos]
+            embedded_docs.append(doc)
+        queued = queue_failed(failed)
 
         # --- STAGE 3: INDEX ---
+        upload_report = None
         if embedded_docs:
-            vector_db = VectorDatabase(collection_name=COLLECTION_NAME)
-            vector_db.get_or_create_collection(vector_size=len(embedded_docs[0]["vector"]))
-            vector_db.upsert_documents(embedded_docs)
+            vector_db = shared_vector_db()
+            vector_db.get_or_create_collection(vector_size=embedder.vector_size, recreate=recreate)
+            upload_report = upload(vector_db, embedded_docs, bulk)
+            dequeue_indexed(embedded_docs)
+
+            # Only what actually reached the index counts as ingested
+            if state is not None:
+                for doc in embedded_docs:
+                    state.record(raw_by_id[doc["metadata"]["external_id"]])
 
         return {
             "processed": len(clean_docs),
-            "indexed": len(embedded_docs)
+            "indexed": len(embedded_docs),
+            "skipped_unchanged": skipped_unchanged,
+            "queued_for_retry": queued,
+            "embedding_stats": stats_delta(stats_before, embedder.stats),
+            "near_duplicates": dedupe_report,
+            "upload": upload_report,
         }
 
     except Exception as e:
         logger.error(f"Pipeline failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if state is not None:
+            state.close()
+
+
+# ==============================================================================
+# 5. RETRY QUEUE
+# ==============================================================================
+@app.post("/pipeline/retry_failed")
+def api_retry_failed(limit: int = 100):
+    """
+    Re-embeds up to `limit` queued documents (oldest first) and indexes the
+    ones that now succeed. The rest stay queued with their attempt count bumped.
+    """
+    queue = RetryQueue(RETRY_QUEUE_PATH)
+    try:
+        items = queue.pending(limit)
+        if not items:
+            return {"retried": 0, "indexed": 0, "still_failing": 0, "pending": 0}
+
+        embedder = shared_embedder()
+        stats_before = dict(embedder.stats)
+        vectors, errors = embedder.generate_embeddings([doc.get("text", "") for _, doc, _ in items])
+        embedded_docs, done = [], []
+        for pos, (doc_id, doc, attempts) in enumerate(items):
+            if vectors[pos] is None:
+                logger.warning(f"Retry {attempts + 1} failed for doc {doc_id}: {errors.get(pos)}")
+                queue.push(doc_id, doc, errors.get(pos) or "unknown")
+                continue
+            doc["vector"] = vectors[pos]
+            embedded_docs.append(doc)
+            done.append(doc_id)
+
+        if embedded_docs:
+            vector_db = shared_vector_db()
+            vector_db.get_or_create_collection(vector_size=embedder.vector_size)
+            upload(vector_db, embedded_docs)
+            queue.remove(done)
+
+        return {
+            "retried": len(items),
+            "indexed": len(embedded_docs),
+            "still_failing": len(items) - len(embedded_docs),
+            "pending": len(queue),
+            "embedding_stats": stats_delta(stats_before, embedder.stats),
+        }
+    except Exception as e:
+        logger.error(f"Retry failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        queue.close()
 
 
 # ==============================================================================
 # SEARCH ENDPOINT (Safe)
 # ==============================================================================
 @app.get("/search")
-def api_search(query: str, k: int = 3):
+def api_search(query: str, k: int = 3, website: Optional[List[str]] = Query(None),
+               section: Optional[List[str]] = Query(None), category: Optional[List[str]] = Query(None),
+               tag: Optional[List[str]] = Query(None), since: Optional[str] = None,
+               until: Optional[str] = None):
+    """
+    Filters (repeatable, e.g. ?section=News&section=Politics) match any of
+    their values; different filters must all match. since / until limit
+    metadata.datetime to a window (epoch seconds, ISO 8601, or an age such
+    as ?since=24h). They run inside Qdrant's search, so k results come back
+    whenever k documents match.
+    """
+    for name, value in (("since", since), ("until", until)):
+        if value and to_epoch(value) is None:
+            raise HTTPException(status_code=400, detail=f"Unrecognised {name} value '{value}'")
     try:
-        embedder = EmbeddingModel()
+        # Same backend as ingestion, so the query lands in the same vector space
+        embedder = shared_embedder()
         query_vector = embedder.generate_embedding(query)
+        if not query_vector:
+            raise HTTPException(status_code=503, detail="Could not embed the query, try again later")
 
-        vector_db = VectorDatabase(collection_name=COLLECTION_NAME)
-        results = vector_db.search(query_vector, limit=k)
+        results = shared_vector_db().search(query_vector, limit=k, website=website, sections=section,
+                                            categories=category, tags=tag, since=since, until=until)
 
         return results
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Search failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,75 @@
+"""
+Local embedding throughput: full-precision sentence-transformers vs the
+int8-quantized ONNX export of the same model.
+
+Embeds the transformed texts of data/raw_customer_api.json with both
+backends, reports texts/second, and checks the quantized vectors still
+point the same way (cosine similarity per document against the
+full-precision vector).
+
+Needs sentence-transformers, onnxruntime and transformers. The first run
+exports the model to --onnx-dir.
+
+Run from the repo root:
+    python benchmarks/bench_embedding_backends.py
+    python benchmarks/bench_embedding_backends.py --repeat 5 --batch-size 32 --threads 4
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import DataTransformer
+from embedding_v3 import get_backend
+
+
+def texts_per_second(backend, texts, repeat):
+    backend.embed(texts[:backend.batch_size])  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        vectors = backend.embed(texts)
+    return repeat * len(texts) / (time.perf_counter() - start), np.asarray(vectors, dtype=np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", default="data/raw_customer_api.json")
+    parser.add_argument("--model", default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--onnx-dir", default="output/onnx/all-MiniLM-L6-v2")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args()
+
+    with open(args.input, "r", encoding="utf-8") as f:
+        raw_data = json.load(f)
+    transformer = DataTransformer(log_every=0)
+    texts = [doc["text"] for doc in (transformer.process_document(d)[0] for d in raw_data) if doc]
+
+    common = {"model": args.model, "batch_size": args.batch_size, "num_threads": args.threads}
+    backends = {
+        "torch fp32": get_backend("sentence-transformers", **common),
+        "onnx fp32": get_backend("onnx", model_dir=args.onnx_dir, quantized=False, **common),
+        "onnx int8": get_backend("onnx", model_dir=args.onnx_dir, **common),
+    }
+
+    print(f"{len(texts)} texts, batch size {args.batch_size}, threads {args.threads or 'default'}")
+    print(f"{'backend':>10} | {'texts/s':>9} | {'speedup':>7} | {'cos mean':>8} | {'cos min':>7}")
+    print("-" * 55)
+    baseline_rate = reference = None
+    for name, backend in backends.items():
+        rate, vectors = texts_per_second(backend, texts, args.repeat)
+        if reference is None:
+            baseline_rate, reference = rate, vectors
+        # Both sides are L2-normalized, so the row-wise dot product is the cosine
+        cosines = (vectors * reference).sum(axis=1)
+        print(f"{name:>10} | {rate:>9.1f} | {rate / baseline_rate:>6.2f}x | {cosines.mean():>8.4f} | {cosines.min():>7.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Per-document cost of building the output under each validation mode.
+
+Runs DataTransformer.process_document over the documents in
+data/raw_customer_api.json with validate="always" (every output built
+through MetadataModel / QdrantDocument), "sampled" (1 in --validate-every)
+and "off" (trusted fast path), after checking all three give identical
+output.
+
+Run from the repo root:
+    python benchmarks/bench_output_validation.py
+    python benchmarks/bench_output_validation.py --repeat 20 --validate-every 1000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import DataTransformer, MetadataModel, QdrantDocument, VALIDATION_MODES
+
+
+def time_per_doc(transformer, raw_data, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for doc in raw_data:
+            transformer.process_document(doc)
+    return (time.perf_counter() - start) / (repeat * len(raw_data))
+
+
+def time_output_build(transformer, raw_data, repeat):
+    """Only the validate / build step: extraction is done once up front."""
+    processed = [transformer.process_document(doc)[0] for doc in raw_data]
+    processed = [(p["text"], p["metadata"]) for p in processed if p]
+    validate = transformer._should_validate
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text, metadata in processed:
+            if validate():
+                QdrantDocument(text=text, metadata=MetadataModel(**metadata)).model_dump(exclude_none=True)
+            else:
+                {"text": text, "metadata": metadata}
+    return (time.perf_counter() - start) / (repeat * len(processed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", default="data/raw_customer_api.json")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--validate-every", type=int, default=100)
+    args = parser.parse_args()
+
+    with open(args.input, "r", encoding="utf-8") as f:
+        raw_data = json.load(f)
+
+    transformers = {
+        # cache_size=0: every repeat parses the HTML again instead of hitting the fragment cache
+        mode: DataTransformer(validate=mode, validate_every=args.validate_every, log_every=0, cache_size=0)
+        for mode in VALIDATION_MODES
+    }
+    outputs = {mode: [t.process_document(doc)[0] for doc in raw_data] for mode, t in transformers.items()}
+    for mode in VALIDATION_MODES[1:]:
+        assert outputs[mode] == outputs["always"], f"Output mismatch for validate={mode}"
+
+    print(f"{'validate':>8} | {'build us/doc':>12} | {'total us/doc':>12} | {'build speedup':>13}")
+    print("-" * 56)
+    baseline = None
+    for mode, transformer in transformers.items():
+        build_t = time_output_build(transformer, raw_data, args.repeat)
+        total_t = time_per_doc(transformer, raw_data, args.repeat)
+        baseline = baseline or build_t
+        print(f"{mode:>8} | {build_t * 1e6:>12.1f} | {total_t * 1e6:>12.1f} | {baseline / build_t:>12.1f}x")
+
+
+if __name__ == "__main__":
+    main()
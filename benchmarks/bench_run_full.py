@@ -0,0 +1,78 @@
+"""
+Offline throughput of POST /pipeline/run_full.
+
+Replicates the documents of data/raw_customer_api.json --scale times (fresh
+_ids, so nothing is deduplicated away), then posts them to run_full through
+FastAPI's TestClient with the deterministic "hash" embedding backend and an
+in-memory Qdrant. No OpenAI key or Qdrant server is needed; --latency-ms
+adds a simulated round trip per embedding request.
+
+Run from the repo root:
+    python benchmarks/bench_run_full.py
+    python benchmarks/bench_run_full.py --scale 50 --dims 1536 --latency-ms 200 --batch-size 64
+"""
+import argparse
+import copy
+import functools
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def scaled_corpus(raw_data, scale):
+    docs = []
+    for copy_idx in range(scale):
+        for raw in raw_data:
+            doc = copy.deepcopy(raw)
+            if isinstance(doc, dict) and doc.get("_id"):
+                doc["_id"] = f"{doc['_id']}-{copy_idx}"
+            docs.append(doc)
+    return docs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", default="data/raw_customer_api.json")
+    parser.add_argument("--scale", type=int, default=20)
+    parser.add_argument("--dims", type=int, default=1536)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--batch-size", type=int, default=256, help="inputs per embedding request")
+    args = parser.parse_args()
+
+    # app.py reads its embedding settings at import time
+    os.environ.update({"EMBED_BACKEND": "hash", "EMBED_HASH_DIM": str(args.dims),
+                       "EMBED_HASH_LATENCY_MS": str(args.latency_ms), "EMBED_CACHE_PATH": ""})
+    from fastapi.testclient import TestClient
+    from qdrant_client import QdrantClient
+    import app
+    from embedding_v3 import EmbeddingModel
+    from vectordb_v3 import VectorDatabase
+
+    app.VectorDatabase = functools.partial(VectorDatabase, client=QdrantClient(":memory:"))
+    app.EmbeddingModel = functools.partial(EmbeddingModel, max_inputs_per_request=args.batch_size)
+
+    with open(args.input, "r", encoding="utf-8") as f:
+        raw_data = json.load(f)
+    docs = scaled_corpus(raw_data, args.scale)
+
+    client = TestClient(app.app)
+    start = time.perf_counter()
+    response = client.post("/pipeline/run_full", json=docs)
+    elapsed = time.perf_counter() - start
+    response.raise_for_status()
+    result = response.json()
+
+    print(f"{len(docs)} raw docs -> {result['indexed']} indexed, {args.dims} dims, "
+          f"{args.latency_ms:g} ms simulated latency per request of {args.batch_size}")
+    print(f"run_full: {elapsed:.2f} s, {result['indexed'] / elapsed:.1f} docs/s")
+    print(f"embedding: {result['embedding_stats']}")
+    upload = result["upload"] or {}
+    print(f"upload: {upload.get('points', 0)} points in {upload.get('batches', 0)} batches, "
+          f"{upload.get('total_seconds', 0):.2f} s (barrier {upload.get('barrier_seconds', 0):.3f} s)")
+
+
+if __name__ == "__main__":
+    main()
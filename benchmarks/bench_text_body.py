@@ -0,0 +1,93 @@
+"""
+Scaling benchmark for DataTransformer.get_text_body.
+
+Builds synthetic articles with an increasing number of paragraphs (cycled
+from the text elements in data/raw_customer_api.json) and times the
+single-pass body builder against get_text_body_legacy.
+
+A linear builder keeps the per-paragraph cost flat as articles grow; the
+legacy one grows with article length.
+
+Run from the repo root:
+    python benchmarks/bench_text_body.py
+    python benchmarks/bench_text_body.py --sizes 10 50 150 300 --check
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import warnings
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import DataTransformer
+
+
+def load_paragraphs(path):
+    with open(path, "r", encoding="utf-8") as f:
+        raw_data = json.load(f)
+
+    paragraphs = []
+    for doc in raw_data:
+        if not isinstance(doc, dict):
+            continue
+        for element in doc.get("content_elements", []):
+            if element.get("type") == "text" and element.get("content"):
+                paragraphs.append(element["content"])
+    return paragraphs
+
+
+def build_article(paragraphs, size):
+    elements = [
+        {"type": "text", "content": paragraphs[i % len(paragraphs)]}
+        for i in range(size)
+    ]
+    return {"content_elements": elements}
+
+
+def time_per_call(fn, doc, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(doc)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", default="data/raw_customer_api.json")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 25, 50, 100, 200])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--check", action="store_true",
+                        help="exit 1 if per-paragraph cost grows more than 2x from the smallest to the largest size")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")  # MarkupResemblesLocatorWarning on URL-like paragraphs
+    # No fragment cache: repeated calls would otherwise time cache hits, not parsing
+    transformer = DataTransformer(cache_size=0)
+    paragraphs = load_paragraphs(args.input)
+
+    print(f"{'paras':>6} | {'single-pass ms':>14} | {'us/para':>8} | {'legacy ms':>10} | {'us/para':>8} | {'speedup':>7}")
+    print("-" * 70)
+
+    per_para = []
+    for size in args.sizes:
+        doc = build_article(paragraphs, size)
+        assert transformer.get_text_body(doc) == transformer.get_text_body_legacy(doc), f"Output mismatch at {size} paragraphs"
+
+        new_t = time_per_call(transformer.get_text_body, doc, args.repeat)
+        old_t = time_per_call(transformer.get_text_body_legacy, doc, args.repeat)
+        per_para.append(new_t / size)
+        print(f"{size:>6} | {new_t * 1e3:>14.2f} | {new_t / size * 1e6:>8.1f} | "
+              f"{old_t * 1e3:>10.2f} | {old_t / size * 1e6:>8.1f} | {old_t / new_t:>6.1f}x")
+
+    growth = per_para[-1] / per_para[0]
+    print(f"\nPer-paragraph cost growth (single-pass, {args.sizes[0]} -> {args.sizes[-1]} paras): {growth:.2f}x")
+
+    if args.check and growth > 2.0:
+        print("❌ Per-paragraph cost is not flat: body assembly is not linear.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
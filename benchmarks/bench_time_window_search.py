@@ -0,0 +1,101 @@
+"""
+Latency of "recent news" searches: since-filtered vs unfiltered.
+
+Loads --points synthetic documents whose metadata.datetime is spread evenly
+over the last --days days, then runs the same random query vectors three ways:
+- unfiltered: plain top-k search (what /search did before since/until)
+- post-filter: top-k * --oversample unfiltered, then dropping hits older than
+  --window-hours client side (the usual workaround)
+- since: top-k with the since range filter on the metadata.datetime_ts index
+
+For each it prints p50 / p95 latency and how many of the k results fall in
+the window. The in-memory client has no payload indexes, so the numbers that
+matter come from a real server (--url http://localhost:6333).
+
+Run from the repo root:
+    python benchmarks/bench_time_window_search.py
+    python benchmarks/bench_time_window_search.py --url http://localhost:6333 --points 200000 --dims 768
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def synthetic_docs(count, dims, days, now, rng):
+    for i in range(count):
+        published = now - days * 86400 * i / count
+        iso = datetime.fromtimestamp(published, timezone.utc).isoformat().replace("+00:00", "Z")
+        yield {
+            "text": f"synthetic article {i}",
+            "metadata": {"external_id": f"bench-{i}", "datetime": iso, "publish_date": iso},
+            "vector": rng.standard_normal(dims).astype(np.float32).tolist(),
+        }
+
+
+def timed(fn, queries):
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(fn(query))
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return latencies, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="Qdrant URL (default: in-memory client)")
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--dims", type=int, default=384)
+    parser.add_argument("--days", type=float, default=365)
+    parser.add_argument("--window-hours", type=float, default=24)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--oversample", type=int, default=10, help="post-filter fetches k * oversample")
+    args = parser.parse_args()
+
+    from qdrant_client import QdrantClient
+    from vectordb_v3 import VectorDatabase, to_epoch
+
+    client = QdrantClient(url=args.url) if args.url else QdrantClient(":memory:")
+    vector_db = VectorDatabase("bench_time_window", client=client)
+    vector_db.get_or_create_collection(vector_size=args.dims, recreate=True)
+
+    rng = np.random.default_rng(1)
+    now = time.time()
+    with vector_db.bulk_load() as load:
+        load.update(vector_db.upsert_documents(synthetic_docs(args.points, args.dims, args.days, now, rng)))
+    print(f"{args.points} points, {args.dims} dims, {args.days:g} days; loaded in {load['total_seconds']:.1f} s")
+
+    since = int(now - args.window_hours * 3600)
+    in_window = max(1, int(args.points * args.window_hours / 24 / args.days))
+    queries = rng.standard_normal((args.queries, args.dims)).astype(np.float32).tolist()
+    runs = {
+        "unfiltered": lambda q: vector_db.search(q, limit=args.k),
+        "post-filter": lambda q: [h for h in vector_db.search(q, limit=args.k * args.oversample)
+                                  if to_epoch(h["metadata"]["datetime"]) >= since][:args.k],
+        "since": lambda q: vector_db.search(q, limit=args.k, since=since),
+    }
+
+    print(f"window: last {args.window_hours:g} h (~{in_window} points), k={args.k}, {args.queries} queries")
+    for name, fn in runs.items():
+        latencies, results = timed(fn, queries)
+        recent = statistics.mean(
+            sum(to_epoch(h["metadata"]["datetime"]) >= since for h in hits) for hits in results
+        )
+        print(f"{name:>12}: p50 {statistics.median(latencies):7.2f} ms, "
+              f"p95 {latencies[int(len(latencies) * 0.95) - 1]:7.2f} ms, "
+              f"{recent:.1f}/{args.k} results in window")
+
+    vector_db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Last-write-wins document stores for the batch upsert step.
+
+pipeline.py keys processed documents by external_id: a later document with
+the same ID replaces the earlier one but keeps its original position in the
+output (plain dict semantics). Two stores implement that contract:
+
+- MemoryDocStore: the original dict, whole corpus in RAM.
+- SpillDocStore: appends every processed document to a JSONL spool file and
+  keeps only an external_id -> (first position, byte offset) index, either
+  in memory or, for huge runs, in SQLite fronted by a Bloom filter. A final
+  compaction pass reads back the surviving offsets and writes the
+  deduplicated output.
+
+Both produce byte-identical output files for the same input.
+"""
+import os
+import json
+import math
+import sqlite3
+import hashlib
+import logging
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger("CapitolPipeline")
+
+
+def write_json_array(docs: Iterator[Dict[str, Any]], f):
+    """Streams docs as a JSON array, byte-identical to json.dump(list(docs), f, indent=2, ensure_ascii=False)."""
+    first = True
+    for doc in docs:
+        body = json.dumps(doc, indent=2, ensure_ascii=False).replace("\n", "\n  ")
+        f.write(("[\n  " if first else ",\n  ") + body)
+        first = False
+    f.write("[]" if first else "\n]")
+
+
+class MemoryDocStore:
+    """external_id -> processed_doc in a dict (the original behaviour)."""
+
+    def __init__(self):
+        self._docs: Dict[str, Dict[str, Any]] = {}
+
+    def __len__(self):
+        return len(self._docs)
+
+    def upsert(self, ext_id: str, doc: Dict[str, Any]) -> bool:
+        """Stores doc under ext_id. Returns True when it replaced an earlier document."""
+        updated = ext_id in self._docs
+        self._docs[ext_id] = doc
+        return updated
+
+    def documents(self) -> Iterator[Dict[str, Any]]:
+        return iter(self._docs.values())
+
+    def write_json(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(list(self._docs.values()), f, indent=2, ensure_ascii=False)
+
+    def close(self):
+        pass
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (blake2b, double hashing)."""
+
+    def __init__(self, expected_items: int = 1_000_000, false_positive_rate: float = 0.01):
+        expected_items = max(1, expected_items)
+        self.num_bits = max(8, int(-expected_items * math.log(false_positive_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / expected_items * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class _MemoryIndex:
+    """external_id -> spool offset; dict order is first-seen order."""
+
+    def __init__(self):
+        self._offsets: Dict[str, int] = {}
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def put(self, ext_id: str, offset: int) -> bool:
+        updated = ext_id in self._offsets
+        self._offsets[ext_id] = offset
+        return updated
+
+    def offsets(self) -> Iterator[int]:
+        return iter(self._offsets.values())
+
+    def close(self):
+        pass
+
+
+class _DiskIndex:
+    """
+    external_id -> (first-seen sequence, spool offset) in SQLite. A Bloom
+    filter answers "never seen" without touching the database, which is the
+    common case for a mostly-unique feed.
+    """
+
+    def __init__(self, path: str, expected_items: int):
+        if os.path.exists(path):
+            os.remove(path)
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=OFF")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute("CREATE TABLE idx (ext_id TEXT PRIMARY KEY, seq INTEGER NOT NULL, offset INTEGER NOT NULL)")
+        self._bloom = BloomFilter(expected_items)
+        self._count = 0
+        self.path = path
+
+    def __len__(self):
+        return self._count
+
+    def put(self, ext_id: str, offset: int) -> bool:
+        if ext_id in self._bloom:
+            cur = self._conn.execute("UPDATE idx SET offset = ? WHERE ext_id = ?", (offset, ext_id))
+            if cur.rowcount:
+                return True
+        self._bloom.add(ext_id)
+        self._conn.execute("INSERT INTO idx (ext_id, seq, offset) VALUES (?, ?, ?)", (ext_id, self._count, offset))
+        self._count += 1
+        return False
+
+    def offsets(self) -> Iterator[int]:
+        self._conn.commit()
+        for (offset,) in self._conn.execute("SELECT offset FROM idx ORDER BY seq"):
+            yield offset
+
+    def close(self):
+        self._conn.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class SpillDocStore:
+    """
+    Append-only JSONL spool plus a compact offset index.
+
+    index="memory" keeps a dict of external_id -> offset (tens of bytes per
+    document instead of the whole document). index="disk" moves the index to
+    SQLite with a Bloom filter in front, for runs where even that is too big.
+    """
+
+    def __init__(self, spool_path: str, index: str = "memory", expected_items: int = 1_000_000):
+        directory = os.path.dirname(spool_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.spool_path = spool_path
+        self._spool = open(spool_path, "wb")
+        if index == "memory":
+            self._index = _MemoryIndex()
+        elif index == "disk":
+            self._index = _DiskIndex(f"{spool_path}.idx.sqlite", expected_items)
+        else:
+            raise ValueError(f"Unknown spill index '{index}'. Choose from: memory, disk")
+
+    def __len__(self):
+        return len(self._index)
+
+    def upsert(self, ext_id: str, doc: Dict[str, Any]) -> bool:
+        """Appends doc to the spool and points ext_id at it. Returns True for an update."""
+        offset = self._spool.tell()
+        self._spool.write(json.dumps(doc, ensure_ascii=False).encode("utf-8") + b"\n")
+        return self._index.put(ext_id, offset)
+
+    def documents(self) -> Iterator[Dict[str, Any]]:
+        """Surviving (last-written) documents in first-seen order, read back from the spool."""
+        self._spool.flush()
+        with open(self.spool_path, "rb") as spool:
+            for offset in self._index.offsets():
+                spool.seek(offset)
+                yield json.loads(spool.readline())
+
+    def write_json(self, path: str):
+        """Compaction: writes the deduplicated documents as one JSON array."""
+        with open(path, "w", encoding="utf-8") as f:
+            write_json_array(self.documents(), f)
+        logger.info(f"🗜️ Compacted {len(self)} unique documents from {self.spool_path} into {path}")
+
+    def close(self, keep_spool: bool = False):
+        self._spool.close()
+        self._index.close()
+        if not keep_spool and os.path.exists(self.spool_path):
+            os.remove(self.spool_path)
+
+
+def open_doc_store(spill_path: Optional[str] = None, index: str = "memory", **kwargs):
+    """MemoryDocStore when spill_path is None, otherwise a SpillDocStore spooling to spill_path."""
+    if spill_path is None:
+        return MemoryDocStore()
+    return SpillDocStore(spill_path, index=index, **kwargs)
@@ -5,30 +5,862 @@
 
 
 import os
+import time
+import array
+import random
+import sqlite3
+import asyncio
+import hashlib
 import logging
-from typing import List
-from openai import OpenAI
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from openai import OpenAI, AsyncOpenAI, APIConnectionError, APIStatusError, RateLimitError
+
+from vector_codec import decode_vector_b64
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to a conservative estimate
+    tiktoken = None
 
 logger = logging.getLogger("CapitolPipeline")
 
+# Per-request limits of the OpenAI embeddings endpoint
+MAX_INPUTS_PER_REQUEST = 2048
+MAX_TOKENS_PER_REQUEST = 300_000
+MAX_TOKENS_PER_INPUT = 8191
+
+# Native output sizes of the OpenAI embedding models
+OPENAI_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
+
+
+class EmbeddingBackend:
+    """
+    Interface for local embedding backends. EmbeddingModel uses one in
+    place of the OpenAI API when given backend=...; batching, caching and
+    per-item error reporting stay in EmbeddingModel.
+    """
+
+    name = "base"
+    model = ""
+
+    @property
+    def dimension(self) -> int:
+        """Length of the vectors this backend produces."""
+        raise NotImplementedError
+
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        """One vector per text, in order. Raises if the batch can't be embedded."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """
+    Local CPU inference with sentence-transformers: batched encode with a
+    configurable batch size and torch thread count, optionally spread over
+    a pool of worker processes for bulk backfills.
+    """
+
+    name = "sentence-transformers"
+
+    def __init__(self, model: str = "sentence-transformers/all-MiniLM-L6-v2", batch_size: int = 64,
+                 num_threads: Optional[int] = None, processes: int = 0, device: str = "cpu",
+                 normalize: bool = True):
+        from sentence_transformers import SentenceTransformer
+
+        if num_threads:
+            import torch
+            torch.set_num_threads(num_threads)
+
+        self.model = model
+        self.batch_size = batch_size
+        self.normalize = normalize
+        self._model = SentenceTransformer(model, device=device)
+        self._pool = self._model.start_multi_process_pool([device] * processes) if processes > 1 else None
+
+    @property
+    def dimension(self) -> int:
+        return self._model.get_sentence_embedding_dimension()
+
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        if self._pool is not None:
+            vectors = self._model.encode_multi_process(
+                list(texts), self._pool, batch_size=self.batch_size, normalize_embeddings=self.normalize)
+        else:
+            vectors = self._model.encode(
+                list(texts), batch_size=self.batch_size, normalize_embeddings=self.normalize,
+                convert_to_numpy=True, show_progress_bar=False)
+        return vectors.tolist()
+
+    def close(self):
+        if self._pool is not None:
+            self._model.stop_multi_process_pool(self._pool)
+            self._pool = None
+
+
+def _length_sorted_batches(lengths: Sequence[int], batch_size: int) -> List[List[int]]:
+    """Indices grouped into batches of similar length, so padding stays short."""
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+def _mean_pool(hidden, attention_mask, normalize: bool = True):
+    """Mask-aware mean over the token axis (what sentence-transformers' pooling layer does)."""
+    import numpy as np
+
+    mask = attention_mask[..., None].astype(hidden.dtype)
+    pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+    if normalize:
+        pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+    return pooled
+
+
+_ONNX_INSTALL_HINT = ("the ONNX backend needs onnxruntime, onnx and transformers (plus torch for the export): "
+                      "pip install -r requirements.txt")
+
+
+def export_onnx_model(model: str, output_dir: str, quantize: bool = True, opset: int = 17) -> str:
+    """
+    Exports the transformer behind a sentence-transformers model to ONNX
+    (dynamic batch and sequence axes), saves its tokenizer next to it and,
+    with quantize=True, writes a dynamically int8-quantized copy.
+    Returns the path of the model OnnxBackend should load.
+    """
+    try:
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+    except ImportError as e:
+        raise ImportError(f"{e}; {_ONNX_INSTALL_HINT}") from e
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model)
+    encoder = AutoModel.from_pretrained(model).eval()
+    sample = tokenizer(["export"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+
+    class _LastHiddenState(torch.nn.Module):
+        def __init__(self, inner):
+            super().__init__()
+            self.inner = inner
+
+        def forward(self, *inputs):
+            return self.inner(**dict(zip(input_names, inputs))).last_hidden_state
+
+    fp32_path = os.path.join(output_dir, "model.onnx")
+    axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+    torch.onnx.export(_LastHiddenState(encoder), tuple(sample[name] for name in input_names), fp32_path,
+                      input_names=input_names, output_names=["last_hidden_state"],
+                      dynamic_axes=axes, opset_version=opset)
+    tokenizer.save_pretrained(output_dir)
+    logger.info(f"📦 Exported {model} to {fp32_path}")
+    if not quantize:
+        return fp32_path
+
+    int8_path = os.path.join(output_dir, "model.int8.onnx")
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    logger.info(f"📦 Quantized {fp32_path} to int8 at {int8_path}")
+    return int8_path
+
+
+class OnnxBackend(EmbeddingBackend):
+    """
+    ONNX Runtime inference of an exported sentence-transformers model,
+    int8-quantized by default. Inputs are tokenized once, sorted by length
+    and padded only to the longest text of their batch; vectors come back
+    in input order. The export (export_onnx_model) runs on first use when
+    model_dir doesn't have one yet.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model: str = "sentence-transformers/all-MiniLM-L6-v2",
+                 model_dir: str = "output/onnx/all-MiniLM-L6-v2", quantized: bool = True,
+                 batch_size: int = 64, num_threads: Optional[int] = None, max_length: int = 256,
+                 normalize: bool = True):
+        try:
+            import onnxruntime as ort
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise ImportError(f"{e}; {_ONNX_INSTALL_HINT}") from e
+
+        onnx_path = os.path.join(model_dir, "model.int8.onnx" if quantized else "model.onnx")
+        if not os.path.exists(onnx_path):
+            onnx_path = export_onnx_model(model, model_dir, quantize=quantized)
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self._session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self._session.get_inputs()}
+        self._tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        # Cache entries must not mix int8 and full-precision vectors
+        self.model = f"{model}@onnx-{'int8' if quantized else 'fp32'}"
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.normalize = normalize
+        self._dimension = None
+
+    @property
+    def dimension(self) -> int:
+        if self._dimension is None:
+            size = self._session.get_outputs()[0].shape[-1]
+            self._dimension = size if isinstance(size, int) else len(self.embed(["dimension probe"])[0])
+        return self._dimension
+
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        import numpy as np
+
+        encoded = self._tokenizer(list(texts), truncation=True, max_length=self.max_length)["input_ids"]
+        pad_id = self._tokenizer.pad_token_id or 0
+        vectors: List[Optional[List[float]]] = [None] * len(encoded)
+
+        for batch in _length_sorted_batches([len(ids) for ids in encoded], self.batch_size):
+            width = max(len(encoded[i]) for i in batch)
+            input_ids = np.full((len(batch), width), pad_id, dtype=np.int64)
+            attention_mask = np.zeros((len(batch), width), dtype=np.int64)
+            for row, i in enumerate(batch):
+                input_ids[row, :len(encoded[i])] = encoded[i]
+                attention_mask[row, :len(encoded[i])] = 1
+            feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self._input_names:
+                feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+            hidden = self._session.run(None, feeds)[0]
+            for row, vector in zip(batch, _mean_pool(hidden, attention_mask, self.normalize).tolist()):
+                vectors[row] = vector
+        return vectors
+
+
+class HashingBackend(EmbeddingBackend):
+    """
+    Offline, deterministic stand-in for a real model: feature-hashes the
+    lowercased words of a text into `dimension` buckets (signed, blake2b)
+    and L2-normalizes the result. Texts sharing words get similar vectors,
+    so search over the index still behaves sensibly. `latency` seconds are
+    slept per embed() call to mimic a remote round trip in benchmarks.
+    """
+
+    name = "hash"
+
+    def __init__(self, dimension: int = 1536, latency: float = 0.0, batch_size: int = 256):
+        self._dimension = dimension
+        self.latency = latency
+        self.batch_size = batch_size
+        self.model = f"hash-{dimension}"
+
+    @property
+    def dimension(self) -> int:
+        return self._dimension
+
+    def _vector(self, text: str) -> List[float]:
+        vector = [0.0] * self._dimension
+        for word in text.lower().split() or [text]:
+            digest = hashlib.blake2b(word.encode("utf-8", "surrogatepass"), digest_size=8).digest()
+            bucket = int.from_bytes(digest, "little")
+            vector[(bucket >> 1) % self._dimension] += -1.0 if bucket & 1 else 1.0
+        norm = sum(x * x for x in vector) ** 0.5 or 1.0
+        return [x / norm for x in vector]
+
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+
+BACKENDS = {
+    SentenceTransformerBackend.name: SentenceTransformerBackend,
+    OnnxBackend.name: OnnxBackend,
+    HashingBackend.name: HashingBackend,
+}
+
+
+def get_backend(backend=None, **kwargs) -> Optional[EmbeddingBackend]:
+    """
+    Accepts a backend instance, a registered name, or None / "openai" for
+    the OpenAI API (which EmbeddingModel handles itself).
+    """
+    if backend is None or isinstance(backend, EmbeddingBackend):
+        return backend
+    if backend == "openai":
+        return None
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}'. Choose from: openai, {', '.join(BACKENDS)}")
+    return BACKENDS[backend](**kwargs)
+
+
+class TokenBucketPacer:
+    """
+    Requests-per-minute and tokens-per-minute budgets as two token buckets,
+    shared by every request in flight. Each bucket holds at most one
+    minute's budget and refills continuously. A 429 pauses everyone via
+    pause(), so concurrency doesn't turn into a flood of retries.
+    """
+
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None, clock=time.monotonic):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._clock = clock
+        self._requests = float(rpm) if rpm else 0.0
+        self._tokens = float(tpm) if tpm else 0.0
+        self._last = clock()
+        self._paused_until = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        self.stats = {"waits": 0, "wait_seconds": 0.0, "rate_limited": 0}
+
+    def _refill(self, now: float):
+        elapsed = max(0.0, now - self._last)
+        self._last = now
+        if self.rpm:
+            self._requests = min(float(self.rpm), self._requests + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            self._tokens = min(float(self.tpm), self._tokens + elapsed * self.tpm / 60.0)
+
+    def reserve(self, tokens: int) -> float:
+        """
+        Takes one request and `tokens` tokens if both budgets allow and
+        returns 0; otherwise takes nothing and returns how long to wait.
+        """
+        now = self._clock()
+        self._refill(now)
+        if self.tpm:
+            tokens = min(tokens, self.tpm)  # a single huge request must still fit eventually
+        wait = max(0.0, self._paused_until - now)
+        if self.rpm and self._requests < 1:
+            wait = max(wait, (1 - self._requests) * 60.0 / self.rpm)
+        if self.tpm and self._tokens < tokens:
+            wait = max(wait, (tokens - self._tokens) * 60.0 / self.tpm)
+        if wait > 0:
+            return wait
+        if self.rpm:
+            self._requests -= 1
+        if self.tpm:
+            self._tokens -= tokens
+        return 0.0
+
+    async def acquire(self, tokens: int):
+        """Waits (first come, first served) until a request of `tokens` fits the budgets."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                wait = self.reserve(tokens)
+                if wait <= 0:
+                    return
+                self.stats["waits"] += 1
+                self.stats["wait_seconds"] += wait
+                await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Holds back every request for `seconds` (e.g. after a 429)."""
+        self.stats["rate_limited"] += 1
+        self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+
+def _retry_after(error: Exception, default: float = 1.0) -> float:
+    """Seconds to back off after a 429, from the response headers when present."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return default
+
+
+def _is_transient(error: Exception) -> bool:
+    """429s, 5xx, timeouts and dropped connections: worth retrying as-is."""
+    if isinstance(error, (APIConnectionError, TimeoutError, ConnectionError)):
+        return True
+    return isinstance(error, APIStatusError) and (error.status_code in (408, 409, 429) or error.status_code >= 500)
+
+
+_CONTEXT_LENGTH_MARKERS = ("context length", "context_length", "maximum input length", "too many tokens")
+
+
+def _is_input_error(error: Exception) -> bool:
+    """
+    Rejections caused by what was sent (400 / 413 / 422, an input over the
+    context length, or a local backend's ValueError / TypeError): one bad
+    input may be hiding in the batch. Auth and config errors (401, 403,
+    404, ...) fail every input alike, so they are not.
+    """
+    if isinstance(error, APIStatusError):
+        return (error.status_code in (400, 413, 422)
+                or any(marker in str(error).lower() for marker in _CONTEXT_LENGTH_MARKERS))
+    return isinstance(error, (ValueError, TypeError))
+
+
+class EmbeddingCache:
+    """
+    Disk-backed embedding cache keyed by (model, dimensions, sha256(text)).
+
+    Vectors are stored as float32 blobs in SQLite (WAL mode, busy timeout),
+    so several uvicorn workers can share one file. When the stored vectors
+    exceed max_bytes, the least recently used ones are evicted.
+    """
+
+    def __init__(self, path: str = "output/embedding_cache.sqlite", max_bytes: int = 1 << 30,
+                 evict_check_every: int = 1000):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.evict_check_every = evict_check_every
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._puts_since_check = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, dims INTEGER NOT NULL, text_sha256 BLOB NOT NULL,"
+            " vector BLOB NOT NULL, last_used REAL NOT NULL,"
+            " PRIMARY KEY (model, dims, text_sha256))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+
+    @staticmethod
+    def _digest(text: str) -> bytes:
+        return hashlib.sha256(text.encode("utf-8", "surrogatepass")).digest()
+
+    @staticmethod
+    def _pack(vector: Sequence[float]) -> bytes:
+        return array.array("f", vector).tobytes()
+
+    @staticmethod
+    def _unpack(blob: bytes) -> List[float]:
+        vector = array.array("f")
+        vector.frombytes(blob)
+        return vector.tolist()
+
+    def get_many(self, model: str, dims: int, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Cached vectors aligned with texts (None for a miss); refreshes recency of hits."""
+        digests = [self._digest(t) for t in texts]
+        found: Dict[bytes, bytes] = {}
+        with self._lock:
+            # Chunked IN (...) lookups stay under SQLite's bound-parameter limit
+            for start in range(0, len(digests), 500):
+                chunk = digests[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT text_sha256, vector FROM embeddings WHERE model = ? AND dims = ? "
+                    f"AND text_sha256 IN ({','.join('?' * len(chunk))})",
+                    (model, dims, *chunk),
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE model = ? AND dims = ? AND text_sha256 = ?",
+                        [(now, model, dims, d) for d in found],
+                    )
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    # An open write transaction would keep the shared WAL file locked
+                    self._conn.execute("ROLLBACK")
+                    raise
+
+        vectors = [self._unpack(found[d]) if d in found else None for d in digests]
+        hits = sum(v is not None for v in vectors)
+        self.stats["hits"] += hits
+        self.stats["misses"] += len(vectors) - hits
+        return vectors
+
+    def put_many(self, model: str, dims: int, items: Sequence[Tuple[str, Sequence[float]]]):
+        now = time.time()
+        rows = [(model, dims, self._digest(text), self._pack(vector), now) for text, vector in items]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, dims, text_sha256, vector, last_used) "
+                    "VALUES (?, ?, ?, ?, ?)", rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._puts_since_check += len(rows)
+            if self._puts_since_check >= self.evict_check_every:
+                self._puts_since_check = 0
+                self._evict()
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+
+    def evict(self):
+        """Drops least recently used vectors until the cache fits in max_bytes."""
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        total, count = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0), COUNT(*) FROM embeddings").fetchone()
+        if total <= self.max_bytes or not count:
+            return
+        # Rows are near-uniform in size (same model / dims), so one estimate is close
+        excess = total - self.max_bytes
+        drop = min(count, -(-excess * count // total))
+        cur = self._conn.execute(
+            "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+            (drop,))
+        self.stats["evictions"] += cur.rowcount
+        logger.info(f"🧹 Evicted {cur.rowcount} cached embeddings to stay under {self.max_bytes} bytes")
+
+    def hit_rate(self) -> float:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
 class EmbeddingModel:
-    def __init__(self):
-        self.api_key = os.getenv("OPENAI_API_KEY")
+    def __init__(self, client=None, model: str = "text-embedding-3-small",
+                 max_inputs_per_request: int = MAX_INPUTS_PER_REQUEST,
+                 max_tokens_per_request: int = MAX_TOKENS_PER_REQUEST,
+                 api_key: Optional[str] = None, base_url: Optional[str] = None, async_client=None,
+                 max_concurrency: int = 1, rpm: Optional[float] = None, tpm: Optional[float] = None,
+                 max_retries: int = 5, backoff_base: float = 0.5, backoff_max: float = 30.0,
+                 dimensions: Optional[int] = None, cache: Optional[EmbeddingCache] = None, backend=None):
+        """
+        client:          an OpenAI-compatible client; built from api_key /
+                         OPENAI_API_KEY (and base_url) when omitted.
+        async_client:    AsyncOpenAI-compatible client for the concurrent path;
+                         built the same way on first use.
+        max_concurrency: embedding requests in flight at once. Above 1,
+                         generate_embeddings runs on asyncio.
+        rpm / tpm:       requests / tokens per minute budgets for the pacer.
+        max_retries:     retries of a request after a transient error (429, 5xx,
+                         timeout), with full-jitter exponential backoff from
+                         backoff_base up to backoff_max seconds (a 429 waits
+                         for its Retry-After instead).
+        dimensions:      output size for text-embedding-3 models (model default if None).
+        cache:           EmbeddingCache consulted before calling the API.
+        backend:         local EmbeddingBackend (instance or name, see BACKENDS)
+                         used instead of the OpenAI API; None / "openai" for the API.
+        """
+        self.backend = get_backend(backend)
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self.base_url = base_url
+        if client is None and self.backend is None:
+            if not self.api_key:
+                raise ValueError("OPENAI_API_KEY not set.")
+            # Retries are ours (max_retries / backoff); SDK retries would multiply them
+            client = OpenAI(api_key=self.api_key, base_url=base_url, max_retries=0)
+            self._owns_client = True
+        else:
+            self._owns_client = False
+        self.client = client
+        self.async_client = async_client
+        # Event loop thread for the concurrent path, created on first use. It
+        # keeps one AsyncOpenAI client (and its keep-alive pool) across calls.
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._loop_client = None
+        self._loop_lock = threading.Lock()
+        self.model = self.backend.model if self.backend is not None else model
+        self.max_inputs_per_request = max_inputs_per_request
+        self.max_tokens_per_request = max_tokens_per_request
+        self.max_concurrency = max(1, max_concurrency)
+        self.pacer = TokenBucketPacer(rpm, tpm)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stats = {"requests": 0, "retries": 0, "bisections": 0, "permanent_failures": 0}
+        self.dimensions = dimensions
+        self.cache = cache
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.encoding_for_model(model)
+            except Exception:
+                self._encoding = None
+
+    @property
+    def vector_size(self) -> int:
+        """Length of the vectors this model produces (sizes the Qdrant collection)."""
+        if self.backend is not None:
+            return self.backend.dimension
+        return self.dimensions or OPENAI_DIMENSIONS.get(self.model, 1536)
+
+    def count_tokens(self, text: str) -> int:
+        """Exact with tiktoken; otherwise an over-estimate (~3 UTF-8 bytes per token)."""
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return len(text.encode("utf-8", "surrogatepass")) // 3 + 1
+
+    def plan_batches(self, texts: Sequence[str]) -> List[List[int]]:
+        """
+        Packs input indices, in order, into requests that stay within the
+        per-request input count and token limits. An input that is too large
+        on its own still gets a request of its own (the API decides).
+        """
+        batches: List[List[int]] = []
+        current: List[int] = []
+        current_tokens = 0
+        for idx, text in enumerate(texts):
+            tokens = min(self.count_tokens(text), MAX_TOKENS_PER_INPUT)
+            if current and (len(current) >= self.max_inputs_per_request
+                            or current_tokens + tokens > self.max_tokens_per_request):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(idx)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _request_plan(self, texts: Sequence[str], errors: Dict[int, str]) -> List[List[int]]:
+        """Request batches as lists of indices into texts; unusable inputs go to errors."""
+        valid = []
+        for idx, text in enumerate(texts):
+            if not isinstance(text, str) or not text:
+                errors[idx] = "empty or non-string input"
+            else:
+                valid.append(idx)
+        return [[valid[i] for i in batch] for batch in self.plan_batches([texts[i] for i in valid])]
+
+    @staticmethod
+    def _collect(res, indices: List[int], vectors, errors):
+        # The API echoes each input's position within the request
+        for item in res.data:
+            embedding = item.embedding
+            vectors[indices[item.index]] = decode_vector_b64(embedding) if isinstance(embedding, str) else embedding
+        for idx in indices:
+            if vectors[idx] is None:
+                errors[idx] = "missing from response"
+
+    def _request_kwargs(self) -> Dict[str, Any]:
+        # Raw float32 in base64: no JSON float parsing, decoded with one memcpy in _collect
+        kwargs: Dict[str, Any] = {"encoding_format": "base64"}
+        if self.dimensions:
+            kwargs["dimensions"] = self.dimensions
+        return kwargs
+
+    def _cache_lookup(self, texts: Sequence[str]) -> Tuple[List[Optional[List[float]]], List[int]]:
+        """Vectors found in the cache (aligned with texts) and the indices still to embed."""
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        if self.cache is None:
+            return vectors, list(range(len(texts)))
+        cacheable = [i for i, t in enumerate(texts) if isinstance(t, str) and t]
+        for idx, vector in zip(cacheable, self.cache.get_many(self.model, self.dimensions or 0,
+                                                              [texts[i] for i in cacheable])):
+            vectors[idx] = vector
+        return vectors, [i for i in range(len(texts)) if vectors[i] is None]
+
+    def _cache_merge(self, texts, misses, fresh_vectors, fresh_errors, vectors, errors):
+        """Places freshly embedded results at their original positions and caches them."""
+        new_entries = []
+        for pos, idx in enumerate(misses):
+            if pos in fresh_errors:
+                errors[idx] = fresh_errors[pos]
+            elif fresh_vectors[pos] is not None:
+                vectors[idx] = fresh_vectors[pos]
+                new_entries.append((texts[idx], fresh_vectors[pos]))
+        if self.cache is not None and new_entries:
+            self.cache.put_many(self.model, self.dimensions or 0, new_entries)
+        return vectors, errors
+
+    def generate_embeddings(self, texts: Sequence[str]) -> Tuple[List[Optional[List[float]]], Dict[int, str]]:
+        """
+        Embeds many texts with as few requests as the limits allow.
+        Returns (vectors, errors): vectors[i] is the embedding of texts[i] or
+        None if it failed, and errors maps each failed index to the reason.
+
+        Texts already in the cache are not sent. With max_concurrency > 1
+        (and no event loop already running in this thread) the requests are
+        sent concurrently via agenerate_embeddings, on this model's own event
+        loop thread so its connection pool is reused between calls.
+        """
+        if self.max_concurrency > 1 and self.backend is None:
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                return self._run_in_loop(self.agenerate_embeddings(texts))
+
+        vectors, misses = self._cache_lookup(texts)
+        fresh_vectors, fresh_errors = self._embed_uncached([texts[i] for i in misses])
+        return self._cache_merge(texts, misses, fresh_vectors, fresh_errors, vectors, {})
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying after `error`, or None to give up on this request."""
+        if attempt >= self.max_retries or not _is_transient(error):
+            return None
+        self.stats["retries"] += 1
+        if isinstance(error, RateLimitError):
+            wait = _retry_after(error)
+            self.pacer.pause(wait)
+            return wait * random.uniform(1.0, 1.1)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _split_or_fail(self, indices: List[int], error: Exception, errors: Dict[int, str]) -> List[List[int]]:
+        """
+        After a request has failed for good: halves to resend when the batch
+        may hold one bad input (see _is_input_error), otherwise records the
+        failure for every index and returns nothing.
+        """
+        if len(indices) > 1 and _is_input_error(error):
+            self.stats["bisections"] += 1
+            mid = len(indices) // 2
+            return [indices[:mid], indices[mid:]]
+        source = self.backend.name if self.backend is not None else "OpenAI"
+        logger.error(f"{source} error for a batch of {len(indices)} inputs: {error}")
+        self.stats["permanent_failures"] += len(indices)
+        for idx in indices:
+            errors[idx] = str(error)
+        return []
+
+    def _request(self, batch: List[str]):
+        if self.backend is not None:
+            return self.backend.embed(batch)
+        return self.client.embeddings.create(model=self.model, input=batch, **self._request_kwargs())
+
+    def _place(self, res, indices: List[int], vectors, errors):
+        if self.backend is not None:
+            for idx, vector in zip(indices, res):
+                vectors[idx] = vector
+        else:
+            self._collect(res, indices, vectors, errors)
+
+    def _embed_uncached(self, texts: Sequence[str]) -> Tuple[List[Optional[List[float]]], Dict[int, str]]:
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        errors: Dict[int, str] = {}
+
+        def send(indices: List[int]):
+            batch = [texts[i] for i in indices]
+            attempt = 0
+            while True:
+                self.stats["requests"] += 1
+                try:
+                    res = self._request(batch)
+                except Exception as e:
+                    delay = self._retry_delay(e, attempt)
+                    if delay is not None:
+                        attempt += 1
+                        time.sleep(delay)
+                        continue
+                    for half in self._split_or_fail(indices, e, errors):
+                        send(half)
+                    return
+                self._place(res, indices, vectors, errors)
+                return
+
+        for indices in self._request_plan(texts, errors):
+            send(indices)
+        return vectors, errors
+
+    def _run_in_loop(self, coro):
+        """Runs coro on the model's event loop thread (started on first use) and waits for it."""
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(target=self._loop.run_forever,
+                                                     name="embedding-loop", daemon=True)
+                self._loop_thread.start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def close(self):
+        """Closes the clients this model created and stops its event loop thread."""
+        with self._loop_lock:
+            loop, self._loop = self._loop, None
+        if loop is not None:
+            if self._loop_client is not None:
+                asyncio.run_coroutine_threadsafe(self._loop_client.close(), loop).result()
+                self._loop_client = None
+            loop.call_soon_threadsafe(loop.stop)
+            self._loop_thread.join()
+            loop.close()
+        if self._owns_client:
+            self.client.close()
+
+    def _new_async_client(self):
         if not self.api_key:
             raise ValueError("OPENAI_API_KEY not set.")
-        self.client = OpenAI(api_key=self.api_key)
-        self.model = "text-embedding-3-small"
+        # Retries are handled here (backoff, pacer pause, bisection) rather than by the client
+        return AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+
+    async def agenerate_embeddings(self, texts: Sequence[str]) -> Tuple[List[Optional[List[float]]], Dict[int, str]]:
+        """
+        Async generate_embeddings: up to max_concurrency requests in flight,
+        each admitted by the RPM/TPM pacer. A 429 pauses the pacer for the
+        server's Retry-After; transient errors are retried and failed
+        batches bisected as in the sync path.
+        """
+        vectors, misses = self._cache_lookup(texts)
+        if self.backend is not None:
+            # Local inference is CPU-bound: keep it off the event loop
+            fresh_vectors, fresh_errors = await asyncio.to_thread(self._embed_uncached, [texts[i] for i in misses])
+        else:
+            fresh_vectors, fresh_errors = await self._aembed_uncached([texts[i] for i in misses])
+        return self._cache_merge(texts, misses, fresh_vectors, fresh_errors, vectors, {})
+
+    async def _aembed_uncached(self, texts: Sequence[str]) -> Tuple[List[Optional[List[float]]], Dict[int, str]]:
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        errors: Dict[int, str] = {}
+        client = self.async_client
+        if client is None and asyncio.get_running_loop() is self._loop:
+            if self._loop_client is None:
+                self._loop_client = self._new_async_client()
+            client = self._loop_client
+        # Any other loop (e.g. a caller's asyncio.run) gets a client for this call only
+        owned = client is None
+        if owned:
+            client = self._new_async_client()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def send(indices: List[int]):
+            batch = [texts[i] for i in indices]
+            tokens = sum(min(self.count_tokens(t), MAX_TOKENS_PER_INPUT) for t in batch)
+            attempt = 0
+            while True:
+                # Backoff sleeps and bisected halves don't hold a concurrency slot
+                async with semaphore:
+                    await self.pacer.acquire(tokens)
+                    self.stats["requests"] += 1
+                    try:
+                        res = await client.embeddings.create(model=self.model, input=batch,
+                                                             **self._request_kwargs())
+                    except Exception as e:
+                        error = e
+                    else:
+                        self._collect(res, indices, vectors, errors)
+                        return
+                delay = self._retry_delay(error, attempt)
+                if delay is not None:
+                    attempt += 1
+                    await asyncio.sleep(delay)
+                    continue
+                await asyncio.gather(*(send(half) for half in self._split_or_fail(indices, error, errors)))
+                return
+
+        try:
+            await asyncio.gather(*(send(indices) for indices in self._request_plan(texts, errors)))
+        finally:
+            if owned:
+                await client.close()
+        return vectors, errors
 
     def generate_embedding(self, text: str) -> List[float]:
         # This is the "granular" function app.py needs
         if not text: return []
-        try:
-            res = self.client.embeddings.create(model=self.model, input=text)
-            return res.data[0].embedding
-        except Exception as e:
-            logger.error(f"OpenAI error: {e}")
-            return []
+        vectors, errors = self.generate_embeddings([text])
+        return vectors[0] or []
 
 if __name__ == "__main__":
     pass
-
@@ -0,0 +1,143 @@
+"""
+Content-addressed LRU cache for cleaned text fragments.
+
+Feeds repeat the same strings across documents (category names, footer and
+disclaimer paragraphs, recurring headlines). DataTransformer keys each
+cleaned result by a hash of (kind, raw string) so a repeat costs one hash
+instead of one HTML parse.
+
+The cache can be saved to / loaded from a JSON file so consecutive batch
+runs of pipeline.py start warm.
+"""
+import os
+import json
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Tuple
+
+logger = logging.getLogger("CapitolPipeline")
+
+CACHE_FILE_VERSION = 1
+
+
+def content_key(kind: str, text: str) -> str:
+    """128-bit content hash of a raw string, namespaced by what was computed from it."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(kind.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(text.encode("utf-8", "surrogatepass"))
+    return digest.hexdigest()
+
+
+class FragmentCache:
+    def __init__(self, max_entries: int = 10000):
+        if max_entries < 1:
+            raise ValueError("max_entries must be >= 1")
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "evictions": 0}
+        # Worker processes record what they computed so the parent can merge it
+        self.track_new = False
+        self._new: Dict[str, Any] = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_or_compute(self, kind: str, text: str, compute: Callable[[], Any]) -> Any:
+        """
+        Returns the cached value for (kind, text), computing and storing it on
+        a miss. Values must be immutable (str, tuples, None) since they are
+        shared between documents.
+        """
+        key = content_key(kind, text)
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.stats["misses"] += 1
+            value = compute()
+            self._put(key, value)
+            return value
+
+        self.stats["hits"] += 1
+        self._entries.move_to_end(key)
+        return value
+
+    def _put(self, key: str, value: Any):
+        if self.track_new:
+            self._new[key] = value
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def take_new_entries(self) -> List[Tuple[str, Any]]:
+        """Entries computed since the last call (only while track_new is on)."""
+        entries = list(self._new.items())
+        self._new = {}
+        return entries
+
+    def merge(self, entries: List[Tuple[str, Any]]):
+        """Adds entries computed elsewhere (e.g. by a worker) without touching the counters."""
+        for key, value in entries:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    # --- PERSISTENCE ---
+
+    def save(self, path: str):
+        """Writes entries (least recently used first) atomically to path."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": CACHE_FILE_VERSION,
+                "entries": [[key, _to_json(value)] for key, value in self._entries.items()],
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        logger.info(f"💾 Saved {len(self._entries)} cached fragments to {path}")
+
+    def load(self, path: str) -> int:
+        """
+        Merges entries from a file written by save(). A missing or unreadable
+        file just leaves the cache cold. Returns the number of entries loaded.
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Ignoring unreadable fragment cache {path}: {e}")
+            return 0
+
+        if not isinstance(data, dict) or data.get("version") != CACHE_FILE_VERSION:
+            logger.warning(f"⚠️ Ignoring fragment cache {path}: unsupported format")
+            return 0
+
+        entries = data.get("entries") or []
+        # Only the most recently used entries fit; don't count them as evictions
+        self.merge([(key, _from_json(value)) for key, value in entries[-self.max_entries:]])
+
+        loaded = min(len(entries), self.max_entries)
+        logger.info(f"📂 Loaded {loaded} cached fragments from {path}")
+        return loaded
+
+
+# JSON has no tuples; fragments are stored as lists and restored on load.
+def _to_json(value):
+    if isinstance(value, tuple):
+        return [_to_json(v) for v in value]
+    return value
+
+
+def _from_json(value):
+    if isinstance(value, list):
+        return tuple(_from_json(v) for v in value)
+    return value
@@ -0,0 +1,323 @@
+"""
+Pluggable HTML-to-text engines used by DataTransformer.
+
+Every engine answers one question: "what text nodes does this markup
+contain, in document order?" -- exactly the strings
+``BeautifulSoup(markup, "html.parser").strings`` would yield. The cleaning
+helpers in pipeline.py (clean_text, clean_html, get_text_body) are built on
+top of that, so any engine that passes the differential check produces the
+same text we send to embedding.
+
+Engines:
+- "stream" (default): tree-free, built directly on the stdlib
+  ``html.parser.HTMLParser`` tokenizer. Replays only the parts of
+  BeautifulSoup's tree builder that affect text (data flushing, entity
+  decoding, whitespace collapsing, string containers) without allocating
+  any Tag objects.
+- "soup": BeautifulSoup with "html.parser", kept as the reference backend.
+
+Differential mode:
+    python html_text.py --diff data/raw_customer_api.json
+runs both engines over every string the transformer cleans and reports any
+difference.
+"""
+import re
+import sys
+import json
+import argparse
+from html.entities import html5
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+
+# --- Tree-builder rules mirrored from BeautifulSoup's html.parser builder ---
+ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+VOID_TAGS = frozenset([
+    "area", "base", "basefont", "bgsound", "br", "col", "command", "embed", "frame", "hr", "image",
+    "img", "input", "isindex", "keygen", "link", "menuitem", "meta", "nextid", "param", "source",
+    "spacer", "track", "wbr",
+])
+PRESERVE_WHITESPACE_TAGS = frozenset(["pre", "textarea"])
+# Text inside these is stored as a special string type and left out of get_text
+STRING_CONTAINER_TAGS = frozenset(["rt", "rp", "style", "script", "template"])
+
+# Named entities without their trailing ';' (first spelling wins, as in bs4)
+ENTITIES: Dict[str, str] = {}
+for _name, _char in sorted(html5.items()):
+    ENTITIES.setdefault(_name[:-1] if _name.endswith(";") else _name, _char)
+
+_WINDOWS_1252_CONTROLS = frozenset(range(0x80, 0xA0)) - frozenset([0x81, 0x8D, 0x8F, 0x90, 0x9D])
+_NONCHARACTERS = frozenset(
+    [0xFFFE, 0xFFFF] + [plane * 0x10000 + low for plane in range(1, 17) for low in (0xFFFE, 0xFFFF)]
+)
+_DECIMAL_PREFIX = re.compile("^([0-9]+)(.*)")
+_HEX_PREFIX = re.compile("^([0-9a-f]+)(.*)")
+
+
+def numeric_char_ref(name: str) -> Tuple[str, str]:
+    """
+    Resolves the body of a numeric reference (``65``, ``x41``) the way
+    BeautifulSoup does. Returns (character, trailing_data).
+    """
+    base, prefix = 10, _DECIMAL_PREFIX
+    if name.startswith("x") or name.startswith("X"):
+        name, base, prefix = name[1:], 16, _HEX_PREFIX
+
+    extra = ""
+    try:
+        number = int(name, base)
+    except ValueError:
+        match = prefix.search(name)
+        if match is None:
+            return "", name
+        number, extra = int(match.group(1), base), match.group(2)
+
+    if number == 0 or number > 0x10FFFF or 0xD800 <= number <= 0xDFFF:
+        return "\ufffd", extra
+    if 0xFDD0 <= number <= 0xFDEF or number in _NONCHARACTERS:
+        return chr(number), extra
+    if number in _WINDOWS_1252_CONTROLS:
+        # References to Windows-1252 bytes (&#150; -> en dash)
+        return bytes([number]).decode("cp1252"), extra
+    return chr(number), extra
+
+
+def is_markup_free(text: str) -> bool:
+    """
+    True when text has no '<' and no '&': the tokenizer would hand it over as
+    a single data chunk, so there is nothing for an engine to do.
+    """
+    return "<" not in text and "&" not in text
+
+
+def plain_strings(text: str) -> List[str]:
+    """Text nodes of a markup-free string, computed without a parser."""
+    if not text:
+        return []
+    if not text.strip(ASCII_SPACES):
+        # Whitespace-only node collapses to one space / newline
+        return ["\n" if "\n" in text else " "]
+    return [text]
+
+
+class TextEngine:
+    """Interface: turn markup into its text nodes."""
+
+    name = "base"
+
+    def parse(self, markup: str) -> Tuple[List[str], List[str]]:
+        """Returns (text nodes in document order, tag names in document order)."""
+        raise NotImplementedError
+
+    def strings(self, markup: str) -> List[str]:
+        return self.parse(markup)[0]
+
+    def get_text(self, markup: str, separator: str = "", strip: bool = False) -> str:
+        """Same contract as BeautifulSoup's get_text(separator, strip)."""
+        strings = self.strings(markup)
+        if strip:
+            strings = [s for s in (s.strip() for s in strings) if s]
+        return separator.join(strings)
+
+
+class _TextCollector(HTMLParser):
+    """HTMLParser callbacks that keep text nodes and discard the tree."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.strings: List[str] = []
+        self.tags: List[str] = []
+        self._data: List[str] = []
+        self._stack: List[str] = []
+        self._containers = 0  # open <rt>/<script>/... tags
+        self._preserve = 0    # open <pre>/<textarea> tags
+        self._already_closed: List[str] = []  # void tags whose </tag> should be ignored
+
+    # -- text buffering --
+    def _flush(self, keep: Optional[bool] = None):
+        if not self._data:
+            return
+        text = "".join(self._data)
+        self._data = []
+        if not self._preserve and not text.strip(ASCII_SPACES):
+            text = "\n" if "\n" in text else " "
+        if keep is None:
+            keep = not self._containers
+        if keep:
+            self.strings.append(text)
+
+    def _push(self, tag: str):
+        self._stack.append(tag)
+        self._containers += tag in STRING_CONTAINER_TAGS
+        self._preserve += tag in PRESERVE_WHITESPACE_TAGS
+
+    def _pop_to(self, tag: str):
+        if tag not in self._stack:
+            return
+        while self._stack:
+            popped = self._stack.pop()
+            self._containers -= popped in STRING_CONTAINER_TAGS
+            self._preserve -= popped in PRESERVE_WHITESPACE_TAGS
+            if popped == tag:
+                break
+
+    # -- tokenizer callbacks --
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        self.tags.append(tag)
+        self._push(tag)
+        if tag in VOID_TAGS:
+            self._pop_to(tag)
+            self._already_closed.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self._flush()
+        self.tags.append(tag)
+        self._push(tag)
+        self._pop_to(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self._already_closed:
+            self._already_closed.remove(tag)
+            return
+        self._flush()
+        self._pop_to(tag)
+
+    def handle_data(self, data):
+        self._data.append(data)
+
+    def handle_charref(self, name):
+        char, extra = numeric_char_ref(name)
+        self._data.append(char)
+        self._data.append(extra)
+
+    def handle_entityref(self, name):
+        self._data.append(ENTITIES.get(name, "&" + name))
+
+    def handle_comment(self, data):
+        self._flush()
+
+    def handle_decl(self, decl):
+        self._flush()
+
+    def handle_pi(self, data):
+        self._flush()
+
+    def unknown_decl(self, data):
+        self._flush()
+        if data.upper().startswith("CDATA["):
+            # CDATA sections count as text, even inside string containers
+            self._data.append(data[len("CDATA["):])
+            self._flush(keep=True)
+
+
+class StreamingTextEngine(TextEngine):
+    """Tree-free extractor on the stdlib HTMLParser tokenizer (default)."""
+
+    name = "stream"
+
+    def parse(self, markup: str) -> Tuple[List[str], List[str]]:
+        collector = _TextCollector()
+        try:
+            collector.feed(markup)
+            collector.close()
+        except AssertionError as e:
+            # html.parser signals unparseable declarations this way
+            raise ValueError(f"html.parser rejected markup: {e}")
+        collector._flush()
+        return collector.strings, collector.tags
+
+
+class SoupTextEngine(TextEngine):
+    """BeautifulSoup reference backend."""
+
+    name = "soup"
+
+    def __init__(self):
+        from bs4 import BeautifulSoup
+        self._soup = BeautifulSoup
+
+    def parse(self, markup: str) -> Tuple[List[str], List[str]]:
+        soup = self._soup(markup, "html.parser")
+        return [str(s) for s in soup.strings], [tag.name for tag in soup.find_all()]
+
+
+ENGINES = {
+    StreamingTextEngine.name: StreamingTextEngine,
+    SoupTextEngine.name: SoupTextEngine,
+}
+DEFAULT_ENGINE = StreamingTextEngine.name
+
+
+def get_engine(engine=None) -> TextEngine:
+    """Accepts an engine name, an engine instance, or None for the default."""
+    if isinstance(engine, TextEngine):
+        return engine
+    name = engine or DEFAULT_ENGINE
+    if name not in ENGINES:
+        raise ValueError(f"Unknown HTML engine '{name}'. Choose from: {', '.join(ENGINES)}")
+    return ENGINES[name]()
+
+
+# --- DIFFERENTIAL MODE ---
+
+def corpus_strings(raw_data) -> List[Tuple[str, str]]:
+    """Every string the transformer runs through an engine, as (label, markup)."""
+    samples = []
+    for doc in raw_data:
+        if not isinstance(doc, dict):
+            continue
+        doc_id = doc.get("_id", "UNKNOWN_ID")
+
+        headlines = doc.get("headlines")
+        if isinstance(headlines, dict) and isinstance(headlines.get("basic"), str):
+            samples.append((f"{doc_id}/title", headlines["basic"]))
+
+        taxonomy = doc.get("taxonomy") or {}
+        categories = taxonomy.get("categories") if isinstance(taxonomy, dict) else None
+        for cat in categories if isinstance(categories, list) else []:
+            if isinstance(cat, dict) and isinstance(cat.get("name"), str):
+                samples.append((f"{doc_id}/category", cat["name"]))
+
+        for idx, element in enumerate(doc.get("content_elements") or []):
+            if isinstance(element, dict) and element.get("type") == "text" and isinstance(element.get("content"), str):
+                samples.append((f"{doc_id}/content_elements[{idx}]", element["content"]))
+    return samples
+
+
+def diff_engines(samples, engines=(DEFAULT_ENGINE, SoupTextEngine.name)) -> List[Dict[str, str]]:
+    """
+    Runs every (label, markup) sample through each engine and returns one
+    record per sample whose text nodes differ from the first engine's.
+    """
+    engines = [get_engine(e) for e in engines]
+    reference = engines[0]
+    differences = []
+    for label, markup in samples:
+        expected = reference.strings(markup)
+        for other in engines[1:]:
+            actual = other.strings(markup)
+            if actual != expected:
+                differences.append({
+                    "label": label,
+                    "markup": markup,
+                    reference.name: reference.get_text(markup, separator="\n"),
+                    other.name: other.get_text(markup, separator="\n"),
+                })
+    return differences
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare HTML-to-text engines over a raw CMS export.")
+    parser.add_argument("--diff", metavar="RAW_JSON", required=True, help="e.g. data/raw_customer_api.json")
+    parser.add_argument("--engines", nargs="+", default=[DEFAULT_ENGINE, SoupTextEngine.name], choices=list(ENGINES))
+    args = parser.parse_args()
+
+    with open(args.diff, "r", encoding="utf-8") as f:
+        samples = corpus_strings(json.load(f))
+
+    differences = diff_engines(samples, args.engines)
+    for d in differences:
+        print(json.dumps(d, ensure_ascii=False))
+
+    print(f"\n🔍 Compared {len(samples)} strings across engines {args.engines}: {len(differences)} differences")
+    sys.exit(1 if differences else 0)
@@ -0,0 +1,118 @@
+"""
+Near-duplicate detection for transformed documents (MinHash + LSH).
+
+Wire stories get republished under new `_id`s with a changed byline,
+dateline or footer. Embedding every copy costs API calls and index space
+for the same vector. NearDuplicateDetector groups documents whose text
+resemblance (Jaccard similarity of word shingles, estimated with MinHash)
+is at least `threshold`. Only the first document of each group is embedded;
+the others reuse its vector.
+
+LSH banding keeps it sub-quadratic: a document is only compared with
+earlier documents that share at least one band bucket with it, and every
+candidate pair is verified against the threshold before grouping.
+"""
+import hashlib
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def shingles(text: str, size: int = 5) -> set:
+    """Lowercased word `size`-grams; a text shorter than that is one shingle."""
+    words = text.lower().split()
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def lsh_params(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """
+    (bands, rows) for num_perm hashes whose LSH S-curve best separates pairs
+    above / below threshold. Misses are weighted over false candidates, since
+    candidates are verified anyway.
+    """
+    steps = 100
+
+    def area(f, lo, hi):
+        width = (hi - lo) / steps
+        return sum(f(lo + (i + 0.5) * width) for i in range(steps)) * width
+
+    best, best_cost = (num_perm, 1), float("inf")
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        false_candidates = area(lambda s: 1 - (1 - s ** rows) ** bands, 0.0, threshold)
+        misses = area(lambda s: (1 - s ** rows) ** bands, threshold, 1.0)
+        cost = 0.2 * false_candidates + 0.8 * misses
+        if cost < best_cost:
+            best, best_cost = (bands, rows), cost
+    return best
+
+
+class NearDuplicateDetector:
+    """
+    Streaming MinHash/LSH grouping. add() each document in order; a document
+    that matches an earlier one joins that one's group, whose representative
+    is the first document seen.
+    """
+
+    def __init__(self, threshold: float = 0.9, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError("threshold must be in (0, 1]")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self.bands, self.rows = lsh_params(threshold, num_perm)
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(self.bands)]
+        self._signatures: List[np.ndarray] = []
+        self.representative: List[int] = []
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = np.array(
+            [int.from_bytes(hashlib.blake2b(s.encode("utf-8", "surrogatepass"), digest_size=4).digest(), "little")
+             for s in shingles(text, self.shingle_size)],
+            dtype=np.uint64,
+        )
+        # Universal hashing (a*x + b) mod p per permutation; uint64 wrap-around is fine for hashing
+        permuted = ((np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME) & _MAX_HASH
+        return permuted.min(axis=0)
+
+    def similarity(self, i: int, j: int) -> float:
+        """MinHash estimate of the Jaccard similarity of documents i and j."""
+        return float(np.mean(self._signatures[i] == self._signatures[j]))
+
+    def add(self, text: str) -> int:
+        """Adds the next document; returns the index of its group's representative (its own if new)."""
+        index = len(self._signatures)
+        sig = self.signature(text)
+        self._signatures.append(sig)
+
+        keys = [sig[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+        candidates = sorted({j for band, key in enumerate(keys) for j in self._buckets[band].get(key, ())})
+        match = next((j for j in candidates if self.similarity(index, j) >= self.threshold), None)
+        self.representative.append(index if match is None else self.representative[match])
+
+        for band, key in enumerate(keys):
+            self._buckets[band].setdefault(key, []).append(index)
+        return self.representative[index]
+
+    def report(self) -> Dict[str, int]:
+        total = len(self.representative)
+        unique = sum(rep == i for i, rep in enumerate(self.representative))
+        groups = len({rep for i, rep in enumerate(self.representative) if rep != i})
+        return {"documents": total, "unique": unique, "duplicate_groups": groups,
+                "embeddings_saved": total - unique}
+
+
+def group_near_duplicates(texts: Sequence[str], threshold: float = 0.9, **kwargs) -> Tuple[List[int], Dict[str, int]]:
+    """representative[i] for every text (i itself when it is unique) and the detector's report."""
+    detector = NearDuplicateDetector(threshold, **kwargs)
+    for text in texts:
+        detector.add(text)
+    return detector.representative, detector.report()
@@ -4,7 +4,6 @@ import json
 import logging
 import csv
 import re
-from bs4 import BeautifulSoup
 from datetime import datetime, timezone
 from typing import Optional, Dict, Any, List
 from pydantic import BaseModel, Field, ValidationError
@@ -32,29 +31,183 @@ class QdrantDocument(BaseModel):
 
 import json
 import logging
+import logging.handlers
+import os
+import atexit
 import csv
 import re
-from bs4 import BeautifulSoup
+import argparse
+import multiprocessing
+from collections import deque
+from html_text import get_engine, is_markup_free, plain_strings
+from fragment_cache import FragmentCache
+from raw_reader import read_raw_documents
+from doc_store import open_doc_store
+from state_store import IngestionState
 from datetime import datetime, timezone
 from typing import Optional, Dict, Any, List
 
 # --- 1. SETUP LOGGING ---
-# This logger captures the "story" of each document
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[
-        logging.FileHandler("output/pipeline.log", mode='w', encoding='utf-8'), # 'w' overwrites log each run
-        logging.StreamHandler()
-    ]
-)
+# This logger captures the "story" of each document: one structured record
+# per document (see DataTransformer._log_document). Handlers are attached by
+# setup_logging(), never on import, so importing this module doesn't touch
+# output/pipeline.log.
 logger = logging.getLogger("CapitolPipeline")
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+_log_queue = None
+_log_listener = None
+_stop_registered = False
+
+
+def _stop_log_listener():
+    """Stops (flushing it) and closes the active listener, if any. Registered with atexit once."""
+    global _log_listener
+    listener, _log_listener = _log_listener, None
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+def setup_logging(log_path: str = "output/pipeline.log", mode: str = "a", level=logging.INFO,
+                  console: bool = True):
+    """
+    Sends CapitolPipeline records through a non-blocking QueueHandler; a
+    QueueListener thread does the file / console I/O off the transform
+    thread. The queue is a multiprocessing queue so pool workers can log
+    into it too. Returns the listener; it is stopped (and flushed) at exit.
+    """
+    global _log_queue, _log_listener, _stop_registered
+    _stop_log_listener()
+
+    directory = os.path.dirname(log_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [logging.FileHandler(log_path, mode=mode, encoding="utf-8")]
+    if console:
+        handlers.append(logging.StreamHandler())
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    _log_queue = multiprocessing.Queue(-1)
+    _log_listener = logging.handlers.QueueListener(_log_queue, *handlers, respect_handler_level=True)
+    _log_listener.start()
+    if not _stop_registered:
+        # After the first multiprocessing.Queue exists, so it runs before multiprocessing's own exit hook
+        atexit.register(_stop_log_listener)
+        _stop_registered = True
+
+    _attach_queue_handler(_log_queue, level)
+    return _log_listener
+
+
+def _attach_queue_handler(log_queue, level=logging.INFO):
+    logger.handlers = [logging.handlers.QueueHandler(log_queue)]
+    logger.setLevel(level)
+    logger.propagate = False
+
+# --- Body assembly helpers (see DataTransformer.parse_fragment) ---
+# Private-use code points that never occur in CMS text.
+_HEAD_MARK = "\ue000"
+_TAIL_MARK = "\ue001"
+# Elements whose markup can alter tokenization of their neighbours:
+# raw-text / string-container tags, comments and declarations, an entity
+# still open at the very end, or a "&#" that isn't a complete character
+# reference (the tokenizer then looks for a ';' further on, i.e. in the
+# following elements, to decide how much of the rest is plain text).
+_FRAGMENT_UNSAFE = re.compile(
+    r"<(?:script|style|template|textarea|title|xmp|iframe|noembed|noframes|noscript|plaintext|rt|rp)\b"
+    r"|<!|&[#\w.-]*$"
+    r"|&#(?!(?:[0-9]+|x[0-9a-f]+)[^0-9a-f])",
+    re.IGNORECASE,
+)
+
+VALIDATION_MODES = ("always", "sampled", "off")
+
 
 class DataTransformer:
-    def __init__(self):
-        # We can track state here if needed (e.g. total processed count)
-        pass
-        
+    def __init__(self, engine=None, cache_size: int = 10000, cache_path: Optional[str] = None,
+                 log_every: int = 1000, validate: str = "always", validate_every: int = 100):
+        """
+        engine:     HTML-to-text engine name ("stream" or "soup") or instance.
+                    Defaults to the streaming HTMLParser engine; see html_text.py.
+        cache_size: max cleaned titles / taxonomy names / paragraph fragments
+                    kept in the content-hash LRU cache (0 disables it).
+        cache_path: optional JSON file the cache is loaded from now and
+                    written to by save_cache(), so batch runs start warm.
+        log_every:  log 1 in N successfully transformed documents (1 logs
+                    all, 0 none). Failures are always logged.
+        validate:   "always" builds every output through the pydantic models;
+                    "sampled" validates 1 in validate_every documents and
+                    builds the rest directly; "off" trusts the extractors.
+        """
+        if validate not in VALIDATION_MODES:
+            raise ValueError(f"Unknown validation mode '{validate}'. Choose from: {', '.join(VALIDATION_MODES)}")
+        self.engine = get_engine(engine)
+        self.log_every = log_every
+        self._successes_seen = 0
+        self.validate = validate
+        self.validate_every = validate_every
+        self._outputs_built = 0
+        # Run counters surfaced in the telemetry dashboard
+        self.stats: Dict[str, int] = {
+            "html_fast_path": 0,   # strings with no '<' / '&': parser skipped
+            "html_full_parse": 0,  # strings handed to the HTML engine
+            "schema_validated": 0, # outputs built through MetadataModel / QdrantDocument
+            "schema_trusted": 0,   # outputs built directly (validate="sampled" / "off")
+        }
+
+        self.cache = FragmentCache(cache_size) if cache_size > 0 else None
+        self.cache_path = cache_path
+        if self.cache is not None and cache_path:
+            self.cache.load(cache_path)
+
+    def save_cache(self):
+        """Persists the fragment cache to cache_path (no-op without one)."""
+        if self.cache is not None and self.cache_path:
+            self.cache.save(self.cache_path)
+
+    def worker_config(self) -> Dict[str, Any]:
+        """Constructor arguments that rebuild this transformer in a worker process."""
+        return {
+            "engine": self.engine.name,
+            "cache_size": self.cache.max_entries if self.cache is not None else 0,
+            "cache_path": self.cache_path,
+            "log_every": self.log_every,
+            "validate": self.validate,
+            "validate_every": self.validate_every,
+        }
+
+    def merge_worker_state(self, stats: Dict[str, int], cache_entries):
+        """Folds a worker's counters and newly cached fragments into this transformer."""
+        for name, count in stats.items():
+            if name.startswith("cache_"):
+                if self.cache is not None:
+                    self.cache.stats[name[len("cache_"):]] += count
+            else:
+                self.stats[name] = self.stats.get(name, 0) + count
+        if self.cache is not None:
+            self.cache.merge(cache_entries)
+
+    def run_stats(self) -> Dict[str, int]:
+        """Text-cleaning counters plus fragment-cache hit/miss/eviction counts."""
+        stats = dict(self.stats)
+        if self.cache is not None:
+            stats.update({f"cache_{name}": count for name, count in self.cache.stats.items()})
+        return stats
+
+    def parse_html(self, markup):
+        """
+        Returns (text nodes, tag names) for markup. Markup-free strings skip
+        the engine entirely; only whitespace normalization applies.
+        """
+        if is_markup_free(markup):
+            self.stats["html_fast_path"] += 1
+            return plain_strings(markup), []
+        self.stats["html_full_parse"] += 1
+        return self.engine.parse(markup)
+
 
     def clean_text(self, raw_string):
         if raw_string is None:
@@ -64,10 +217,16 @@ class DataTransformer:
         if not isinstance(raw_string, str):
             raw_string = str(raw_string)
     
+        # Markup-free strings are already cheaper than a cache lookup
+        if self.cache is None or is_markup_free(raw_string):
+            return self._clean_text_uncached(raw_string)
+        return self.cache.get_or_compute("text", raw_string, lambda: self._clean_text_uncached(raw_string))
+
+    def _clean_text_uncached(self, raw_string):
         # CHANGE HERE: Use \n separator to preserve paragraph structure
         # and strip=True to remove leading/trailing whitespace from each block
-        soup = BeautifulSoup(raw_string, "html.parser")
-        text = soup.get_text(separator="\n")
+        strings, _ = self.parse_html(raw_string)
+        text = "\n".join(strings)
         
         return text
 
@@ -75,24 +234,20 @@ class DataTransformer:
         """Helper: Removes HTML tags and returns clean text."""
         if not raw_html:
             return ""
-        soup = BeautifulSoup(raw_html, "html.parser")
-
-        text = soup.get_text(separator="\n")
+        text = self.engine.get_text(raw_html, separator="\n")
         return text
 
     def clean_html(self, raw_html):
         """Helper: Removes HTML tags and returns clean text."""
         if not raw_html:
             return "", False
-        soup = BeautifulSoup(raw_html, "html.parser")
-
-        tags_found = [tag.name for tag in soup.find_all()]
+        strings, tags_found = self.parse_html(raw_html)
         # if tags_found:
         #     print(f"DEBUG: Found HTML tags: {tags_found}")
         # else:
         #     print("DEBUG: No HTML tags found (Plain text).")
     
-        text = soup.get_text(separator="\n", strip=True)
+        text = "\n".join(s for s in (s.strip() for s in strings) if s)
         return text, tags_found
 
     def get_text_body_old_working(self, raw_doc):
@@ -146,9 +301,11 @@ class DataTransformer:
         # return " ".join(text_parts)
         return full_text
 
-    def get_text_body(self, raw_doc):
+    def get_text_body_legacy(self, raw_doc):
         """
-        Loops through 'content_elements' to build the full article text.
+        Original body builder: re-parses the whole accumulated HTML after every
+        element (quadratic). Kept as the reference for parity tests and
+        benchmarks/bench_text_body.py.
         """
         text_parts = []
         elements = raw_doc.get('content_elements', [])
@@ -169,6 +326,104 @@ class DataTransformer:
         
         return full_text.strip()
 
+    def parse_fragment(self, content):
+        """
+        Parses ONE content element into the raw text nodes the engine would
+        produce for it inside the joined body.
+        Returns (nodes, head_open, tail_open), or None when the element can
+        change how its neighbours are tokenized (caller must parse the body
+        as a whole).
+
+        head_open / tail_open say whether the element starts / ends with plain
+        text, i.e. whether that text merges with the " " separator and the
+        neighbouring element into a single text node.
+        """
+        if _HEAD_MARK in content or _TAIL_MARK in content:
+            return None
+        if is_markup_free(content):
+            # Plain paragraph: one text run, no parse needed
+            self.stats["html_fast_path"] += 1
+            return (content,), True, True
+
+        if self.cache is None:
+            return self._parse_markup_fragment(content)
+        return self.cache.get_or_compute("fragment", content, lambda: self._parse_markup_fragment(content))
+
+    def _parse_markup_fragment(self, content):
+        if _FRAGMENT_UNSAFE.search(content):
+            return None
+
+        # The marks stand in for the neighbouring text: if a mark ends up glued
+        # to a text node, the element starts/ends with text.
+        nodes, _ = self.parse_html(_HEAD_MARK + content + _TAIL_MARK)
+        if not nodes or not nodes[0].startswith(_HEAD_MARK) or not nodes[-1].endswith(_TAIL_MARK):
+            # A mark was swallowed by a <script>, <rt>, ... left open
+            return None
+        if any("<" in node for node in nodes):
+            # A '<' left in the text means the tokenizer gave up on an
+            # unterminated tag, which would run into the next element
+            return None
+
+        if len(nodes) == 1:
+            # No markup boundary inside: the element is one run of text
+            return (nodes[0][1:-1],), True, True
+
+        head_open = nodes[0] != _HEAD_MARK
+        nodes[0] = nodes[0][1:]
+        tail_open = nodes[-1] != _TAIL_MARK
+        nodes[-1] = nodes[-1][:-1]
+        if not head_open:
+            nodes = nodes[1:]
+        if not tail_open:
+            nodes = nodes[:-1]
+        return tuple(nodes), head_open, tail_open
+
+    def get_text_body(self, raw_doc):
+        """
+        Loops through 'content_elements' to build the full article text.
+
+        Each element is parsed once and the text nodes are stitched together
+        exactly as a single parse of the space-joined HTML would produce them:
+        text touching an element boundary merges with its neighbour, everything
+        else becomes its own line. Output matches get_text_body_legacy.
+        """
+        contents = []
+        for element in raw_doc.get('content_elements', []):
+            # Case A: Standard Text or Headers
+            if element.get('type', '') in ['text']:
+                content = element.get('content', '')
+                if content:
+                    contents.append(content)
+
+        lines = []
+        pending = ""  # text run still open at the end of the body so far
+        for content in contents:
+            fragment = self.parse_fragment(content)
+            if fragment is None:
+                # Element spills into its neighbours: one parse of the joined
+                # body (still linear, just no per-element reuse)
+                full_text, _ = self.clean_html("".join(" " + c for c in contents))
+                return full_text.strip()
+
+            nodes, head_open, tail_open = fragment
+            pending += " "
+            if head_open and tail_open and len(nodes) == 1:
+                pending += nodes[0]
+                continue
+            first, last = 0, len(nodes)
+            if head_open:
+                pending += nodes[0]
+                first = 1
+            lines.append(pending)
+            pending = ""
+            if tail_open:
+                last -= 1
+                pending = nodes[last]
+            lines.extend(nodes[first:last])
+        lines.append(pending)
+
+        return "\n".join(line for line in (l.strip() for l in lines) if line)
+
     def extract_title(self, article):
         headlines = article.get("headlines")
         if not isinstance(headlines, dict):
@@ -388,101 +643,95 @@ class DataTransformer:
 
     # --- MAIN PROCESSOR WITH DETAILED LOGGING ---
     # --- MAIN PROCESSOR WITH DETAILED LOGGING ---
+    def _should_validate(self) -> bool:
+        if self.validate == "always":
+            return True
+        if self.validate == "off":
+            return False
+        built = self._outputs_built
+        self._outputs_built += 1
+        return self.validate_every > 0 and built % self.validate_every == 0
+
+    def _log_document(self, report: Dict[str, Any], level=logging.INFO, **fields):
+        """
+        One structured record per document instead of a line per field.
+        Successes are sampled (1 in log_every); failures are always logged.
+        """
+        if report["status"] == "SUCCESS":
+            seen = self._successes_seen
+            self._successes_seen += 1
+            if not self.log_every or seen % self.log_every:
+                return
+        if not logger.isEnabledFor(level):
+            return
+
+        entry = {"id": report["id"], "status": report["status"]}
+        if report.get("reason"):
+            entry["reason"] = report["reason"]
+        entry.update(fields)
+        icon = "🎉" if report["status"] == "SUCCESS" else "⚠️"
+        logger.log(level, "%s %s", icon, json.dumps(entry, ensure_ascii=False), extra={"document": entry})
+
     def process_document(self, raw_doc: dict) -> tuple[Optional[Dict], Dict]:
         """
-        Orchestrates transformation with comprehensive logging for ALL fields.
+        Orchestrates transformation and logs one structured record per
+        document listing which fields were found and which were missing.
         Returns: (Processed Document OR None, Report Dictionary)
         """
         if not isinstance(raw_doc, dict):
-            logger.error(f"❌ SKIPPING: raw_doc is not a dict (got {type(raw_doc).__name__})")
-            return None, {
+            report = {
                 "id": "UNKNOWN_ID",
                 "status": "SKIPPED",
                 "reason": "Invalid document type (expected object)"
             }
+            self._log_document(report, logging.ERROR, type=type(raw_doc).__name__)
+            return None, report
 
         doc_id = raw_doc.get('_id', 'UNKNOWN_ID')
         report: Dict[str, Any] = {"id": doc_id, "status": "SKIPPED", "reason": "Unknown"}
-
-        logger.info(f"📄 Processing Document ID: {doc_id}")
+        found: List[str] = []
+        missing: List[str] = []
 
         # --- 1. CRITICAL CHECKS (Fail if missing) ---
         external_id = self.extract_id(raw_doc)
         if not external_id:
-            logger.error("❌ SKIPPING: Document missing '_id'.")
             report["reason"] = "Missing ID"
+            self._log_document(report, logging.ERROR, missing=["_id"])
             return None, report
 
         url = self.extract_url_general(raw_doc)
         if not url:
-            logger.warning(f"   ⚠️ SKIPPING {doc_id}: Required field 'url' not found.")
             report["reason"] = "Missing URL"
+            self._log_document(report, logging.WARNING, missing=["url"])
             return None, report
-        logger.info(f"   ✅ URL found: {url}")
+        found.append("url")
 
         text_content = self.get_text_body(raw_doc)
         if not text_content or not text_content.strip():
-            logger.warning(f"   ⚠️ SKIPPING {doc_id}: Required field 'text' is empty.")
             report["reason"] = "Missing Text"
+            self._log_document(report, logging.WARNING, found=found, missing=["text"])
             return None, report
-        logger.info(f"   ✅ Text body found ({len(text_content)} chars).")
+        found.append("text")
 
-        # --- 2. OPTIONAL FIELD CHECKS (Log existence) ---
+        # --- 2. OPTIONAL FIELD CHECKS (Record existence) ---
         title = self.extract_title(raw_doc)
-        if title:
-            logger.info(f"   ☑️ Title found: '{title[:30]}...'")
-        else:
-            logger.info("   ⚪ Title NOT found.")
-
         pub_date = self.extract_publish_date(raw_doc)
-        if pub_date:
-            logger.info(f"   ☑️ Publish Date found: {pub_date}")
-        else:
-            logger.info("   ⚪ Publish Date NOT found.")
-
         first_pub = self.extract_first_publish_date(raw_doc)
-        if first_pub:
-            logger.info(f"   ☑️ First Publish Date found: {first_pub}")
-        else:
-            logger.info("   ⚪ First Publish Date NOT found.")
-
         doc_time = self.extract_datetime(raw_doc)
-        if doc_time:
-            logger.info(f"   ☑️ Datetime found: {doc_time}")
-        else:
-            logger.info("   ⚪ Datetime NOT found.")
-
         website = self.extract_website(raw_doc)
-        if website:
-            logger.info(f"   ☑️ Website found: {website}")
-        else:
-            logger.info("   ⚪ Website NOT found.")
-
         thumb = self.extract_thumb(raw_doc)
-        if thumb:
-            logger.info("   ☑️ Thumbnail found.")
-        else:
-            logger.info("   ⚪ Thumbnail NOT found.")
 
         # Taxonomy lists
         sections = self.extract_sections(raw_doc)
         categories = self.extract_categories(raw_doc)
         tags = self.extract_tags(raw_doc)
 
-        if sections:
-            logger.info(f"   ☑️ Sections found: {len(sections)} items")
-        else:
-            logger.info("   ⚪ Sections empty.")
-
-        if categories:
-            logger.info(f"   ☑️ Categories found: {len(categories)} items")
-        else:
-            logger.info("   ⚪ Categories empty.")
-
-        if tags:
-            logger.info(f"   ☑️ Tags found: {len(tags)} items")
-        else:
-            logger.info("   ⚪ Tags empty.")
+        for name, value in (
+            ("title", title), ("publish_date", pub_date), ("first_publish_date", first_pub),
+            ("datetime", doc_time), ("website", website), ("thumb", thumb),
+            ("sections", sections), ("categories", categories), ("tags", tags),
+        ):
+            (found if value else missing).append(name)
 
         # --- 3. BUILD METADATA ---
         try:
@@ -516,42 +765,53 @@ class DataTransformer:
             if thumb:
                 metadata["thumb"] = thumb
 
-            try:
-                meta_model = MetadataModel(**metadata)
-                doc_model = QdrantDocument(
-                    text=text_content,
-                    metadata=meta_model,
-                )
-            except ValidationError as ve:
-                logger.error(f"   ❌ Validation failed for {doc_id}: {ve}")
-                report["reason"] = "Schema validation failed"
-                return None, report
-
-            logger.info(f"   🎉 Document {doc_id} successfully transformed.")
+            if self._should_validate():
+                try:
+                    meta_model = MetadataModel(**metadata)
+                    doc_model = QdrantDocument(
+                        text=text_content,
+                        metadata=meta_model,
+                    )
+                except ValidationError as ve:
+                    report["reason"] = "Schema validation failed"
+                    self._log_document(report, logging.ERROR, found=found, missing=missing, error=str(ve))
+                    return None, report
+
+                # exclude_none=True ensures we don't output "title": null
+                output = doc_model.model_dump(exclude_none=True)
+                self.stats["schema_validated"] += 1
+            else:
+                # Trusted fast path: the extractors only return str / list[str]
+                # and metadata is already in MetadataModel field order with no
+                # None values, so this equals the model_dump above.
+                output = {"text": text_content, "metadata": metadata}
+                self.stats["schema_trusted"] += 1
+
             report["status"] = "SUCCESS"
             report["reason"] = ""
-
-            # exclude_none=True ensures we don't output "title": null
-            return doc_model.model_dump(exclude_none=True), report
+            self._log_document(report, found=found, missing=missing, text_chars=len(text_content))
+            return output, report
 
         except Exception as e:
-            logger.error(f"   💥 CRITICAL ERROR on {doc_id}: {e}")
             report["reason"] = f"Crash: {str(e)}"
+            self._log_document(report, logging.ERROR, found=found, missing=missing)
             return None, report
 dead_letter_path = "output/dead_letter_queue.jsonl"
 
 
-def print_telemetry_dashboard(report_data):
+def print_telemetry_dashboard(report_data, stats=None):
     """
     Prints a simple reliability dashboard to the console.
+    stats: optional DataTransformer.run_stats() counters for the run.
     """
     total = len(report_data)
-    if total == 0: return
+    skipped_unchanged = (stats or {}).get("skipped_unchanged", 0)
+    if total == 0 and not skipped_unchanged: return
 
     # 1. Calculate Metrics
     success = sum(1 for r in report_data if r['status'] == 'SUCCESS')
     failed = total - success
-    success_rate = (success / total) * 100
+    success_rate = (success / total) * 100 if total else 100.0
 
     # 2. Group Failure Reasons
     failures = {}
@@ -567,6 +827,8 @@ def print_telemetry_dashboard(report_data):
     print(f" • Total Documents:   {total}")
     print(f" • Success Rate:      {success_rate:.1f}%")
     print(f" • Failed/Skipped:    {failed}")
+    if stats and "skipped_unchanged" in stats:
+        print(f" • Skipped Unchanged: {skipped_unchanged}")
     
     if failures:
         print("\n ⚠️  FAILURE BREAKDOWN (ROOT CAUSE)")
@@ -574,41 +836,212 @@ def print_telemetry_dashboard(report_data):
         # Sort by count (highest first)
         for reason, count in sorted(failures.items(), key=lambda x: x[1], reverse=True):
             print(f"   - {reason:<20} : {count} docs")
+
+    if stats:
+        print("\n ⚡ TEXT CLEANING")
+        print("-" * 40)
+        print(f"   - Fast path (no markup) : {stats.get('html_fast_path', 0)} strings")
+        print(f"   - Full HTML parse       : {stats.get('html_full_parse', 0)} strings")
+        if "cache_hits" in stats:
+            lookups = stats["cache_hits"] + stats["cache_misses"]
+            hit_rate = (stats["cache_hits"] / lookups * 100) if lookups else 0.0
+            print(f"   - Fragment cache        : {stats['cache_hits']} hits / {stats['cache_misses']} misses "
+                  f"({hit_rate:.1f}%), {stats['cache_evictions']} evictions")
+        if stats.get("schema_validated") or stats.get("schema_trusted"):
+            print(f"   - Schema validated      : {stats['schema_validated']} docs "
+                  f"({stats['schema_trusted']} built on the trusted fast path)")
     print("="*40 + "\n")
 
 
+# --- PARALLEL TRANSFORMATION ---
+
+def available_cpus() -> int:
+    """
+    CPUs this process can actually use: the scheduler affinity mask, capped
+    by the cgroup CPU quota when running in a container.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    quota = None
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open("/sys/fs/cgroup/cpu.max", "r") as f:
+            limit, period = f.read().split()[:2]
+        if limit != "max":
+            quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us", "r") as f:
+                limit = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us", "r") as f:
+                period = int(f.read())
+            if limit > 0 and period > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+
+    if quota:
+        cpus = min(cpus, int(quota))
+    return max(1, cpus)
+
+
+_worker_transformer = None
+
+
+def _init_worker(config, log_queue=None, log_level=logging.INFO):
+    global _worker_transformer
+    if log_queue is not None:
+        # Worker records go to the parent's listener
+        _attach_queue_handler(log_queue, log_level)
+    _worker_transformer = DataTransformer(**config)
+    if _worker_transformer.cache is not None:
+        _worker_transformer.cache.track_new = True
+
+
+def _transform_chunk(chunk):
+    """Worker: process one shard; returns results plus counter deltas and new cache entries."""
+    transformer = _worker_transformer
+    before = transformer.run_stats()
+    results = [transformer.process_document(doc) for doc in chunk]
+    after = transformer.run_stats()
+
+    stats_delta = {name: count - before.get(name, 0) for name, count in after.items()}
+    cache_entries = transformer.cache.take_new_entries() if transformer.cache is not None else []
+    return results, stats_delta, cache_entries
+
+
+def _chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def transform_documents(raw_docs, transformer: DataTransformer, workers: Optional[int] = 1,
+                        chunk_size: Optional[int] = None):
+    """
+    Yields (raw_doc, processed_doc, report) for every input document, in input
+    order, so callers keep their sequential upsert / report / dead-letter logic.
+
+    workers=1 runs in-process. workers=N > 1 shards the input across a process
+    pool in chunks; workers=None picks available_cpus(). Worker counters and
+    newly cached fragments are merged back into `transformer`.
+    """
+    if workers is None:
+        workers = available_cpus()
+
+    if workers <= 1:
+        for doc in raw_docs:
+            processed_doc, report = transformer.process_document(doc)
+            yield doc, processed_doc, report
+        return
+
+    if chunk_size is None:
+        # ~4 chunks per worker balances load without drowning in IPC
+        total = len(raw_docs) if hasattr(raw_docs, "__len__") else None
+        chunk_size = max(1, min(256, -(-total // (workers * 4)))) if total else 64
+
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(transformer.worker_config(), _log_queue, logger.level)) as pool:
+        # Bounded window of in-flight chunks: Pool.imap would drain the whole
+        # input up front, which defeats streaming the export from disk.
+        # Raw docs stay on our side so they don't travel back through the pipe.
+        in_flight = deque()
+        max_in_flight = workers * 2
+
+        def drain_one():
+            chunk, pending = in_flight.popleft()
+            results, stats_delta, cache_entries = pending.get()
+            transformer.merge_worker_state(stats_delta, cache_entries)
+            for doc, (processed_doc, report) in zip(chunk, results):
+                yield doc, processed_doc, report
+
+        for chunk in _chunks(raw_docs, chunk_size):
+            in_flight.append((chunk, pool.apply_async(_transform_chunk, (chunk,))))
+            if len(in_flight) >= max_in_flight:
+                yield from drain_one()
+        while in_flight:
+            yield from drain_one()
+
+
 # --- MAIN EXECUTION ---
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch-transform raw CMS documents into Qdrant format.")
+    parser.add_argument("--cache-size", type=int, default=10000,
+                        help="max entries in the cleaned-fragment cache (0 disables it)")
+    parser.add_argument("--cache-file", default=None,
+                        help="persist the fragment cache here between runs (e.g. output/fragment_cache.json)")
+    parser.add_argument("--input", default="data/raw_customer_api.json",
+                        help="raw CMS export: a JSON array or JSON Lines file, read one document at a time")
+    parser.add_argument("--input-format", choices=["array", "jsonl"], default=None,
+                        help="input layout (default: detected from the file)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes for transformation (default: CPUs available to this container)")
+    parser.add_argument("--spill", metavar="SPOOL_PATH", default=None,
+                        help="stream processed docs to this append-only JSONL spool instead of holding them in RAM")
+    parser.add_argument("--spill-index", choices=["memory", "disk"], default="memory",
+                        help="external_id -> offset index for --spill: a dict, or SQLite + Bloom filter for huge runs")
+    parser.add_argument("--log-file", default="output/pipeline.log",
+                        help="per-document log (overwritten each run)")
+    parser.add_argument("--log-every", type=int, default=1000,
+                        help="log 1 in N successful documents (1 = all, 0 = none); failures are always logged")
+    parser.add_argument("--validate", choices=list(VALIDATION_MODES), default="always",
+                        help="pydantic validation of outputs: every doc, a 1-in-N sample, or none")
+    parser.add_argument("--validate-every", type=int, default=100,
+                        help="sample size N for --validate sampled")
+    parser.add_argument("--state-db", default=None,
+                        help="incremental mode: skip docs unchanged since the last run (e.g. output/ingestion_state.sqlite)")
+    parser.add_argument("--delta-output", default="output/processed_output_delta.json",
+                        help="with --state-db: where the new/changed docs go; the full output file is left as is")
+    args = parser.parse_args()
+    setup_logging(args.log_file, mode="w")
+    workers = args.workers if args.workers is not None else available_cpus()
+
     try:
-        with open("data/raw_customer_api.json", "r", encoding="utf-8") as f:
-            raw_data = json.load(f)
+        raw_docs = read_raw_documents(args.input, args.input_format)
     except FileNotFoundError:
-        print("❌ Error: 'raw_customer_api.json' not found.")
+        print(f"❌ Error: '{args.input}' not found.")
         exit(1)
 
-    transformer = DataTransformer()
+    transformer = DataTransformer(cache_size=args.cache_size, cache_path=args.cache_file,
+                                  log_every=args.log_every, validate=args.validate,
+                                  validate_every=args.validate_every)
     
     # Key = external_id, Value = processed_doc
-    # Using a dict ensures that if the same ID appears later, it overwrites the old one (Update).
-    valid_docs_map = {}
+    # Last write wins: if the same ID appears later, it overwrites the old one (Update).
+    # With --spill, docs go to a JSONL spool and only an ID -> offset index stays in memory.
+    doc_store = open_doc_store(args.spill, index=args.spill_index)
     report_data = []
 
-    print(f"🚀 Starting ingestion of {len(raw_data)} documents...")
+    # Incremental mode: unchanged docs are dropped here, before any HTML parsing
+    state = IngestionState(args.state_db) if args.state_db else None
+    if state is not None:
+        raw_docs = state.filter_changed(raw_docs)
+
+    print(f"🚀 Starting ingestion of {args.input} with {workers} worker(s)...")
 
-    for doc in raw_data:
-        # 1. Process EVERY document first
-        processed_doc, report = transformer.process_document(doc)
+    # 1. Process EVERY document first (streamed from disk, results arrive in input order)
+    total_input = 0
+    for doc, processed_doc, report in transform_documents(raw_docs, transformer, workers=workers):
+        total_input += 1
         report_data.append(report)
         
         if processed_doc:
             # 2. Check for ID and handle Upsert (Update/Insert)
             ext_id = processed_doc.get('metadata', {}).get('external_id')
             if ext_id:
-                if ext_id in valid_docs_map:
-                    logger.info(f"   🔄 UPDATING: Overwriting existing record for ID {ext_id}")
-                
                 # This line handles both Insert (new key) and Update (overwrite value)
-                valid_docs_map[ext_id] = processed_doc
+                if doc_store.upsert(ext_id, processed_doc):
+                    logger.info(f"   🔄 UPDATING: Overwriting existing record for ID {ext_id}")
+            if state is not None:
+                state.record(doc)
         else:
             # 3. Handle Failures (Missing URL/ID/Text)
             doc_id = doc.get('_id', 'UNKNOWN')
@@ -620,12 +1053,12 @@ if __name__ == "__main__":
                 }
                 dl.write(json.dumps(record, ensure_ascii=False) + "\n")
 
-    # Convert map back to list for final JSON output
-    valid_docs = list(valid_docs_map.values())
-
-    # Save Valid Output (JSON)
-    with open("output/processed_output_updated_2.json", "w", encoding="utf-8") as f:
-        json.dump(valid_docs, f, indent=2, ensure_ascii=False)
+    # Save Valid Output (JSON); for a spill store this is the compaction pass.
+    # An incremental run only holds the delta, so it must not replace the full output.
+    total_unique_output = len(doc_store)
+    output_path = args.delta_output if state is not None else "output/processed_output_updated_2.json"
+    doc_store.write_json(output_path)
+    doc_store.close()
 
     # Save Summary Report (CSV)
     with open("output/ingestion_report.csv", "w", newline="", encoding="utf-8") as f:
@@ -634,36 +1067,38 @@ if __name__ == "__main__":
         writer.writerows(report_data)
 
 
-    print_telemetry_dashboard(report_data)
+    transformer.save_cache()
+    run_stats = transformer.run_stats()
+    if state is not None:
+        state.close()
+        run_stats["skipped_unchanged"] = state.skipped
+    print_telemetry_dashboard(report_data, run_stats)
     # Calculate Stats for Final Print
-    total_input = len(raw_data)
-    total_unique_output = len(valid_docs)
     total_failures = len([r for r in report_data if r['status'] != 'SUCCESS'])
     # Math: The missing count is the duplicates that were absorbed/merged
     total_merged = total_input - total_unique_output - total_failures
 
     print("\n✅ Processing Complete!")
     print(f"   - Total Input:      {total_input}")
-    print(f"   - Unique Success:   {total_unique_output} (Saved to processed_output_updated.json)")
+    if state is not None:
+        print(f"   - Skipped:          {state.skipped} (Unchanged since last run)")
+    print(f"   - Unique Success:   {total_unique_output} (Saved to {os.path.basename(output_path)})")
     print(f"   - Duplicates:       {total_merged} (Merged/Updated)")
     print(f"   - Failures:         {total_failures} (Sent to Dead Letter Queue)")
     print(f"   - Detailed Logs:    pipeline.log")
     print(f"   - Summary Report:   ingestion_report.csv")
 
 
-def execute_transformation_step(input_file: str, output_file: str) -> List[Dict]:
+def execute_transformation_step(input_file: str, output_file: str, workers: Optional[int] = 1) -> List[Dict]:
     transformer = DataTransformer()
     try:
-        with open(input_file, "r", encoding="utf-8") as f:
-            raw_data = json.load(f)
+        raw_docs = read_raw_documents(input_file)
     except FileNotFoundError:
         raise FileNotFoundError(f"Input file '{input_file}' not found.")
     
     valid_docs_map = {}
     
-    for doc in raw_data:
-        result, report = transformer.process_document(doc)
-        
+    for doc, result, report in transform_documents(raw_docs, transformer, workers=workers):
         if result: 
             ext_id = result.get('metadata', {}).get('external_id')
             if ext_id:
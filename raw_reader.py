@@ -0,0 +1,131 @@
+"""
+Incremental readers for raw CMS exports.
+
+Nightly exports are multi-GB, so instead of json.load-ing the whole file the
+pipeline pulls one raw document at a time. Two layouts are supported:
+- "array": a single top-level JSON array (what the CMS API returns)
+- "jsonl": one JSON document per line
+
+Peak memory is bounded by the largest single document plus one read chunk,
+not by the file size.
+"""
+import json
+from typing import Any, Iterator, Optional
+
+READ_CHUNK_SIZE = 1 << 16
+_WHITESPACE = " \t\n\r"
+# What may follow an array element; anything else means it may continue in the next chunk
+_AFTER_ELEMENT = _WHITESPACE + ",]"
+_decoder = json.JSONDecoder()
+
+
+def detect_format(path: str) -> str:
+    """'jsonl' for .jsonl/.ndjson files, otherwise sniffs the first non-blank character."""
+    if path.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    with open(path, "r", encoding="utf-8") as f:
+        while True:
+            chunk = f.read(1024)
+            if not chunk:
+                return "array"
+            stripped = chunk.lstrip(_WHITESPACE + "\ufeff")
+            if stripped:
+                return "array" if stripped[0] == "[" else "jsonl"
+
+
+def iter_json_array(fp, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Any]:
+    """
+    Yields the elements of a top-level JSON array from a text file object,
+    decoding one element at a time from a sliding buffer.
+    """
+    buf = ""
+    pos = 0
+    eof = False
+
+    def fill():
+        # Drop what was consumed and append the next chunk; False at EOF
+        nonlocal buf, pos, eof
+        # Grow geometrically so a document larger than one chunk isn't re-decoded per chunk
+        data = fp.read(max(chunk_size, len(buf) - pos))
+        buf = buf[pos:] + data
+        pos = 0
+        eof = not data
+        return not eof
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            if pos < len(buf) or not fill():
+                return
+
+    fill()
+    if buf.startswith("\ufeff"):
+        pos = 1
+    skip_whitespace()
+    if pos >= len(buf) or buf[pos] != "[":
+        raise ValueError("Expected a top-level JSON array")
+    pos += 1
+
+    first = True
+    while True:
+        skip_whitespace()
+        if pos >= len(buf):
+            raise ValueError("Unterminated JSON array")
+        if buf[pos] == "]":
+            return
+        if not first:
+            if buf[pos] != ",":
+                raise ValueError(f"Expected ',' or ']' in JSON array, got {buf[pos]!r}")
+            pos += 1
+            skip_whitespace()
+        first = False
+
+        while True:
+            try:
+                value, end = _decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if fill():
+                    continue
+                raise
+            # A number cut by the chunk boundary decodes short ("1." of "1.5e3"):
+            # only trust the value once a delimiter follows it
+            if not eof and (end == len(buf) or buf[end] not in _AFTER_ELEMENT) and fill():
+                continue
+            break
+        pos = end
+        yield value
+
+
+def iter_jsonl(fp) -> Iterator[Any]:
+    """Yields one document per non-blank line of a JSON Lines file object."""
+    for line_number, line in enumerate(fp, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON on line {line_number}: {e}")
+
+
+def read_raw_documents(path: str, fmt: Optional[str] = None) -> Iterator[Any]:
+    """
+    Opens path right away (so a missing file fails here, not on first
+    iteration) and returns a generator of raw documents.
+    fmt: "array", "jsonl", or None to detect it.
+    """
+    fmt = fmt or detect_format(path)
+    if fmt not in ("array", "jsonl"):
+        raise ValueError(f"Unknown input format '{fmt}'. Choose from: array, jsonl")
+    fp = open(path, "r", encoding="utf-8")
+
+    def documents():
+        with fp:
+            if fmt == "jsonl":
+                yield from iter_jsonl(fp)
+            else:
+                yield from iter_json_array(fp)
+
+    return documents()
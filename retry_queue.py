@@ -0,0 +1,64 @@
+"""
+Persistent queue of documents whose embedding failed for good.
+
+EmbeddingModel already retries transient errors and bisects failed batches,
+so what is left after generate_embeddings is either a bad input or an
+outage that outlasted the retries. Instead of dropping those documents,
+the API parks them here, keyed by external_id (a newer version of the same
+document replaces the queued one), and /pipeline/retry_failed re-embeds
+and indexes them later.
+"""
+import os
+import json
+import sqlite3
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Tuple
+
+
+class RetryQueue:
+    """SQLite table of external_id -> processed document, last error and attempt count."""
+
+    def __init__(self, path: str = "output/embedding_retry_queue.sqlite"):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pending ("
+            " doc_id TEXT PRIMARY KEY,"
+            " document TEXT NOT NULL,"
+            " reason TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 1,"
+            " failed_at TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+
+    def push(self, doc_id: str, doc: Dict[str, Any], reason: str):
+        """Queues doc (without its vector). Pushing a queued ID again counts another attempt."""
+        doc = {k: v for k, v in doc.items() if k != "vector"}
+        now = datetime.now(timezone.utc).isoformat()
+        self._conn.execute(
+            "INSERT INTO pending (doc_id, document, reason, failed_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(doc_id) DO UPDATE SET document = excluded.document, reason = excluded.reason, "
+            "attempts = attempts + 1, failed_at = excluded.failed_at",
+            (str(doc_id), json.dumps(doc, ensure_ascii=False), reason, now),
+        )
+        self._conn.commit()
+
+    def pending(self, limit: int = 100) -> List[Tuple[str, Dict[str, Any], int]]:
+        """Oldest failures first, as (doc_id, document, attempts)."""
+        rows = self._conn.execute(
+            "SELECT doc_id, document, attempts FROM pending ORDER BY failed_at LIMIT ?", (limit,)
+        ).fetchall()
+        return [(doc_id, json.loads(document), attempts) for doc_id, document, attempts in rows]
+
+    def remove(self, doc_ids: Iterable[str]):
+        self._conn.executemany("DELETE FROM pending WHERE doc_id = ?", [(str(d),) for d in doc_ids])
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
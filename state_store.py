@@ -0,0 +1,95 @@
+"""
+Local state for incremental ingestion.
+
+Most of a daily export is unchanged from the previous day. IngestionState
+remembers, per `_id`, a fingerprint of the last version that made it all
+the way through the pipeline, so an unchanged document can be skipped
+before any HTML parsing, embedding or indexing.
+
+The fingerprint comes from the CMS revision markers (`revision.revision_id`,
+`last_updated_date`, `version`) when the document has them, and from a
+SHA-256 of the canonical JSON otherwise.
+
+Only successes are recorded (see record()), so failed documents are retried
+on the next run.
+"""
+import os
+import json
+import sqlite3
+import hashlib
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+
+def document_fingerprint(raw_doc: Dict[str, Any]) -> str:
+    """Revision markers when present, otherwise a content hash of the whole document."""
+    revision = raw_doc.get("revision")
+    revision_id = revision.get("revision_id") if isinstance(revision, dict) else None
+    updated = raw_doc.get("last_updated_date")
+    version = raw_doc.get("version")
+
+    if revision_id or updated:
+        return f"rev:{revision_id or ''}|{updated or ''}|{version or ''}"
+
+    canonical = json.dumps(raw_doc, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return "sha256:" + hashlib.sha256(canonical.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+class IngestionState:
+    """SQLite table of _id -> fingerprint of the last successfully ingested version."""
+
+    def __init__(self, path: str = "output/ingestion_state.sqlite"):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " doc_id TEXT PRIMARY KEY,"
+            " fingerprint TEXT NOT NULL,"
+            " ingested_at TEXT NOT NULL)"
+        )
+        self._conn.commit()
+        self.skipped = 0
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def stored_fingerprint(self, doc_id: str) -> Optional[str]:
+        row = self._conn.execute("SELECT fingerprint FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+        return row[0] if row else None
+
+    def is_unchanged(self, raw_doc: Any) -> bool:
+        """
+        True when raw_doc matches what was last ingested under its _id.
+        Anything without a usable _id counts as changed so the transformer
+        can report it.
+        """
+        if not isinstance(raw_doc, dict) or raw_doc.get("_id") is None:
+            return False
+        return self.stored_fingerprint(str(raw_doc["_id"])) == document_fingerprint(raw_doc)
+
+    def filter_changed(self, raw_docs: Iterable[Any]) -> Iterator[Any]:
+        """Yields only new or changed documents, counting the rest in self.skipped."""
+        for raw_doc in raw_docs:
+            if self.is_unchanged(raw_doc):
+                self.skipped += 1
+                continue
+            yield raw_doc
+
+    def record(self, raw_doc: Dict[str, Any]):
+        """Marks this version of raw_doc as ingested. Call once it has made it through."""
+        now = datetime.now(timezone.utc).isoformat()
+        self._conn.execute(
+            "INSERT INTO documents (doc_id, fingerprint, ingested_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(doc_id) DO UPDATE SET fingerprint = excluded.fingerprint, ingested_at = excluded.ingested_at",
+            (str(raw_doc["_id"]), document_fingerprint(raw_doc), now),
+        )
+
+    def commit(self):
+        self._conn.commit()
+
+    def close(self):
+        self._conn.commit()
+        self._conn.close()
@@ -0,0 +1,99 @@
+import pytest
+import sys
+import os
+import json
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+from qdrant_client import QdrantClient
+import app
+from embedding_v3 import EmbeddingModel, HashingBackend
+from vectordb_v3 import VectorDatabase
+from retry_queue import RetryQueue
+
+# Load raw data
+with open("data/raw_customer_api.json", "r") as f:
+    RAW_DATA = json.load(f)
+
+pytestmark = pytest.mark.filterwarnings("ignore:Payload indexes have no effect")
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """API on the hashing backend and an in-memory Qdrant (lifespan not run)."""
+    monkeypatch.setattr(app, "STATE_DB_PATH", str(tmp_path / "state.sqlite"))
+    monkeypatch.setattr(app, "RETRY_QUEUE_PATH", str(tmp_path / "retry.sqlite"))
+    app.app.state.embedder = EmbeddingModel(backend=HashingBackend(dimension=32))
+    app.app.state.vector_db = VectorDatabase("test", client=QdrantClient(":memory:"))
+    yield TestClient(app.app)
+    app.close_shared_clients()
+
+
+def points_count():
+    vector_db = app.app.state.vector_db
+    return vector_db.client.count(vector_db.collection_name).count
+
+
+def test_incremental_run_reindexes_everything_after_recreate(client):
+    first = client.post("/pipeline/run_full?incremental=true", json=RAW_DATA).json()
+    assert first["indexed"] == points_count() > 0
+
+    again = client.post("/pipeline/run_full?incremental=true", json=RAW_DATA).json()
+    assert again["indexed"] == 0 and again["skipped_unchanged"] == len(RAW_DATA)
+
+    # Dropping the collection must not leave the "unchanged" documents out of it
+    rebuilt = client.post("/pipeline/run_full?incremental=true&recreate=true", json=RAW_DATA).json()
+    assert rebuilt["skipped_unchanged"] == 0
+    assert rebuilt["indexed"] == points_count() == first["indexed"]
+
+
+def test_ids_only_output_is_rejected_by_index(client):
+    docs = [{"text": "Budget vote tonight", "metadata": {"external_id": "A1"}}]
+    full = client.post("/pipeline/embed", json=docs).json()
+    ids_only = client.post("/pipeline/embed?ids_only=true", json=docs).json()
+
+    response = client.post("/pipeline/index", json=ids_only)
+    assert response.status_code == 422
+    assert "ids_only" in response.json()["detail"]
+
+    result = client.post("/pipeline/index", json=full).json()
+    assert result["indexed"] == result["upload"]["points"] == points_count() == 1
+
+
+def test_incremental_run_keeps_the_last_revision_in_a_batch(client):
+    old = dict(RAW_DATA[0], revision={"revision_id": "R1"})
+    new = dict(RAW_DATA[0], revision={"revision_id": "R2"},
+               content_elements=[{"type": "text", "content": "NEW"}])
+    old["content_elements"] = [{"type": "text", "content": "OLD"}]
+
+    for _ in range(2):
+        client.post("/pipeline/run_full?incremental=true", json=[old, new])
+        vector_db = app.app.state.vector_db
+        points, _ = vector_db.client.scroll(vector_db.collection_name, limit=10)
+        assert [p.payload["text"] for p in points] == ["NEW"]
+
+
+def test_incremental_run_after_an_outside_drop_reindexes(client):
+    first = client.post("/pipeline/run_full?incremental=true", json=RAW_DATA).json()
+    vector_db = app.app.state.vector_db
+    vector_db.client.delete_collection(vector_db.collection_name)
+
+    again = client.post("/pipeline/run_full?incremental=true", json=RAW_DATA).json()
+    assert again["skipped_unchanged"] == 0
+    assert again["indexed"] == points_count() == first["indexed"]
+
+
+def test_indexing_a_newer_version_clears_its_retry_entry(client):
+    queue = RetryQueue(app.RETRY_QUEUE_PATH)
+    queue.push("A1", {"text": "POISON old text", "metadata": {"external_id": "A1"}}, "400 bad input")
+    queue.close()
+
+    newer = client.post("/pipeline/embed", json=[{"text": "Fixed text", "metadata": {"external_id": "A1"}}]).json()
+    client.post("/pipeline/index", json=newer)
+    assert client.post("/pipeline/retry_failed").json()["retried"] == 0
+
+    vector_db = app.app.state.vector_db
+    points, _ = vector_db.client.scroll(vector_db.collection_name, limit=10)
+    assert [p.payload["text"] for p in points] == ["Fixed text"]
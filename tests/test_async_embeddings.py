@@ -0,0 +1,159 @@
+import pytest
+import sys
+import os
+import json
+import time
+import base64
+import struct
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_v3 import EmbeddingModel, TokenBucketPacer
+
+
+class StubEmbeddingsServer(ThreadingHTTPServer):
+    """
+    Local stand-in for POST /v1/embeddings. Adds `latency` seconds per
+    request and answers every `rate_limit_every`-th request with a 429.
+    Embeddings are [len(text), position in request] so order is checkable.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, rate_limit_every=0):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.rate_limited = 0
+        self.connections = set()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse is observable
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with server.lock:
+            server.requests += 1
+            server.connections.add(self.client_address)
+            limited = server.rate_limit_every and server.requests % server.rate_limit_every == 0
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            time.sleep(server.latency)
+            if limited:
+                with server.lock:
+                    server.rate_limited += 1
+                self._reply(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                            {"retry-after-ms": "50"})
+                return
+
+            inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            data = []
+            for i, text in enumerate(inputs):
+                vector = [float(len(text)), float(i)]
+                if body.get("encoding_format") == "base64":
+                    vector = base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode()
+                data.append({"object": "embedding", "index": i, "embedding": vector})
+            self._reply(200, {"object": "list", "data": data, "model": body["model"],
+                              "usage": {"prompt_tokens": 1, "total_tokens": 1}})
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _reply(self, status, payload, headers=None):
+        raw = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(raw)
+
+
+@pytest.fixture
+def stub_server(request):
+    server = StubEmbeddingsServer(**getattr(request, "param", {}))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+
+
+TEXTS = [f"document {i} " + "word " * (i % 7) for i in range(40)]
+
+
+@pytest.mark.parametrize("stub_server", [{"latency": 0.05}], indirect=True)
+def test_concurrent_requests_keep_input_order(stub_server):
+    model = EmbeddingModel(api_key="test", base_url=stub_server.base_url,
+                           max_concurrency=4, max_inputs_per_request=2)
+    start = time.perf_counter()
+    vectors, errors = model.generate_embeddings(TEXTS)
+    elapsed = time.perf_counter() - start
+
+    assert errors == {}
+    assert [v[0] for v in vectors] == [float(len(t)) for t in TEXTS]
+    assert stub_server.requests == 20
+    assert 1 < stub_server.max_in_flight <= 4
+    assert elapsed < 20 * 0.05  # faster than one request at a time
+
+
+@pytest.mark.parametrize("stub_server", [{"rate_limit_every": 3}], indirect=True)
+def test_rate_limits_pause_and_retry(stub_server):
+    model = EmbeddingModel(api_key="test", base_url=stub_server.base_url,
+                           max_concurrency=3, max_inputs_per_request=4)
+    vectors, errors = model.generate_embeddings(TEXTS)
+
+    assert errors == {}
+    assert all(v is not None for v in vectors)
+    assert stub_server.rate_limited > 0
+    assert model.pacer.stats["rate_limited"] == stub_server.rate_limited
+
+
+def test_connections_are_reused_across_calls(stub_server):
+    model = EmbeddingModel(api_key="test", base_url=stub_server.base_url,
+                           max_concurrency=2, max_inputs_per_request=4)
+    for _ in range(3):
+        vectors, errors = model.generate_embeddings(TEXTS)
+        assert errors == {}
+    model.close()
+
+    assert stub_server.requests == 30
+    assert len(stub_server.connections) <= 2
+    assert not model._loop_thread.is_alive()
+
+
+def test_token_bucket_budgets():
+    now = [0.0]
+    pacer = TokenBucketPacer(rpm=60, tpm=600, clock=lambda: now[0])
+
+    # The budgets start full: 60 requests / 600 tokens this minute
+    assert pacer.reserve(500) == 0
+    assert pacer.reserve(200) == pytest.approx(10.0)  # 100 tokens short at 10 tokens/s
+    now[0] += 10
+    assert pacer.reserve(200) == 0
+
+    for _ in range(59):
+        pacer._tokens = 600
+        assert pacer.reserve(1) == 0
+    assert pacer.reserve(1) == pytest.approx(1.0)  # out of requests: one per second
+
+    pacer.pause(5)
+    now[0] += 1
+    assert pacer.reserve(1) == pytest.approx(4.0)
@@ -0,0 +1,68 @@
+import pytest
+import sys
+import os
+import json
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import DataTransformer
+from doc_store import MemoryDocStore, SpillDocStore, BloomFilter
+
+# Load raw data
+with open("data/raw_customer_api.json", "r") as f:
+    RAW_DATA = json.load(f)
+
+
+def processed_with_duplicates():
+    """Corpus docs plus re-sent copies of a few IDs with edited bodies (updates)."""
+    transformer = DataTransformer()
+    docs = [transformer.process_document(d)[0] for d in RAW_DATA]
+    docs = [d for d in docs if d]
+    updates = []
+    for i, doc in enumerate(docs[::7]):
+        updated = json.loads(json.dumps(doc))
+        updated["text"] = f"revision {i}: " + updated["text"]
+        updates.append(updated)
+    return docs + updates + updates[:2]
+
+
+@pytest.mark.parametrize("index", ["memory", "disk"])
+def test_spill_store_matches_dict_upsert(tmp_path, index):
+    """Spill + compaction keeps last-occurrence-wins and first-seen order, byte for byte."""
+    docs = processed_with_duplicates()
+
+    memory = MemoryDocStore()
+    spill = SpillDocStore(str(tmp_path / "spool.jsonl"), index=index, expected_items=100)
+    for doc in docs:
+        ext_id = doc["metadata"]["external_id"]
+        assert spill.upsert(ext_id, doc) == memory.upsert(ext_id, doc)
+
+    assert len(spill) == len(memory) == len({d["metadata"]["external_id"] for d in docs})
+    memory.write_json(str(tmp_path / "memory.json"))
+    spill.write_json(str(tmp_path / "spill.json"))
+    spill.close()
+
+    assert (tmp_path / "spill.json").read_bytes() == (tmp_path / "memory.json").read_bytes()
+    assert not (tmp_path / "spool.jsonl").exists()
+
+    by_id = {d["metadata"]["external_id"]: d for d in docs}
+    with open(tmp_path / "spill.json", encoding="utf-8") as f:
+        assert json.load(f) == list(by_id.values())
+
+
+def test_empty_store_writes_empty_array(tmp_path):
+    store = SpillDocStore(str(tmp_path / "spool.jsonl"))
+    store.write_json(str(tmp_path / "out.json"))
+    store.close()
+    assert (tmp_path / "out.json").read_text() == "[]"
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(expected_items=1000, false_positive_rate=0.01)
+    items = [f"id-{i}" for i in range(1000)]
+    for item in items:
+        bloom.add(item)
+    assert all(item in bloom for item in items)
+    false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+    assert false_positives < 300
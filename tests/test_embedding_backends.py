@@ -0,0 +1,131 @@
+import asyncio
+import pytest
+import sys
+import os
+import json
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import DataTransformer
+from embedding_v3 import EmbeddingModel, EmbeddingBackend, EmbeddingCache, get_backend, _length_sorted_batches, _mean_pool
+
+# Load raw data
+with open("data/raw_customer_api.json", "r") as f:
+    RAW_DATA = json.load(f)
+
+
+class LengthBackend(EmbeddingBackend):
+    """Local backend stand-in: 3-dim vectors derived from the text, fails on a marker."""
+
+    name = "length"
+    model = "length-v1"
+
+    def __init__(self, fail_on=None):
+        self.batches = []
+        self.fail_on = fail_on
+
+    @property
+    def dimension(self):
+        return 3
+
+    def embed(self, texts):
+        self.batches.append(list(texts))
+        if self.fail_on and self.fail_on in texts:
+            raise ValueError("boom")
+        return [[float(len(t)), float(t.count(" ")), 1.0] for t in texts]
+
+
+def corpus_texts():
+    transformer = DataTransformer()
+    return [doc["text"] for doc in (transformer.process_document(d)[0] for d in RAW_DATA) if doc]
+
+
+def test_backend_replaces_api_without_key(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    backend = LengthBackend()
+    model = EmbeddingModel(backend=backend, max_inputs_per_request=7)
+    texts = corpus_texts()
+
+    vectors, errors = model.generate_embeddings(texts)
+
+    assert errors == {}
+    assert vectors == [[float(len(t)), float(t.count(" ")), 1.0] for t in texts]
+    assert all(len(batch) <= 7 for batch in backend.batches)
+    assert model.vector_size == 3
+    assert model.model == "length-v1"
+
+
+def test_backend_failures_are_bisected_to_the_bad_input():
+    texts = [f"text {i}" for i in range(6)]
+    model = EmbeddingModel(backend=LengthBackend(fail_on="text 4"), max_inputs_per_request=2)
+    vectors, errors = model.generate_embeddings(texts)
+    assert set(errors) == {4}
+    assert all(vectors[i] is not None for i in (0, 1, 2, 3, 5))
+
+
+def test_backend_async_path_and_cache(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"))
+    backend = LengthBackend()
+    model = EmbeddingModel(backend=backend, cache=cache, max_concurrency=4)
+    texts = ["alpha beta", "gamma"]
+
+    vectors, _ = asyncio.run(model.agenerate_embeddings(texts))
+    again, _ = model.generate_embeddings(texts)
+
+    assert vectors == again == [[10.0, 1.0, 1.0], [5.0, 0.0, 1.0]]
+    assert len(backend.batches) == 1
+    cache.close()
+
+
+def test_vector_size_for_openai_models():
+    client = object()
+    assert EmbeddingModel(client=client).vector_size == 1536
+    assert EmbeddingModel(client=client, model="text-embedding-3-large").vector_size == 3072
+    assert EmbeddingModel(client=client, dimensions=256).vector_size == 256
+
+
+def test_get_backend_rejects_unknown_name():
+    assert get_backend("openai") is None
+    with pytest.raises(ValueError):
+        get_backend("nope")
+
+
+def test_sentence_transformer_backend():
+    pytest.importorskip("sentence_transformers")
+    backend = get_backend("sentence-transformers", batch_size=8, num_threads=1)
+    vectors, errors = EmbeddingModel(backend=backend).generate_embeddings(["hello world", "capitol"])
+    assert errors == {}
+    assert all(len(v) == backend.dimension for v in vectors)
+
+
+def test_length_sorted_batches_cover_every_index_once():
+    lengths = [5, 1, 9, 3, 3, 7, 2]
+    batches = _length_sorted_batches(lengths, 3)
+    assert sorted(i for batch in batches for i in batch) == list(range(len(lengths)))
+    assert [lengths[i] for batch in batches for i in batch] == sorted(lengths)
+
+
+def test_mean_pool_ignores_padding():
+    np = pytest.importorskip("numpy")
+    hidden = np.array([[[1.0, 0.0], [3.0, 0.0], [100.0, 100.0]]], dtype=np.float32)
+    mask = np.array([[1, 1, 0]])
+    assert _mean_pool(hidden, mask, normalize=False).tolist() == [[2.0, 0.0]]
+    assert _mean_pool(hidden, mask).tolist() == [[1.0, 0.0]]
+
+
+def test_onnx_backend_names_its_dependencies(monkeypatch, tmp_path):
+    monkeypatch.setitem(sys.modules, "onnxruntime", None)
+    with pytest.raises(ImportError, match="onnxruntime, onnx and transformers"):
+        get_backend("onnx", model_dir=str(tmp_path / "onnx"))
+
+
+def test_onnx_backend_agrees_with_full_precision(tmp_path):
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("onnx")
+    pytest.importorskip("sentence_transformers")
+    texts = corpus_texts()[:8]
+    reference = get_backend("sentence-transformers").embed(texts)
+    quantized = get_backend("onnx", model_dir=str(tmp_path / "onnx"), batch_size=3).embed(texts)
+    for a, b in zip(reference, quantized):
+        assert sum(x * y for x, y in zip(a, b)) > 0.95
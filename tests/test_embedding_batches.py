@@ -0,0 +1,141 @@
+import pytest
+import sys
+import os
+import json
+import httpx
+from types import SimpleNamespace
+from openai import APIStatusError
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import DataTransformer
+from embedding_v3 import EmbeddingModel
+
+# Load raw data
+with open("data/raw_customer_api.json", "r") as f:
+    RAW_DATA = json.load(f)
+
+
+def status_error(status, message):
+    response = httpx.Response(status, request=httpx.Request("POST", "https://api.openai.com/v1/embeddings"))
+    return APIStatusError(message, response=response, body=None)
+
+
+class RecordingEmbeddings:
+    """
+    OpenAI-shaped embeddings.create that records request sizes and returns
+    data shuffled. Batches containing `fail_on` are rejected with a 400;
+    `fail_status` rejects every request with that status instead.
+    """
+
+    def __init__(self, fail_on=None, fail_status=None):
+        self.requests = []
+        self.fail_on = fail_on
+        self.fail_status = fail_status
+
+    def create(self, model, input, **kwargs):
+        self.requests.append(list(input))
+        self.kwargs = kwargs
+        if self.fail_status:
+            raise status_error(self.fail_status, "Incorrect API key provided")
+        if self.fail_on and self.fail_on in input:
+            raise status_error(400, "boom")
+        data = [SimpleNamespace(index=i, embedding=[float(len(text)), float(i)]) for i, text in enumerate(input)]
+        return SimpleNamespace(data=list(reversed(data)))
+
+
+def make_model(embeddings, **kwargs):
+    return EmbeddingModel(client=SimpleNamespace(embeddings=embeddings), **kwargs)
+
+
+def test_batches_respect_limits_and_keep_order():
+    transformer = DataTransformer()
+    texts = [doc["text"] for doc in (transformer.process_document(d)[0] for d in RAW_DATA) if doc]
+
+    embeddings = RecordingEmbeddings()
+    model = make_model(embeddings, max_inputs_per_request=8, max_tokens_per_request=4000)
+    vectors, errors = model.generate_embeddings(texts)
+
+    assert errors == {}
+    assert [v[0] for v in vectors] == [float(len(t)) for t in texts]
+    assert [t for req in embeddings.requests for t in req] == texts
+    assert len(embeddings.requests) < len(texts)
+    for req in embeddings.requests:
+        assert len(req) <= 8
+        assert len(req) == 1 or sum(model.count_tokens(t) for t in req) <= 4000
+
+
+def test_failures_are_reported_per_item():
+    embeddings = RecordingEmbeddings(fail_on="bad")
+    model = make_model(embeddings, max_inputs_per_request=2)
+    vectors, errors = model.generate_embeddings(["a", "", "bad", "c", None, "d"])
+
+    # Requests are ["a", "bad"] and ["c", "d"]; the failed one is bisected so "a" still goes through
+    assert all(vectors[i] is not None for i in (0, 3, 5))
+    assert set(errors) == {1, 2, 4}
+    assert "boom" in errors[2]
+    assert model.stats["bisections"] == 1
+    assert model.stats["permanent_failures"] == 1
+    assert model.stats["retries"] == 0
+    assert model.generate_embedding("bad") == []
+
+
+class FlakyEmbeddings(RecordingEmbeddings):
+    """Times out on the first `failures` requests."""
+
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    def create(self, model, input, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise TimeoutError("read timed out")
+        return super().create(model, input, **kwargs)
+
+
+def test_transient_errors_are_retried_with_backoff():
+    model = make_model(FlakyEmbeddings(failures=2), max_inputs_per_request=4, backoff_base=0.001)
+    vectors, errors = model.generate_embeddings(["a", "b", "c"])
+    assert errors == {}
+    assert model.stats["retries"] == 2
+    assert model.stats["bisections"] == 0
+
+
+def test_exhausted_retries_fail_the_batch_without_bisecting():
+    model = make_model(FlakyEmbeddings(failures=10), max_retries=2, backoff_base=0.001)
+    vectors, errors = model.generate_embeddings(["a", "b"])
+    assert set(errors) == {0, 1}
+    assert model.stats["retries"] == 2
+    assert model.stats["bisections"] == 0
+    assert model.stats["permanent_failures"] == 2
+
+
+@pytest.mark.parametrize("status", [401, 403, 404])
+def test_auth_and_config_errors_fail_the_batch_without_bisecting(status):
+    embeddings = RecordingEmbeddings(fail_status=status)
+    model = make_model(embeddings, max_inputs_per_request=64)
+    vectors, errors = model.generate_embeddings([f"text {i}" for i in range(64)])
+    assert len(errors) == 64
+    assert len(embeddings.requests) == 1
+    assert model.stats["bisections"] == 0
+
+
+def test_context_length_errors_are_bisected():
+    class TooLong(RecordingEmbeddings):
+        def create(self, model, input, **kwargs):
+            if "huge" in input:
+                raise status_error(400, "This model's maximum context length is 8192 tokens")
+            return super().create(model, input, **kwargs)
+
+    model = make_model(TooLong(), max_inputs_per_request=4)
+    vectors, errors = model.generate_embeddings(["a", "huge", "c", "d"])
+    assert set(errors) == {1}
+    assert model.stats["bisections"] == 2
+
+
+def test_sdk_retries_are_disabled():
+    model = EmbeddingModel(api_key="sk-test")
+    assert model.client.max_retries == 0
+    model.close()
@@ -0,0 +1,122 @@
+import pytest
+import sys
+import os
+import json
+import sqlite3
+import multiprocessing
+from types import SimpleNamespace
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_v3 import EmbeddingModel, EmbeddingCache
+
+
+class CountingEmbeddings:
+    """OpenAI-shaped embeddings.create that counts the inputs it was asked to embed."""
+
+    def __init__(self):
+        self.inputs = []
+
+    def create(self, model, input, **kwargs):
+        self.inputs.extend(input)
+        dims = kwargs.get("dimensions", 4)
+        data = [SimpleNamespace(index=i, embedding=[len(t) / 8.0] * dims) for i, t in enumerate(input)]
+        return SimpleNamespace(data=data)
+
+
+def make_model(cache, **kwargs):
+    embeddings = CountingEmbeddings()
+    return EmbeddingModel(client=SimpleNamespace(embeddings=embeddings), cache=cache, **kwargs), embeddings
+
+
+def test_second_run_is_served_from_cache(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    texts = ["alpha", "beta", "gamma", "alpha"]
+
+    model, api = make_model(EmbeddingCache(path))
+    first, errors = model.generate_embeddings(texts)
+    assert errors == {} and len(api.inputs) == 4
+
+    # A new process-equivalent: fresh connection, same file
+    model, api = make_model(EmbeddingCache(path))
+    second, errors = model.generate_embeddings(texts + ["delta"])
+    assert errors == {}
+    assert api.inputs == ["delta"]
+    assert second[:4] == first  # float32 round trip is exact for these values
+    assert model.cache.stats == {"hits": 4, "misses": 1, "evictions": 0}
+
+    # Different dimensions are a different key
+    model, api = make_model(EmbeddingCache(path), dimensions=8)
+    model.generate_embeddings(["alpha"])
+    assert api.inputs == ["alpha"]
+
+
+def test_size_based_eviction_drops_least_recently_used(tmp_path):
+    # 4 dims * 4 bytes = 16 bytes per vector; room for 3
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"), max_bytes=48, evict_check_every=1)
+    for text in ["a", "b", "c"]:
+        cache.put_many("m", 0, [(text, [1.0, 2.0, 3.0, 4.0])])
+    cache.get_many("m", 0, ["a"])  # "b" is now the least recently used
+    cache.put_many("m", 0, [("d", [1.0, 2.0, 3.0, 4.0])])
+
+    assert cache.size_bytes() <= 48
+    assert cache.stats["evictions"] == 1
+    assert [v is not None for v in cache.get_many("m", 0, ["a", "b", "c", "d"])] == [True, False, True, True]
+
+
+def _worker(path, worker_id, queue):
+    cache = EmbeddingCache(path)
+    model, api = make_model(cache)
+    texts = [f"shared {i}" for i in range(50)] + [f"own {worker_id} {i}" for i in range(50)]
+    vectors, errors = model.generate_embeddings(texts)
+    queue.put((len(errors), sum(v is not None for v in vectors)))
+
+
+def test_shared_by_concurrent_processes(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    EmbeddingCache(path).close()
+    queue = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=_worker, args=(path, i, queue)) for i in range(4)]
+    for w in workers:
+        w.start()
+    results = [queue.get(timeout=60) for _ in workers]
+    for w in workers:
+        w.join(timeout=60)
+
+    assert results == [(0, 100)] * 4
+    cache = EmbeddingCache(path)
+    assert all(v is not None for v in cache.get_many("text-embedding-3-small", 0, [f"shared {i}" for i in range(50)]))
+
+
+class FailingUpdates:
+    """sqlite3 connection proxy whose executemany fails, like a write error mid-transaction."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def executemany(self, *args):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+
+def test_failed_recency_update_releases_the_write_lock(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = EmbeddingCache(path)
+    cache.put_many("m", 2, [("hello", [1.0, 2.0])])
+
+    real_conn = cache._conn
+    cache._conn = FailingUpdates(real_conn)
+    with pytest.raises(sqlite3.OperationalError):
+        cache.get_many("m", 2, ["hello"])
+    cache._conn = real_conn
+    assert not real_conn.in_transaction
+
+    # Another worker can still write to the shared file
+    other = sqlite3.connect(path, timeout=0.1)
+    other.execute("UPDATE embeddings SET last_used = 0")
+    other.commit()
+    other.close()
+    cache.close()
@@ -0,0 +1,72 @@
+import pytest
+import sys
+import os
+import json
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import DataTransformer
+from fragment_cache import FragmentCache
+
+# Load raw data
+with open("data/raw_customer_api.json", "r") as f:
+    RAW_DATA = json.load(f)
+
+
+def test_lru_counters_and_eviction():
+    """
+    Cache mechanics: hits, misses and evictions are counted, and the least
+    recently used entry is the one evicted.
+    """
+    cache = FragmentCache(max_entries=2)
+    calls = []
+
+    def compute(value):
+        calls.append(value)
+        return value.upper()
+
+    assert cache.get_or_compute("text", "a", lambda: compute("a")) == "A"
+    assert cache.get_or_compute("text", "b", lambda: compute("b")) == "B"
+    assert cache.get_or_compute("text", "a", lambda: compute("a")) == "A"  # hit, 'a' now most recent
+    cache.get_or_compute("text", "c", lambda: compute("c"))                # evicts 'b'
+    cache.get_or_compute("text", "b", lambda: compute("b"))                # miss again
+
+    assert calls == ["a", "b", "c", "b"]
+    assert cache.stats == {"hits": 1, "misses": 4, "evictions": 2}
+    assert len(cache) == 2
+
+    # Same raw string under a different kind is a different entry
+    cache.get_or_compute("fragment", "b", lambda: compute("b"))
+    assert cache.stats["misses"] == 5
+
+
+def test_cached_transform_matches_uncached_and_persists(tmp_path):
+    """
+    A warm cache (in memory or loaded from disk) must not change any output,
+    and a second run over the same feed should be served from the cache.
+    """
+    cache_file = str(tmp_path / "fragment_cache.json")
+
+    uncached = DataTransformer(cache_size=0)
+    expected = [uncached.process_document(doc) for doc in RAW_DATA]
+
+    first = DataTransformer(cache_path=cache_file)
+    assert [first.process_document(doc) for doc in RAW_DATA] == expected
+    assert first.run_stats()["cache_misses"] > 0
+    first.save_cache()
+
+    second = DataTransformer(cache_path=cache_file)
+    assert [second.process_document(doc) for doc in RAW_DATA] == expected
+    stats = second.run_stats()
+    assert stats["cache_misses"] == 0
+    assert stats["cache_hits"] == first.run_stats()["cache_hits"] + first.run_stats()["cache_misses"]
+    assert stats["html_full_parse"] == 0
+
+
+def test_unreadable_cache_file_starts_cold(tmp_path):
+    cache_file = tmp_path / "fragment_cache.json"
+    cache_file.write_text("{not json")
+
+    transformer = DataTransformer(cache_path=str(cache_file))
+    assert len(transformer.cache) == 0
@@ -0,0 +1,67 @@
+import pytest
+import sys
+import os
+import json
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import DataTransformer
+from html_text import corpus_strings, diff_engines, get_engine
+
+# Load raw data
+with open("data/raw_customer_api.json", "r") as f:
+    RAW_DATA = json.load(f)
+
+
+@pytest.mark.filterwarnings("ignore::bs4.MarkupResemblesLocatorWarning")
+def test_engines_agree_on_corpus_strings():
+    """
+    Differential Test: the streaming engine must return the same text nodes
+    as the BeautifulSoup reference for every title, category and text
+    element in the sample corpus.
+    """
+    samples = corpus_strings(RAW_DATA)
+    assert len(samples) > 0
+
+    differences = diff_engines(samples, ["stream", "soup"])
+    assert differences == [], f"{len(differences)} engine differences, first: {differences[0]}"
+
+
+@pytest.mark.filterwarnings("ignore::bs4.MarkupResemblesLocatorWarning")
+def test_engines_produce_identical_documents():
+    """
+    Differential Test: full transformed documents (the text we embed) are
+    identical whichever engine the transformer uses.
+    """
+    stream = DataTransformer(engine="stream")
+    soup = DataTransformer(engine="soup")
+
+    for doc in RAW_DATA:
+        assert stream.process_document(doc) == soup.process_document(doc), \
+            f"Engine output differs for {doc.get('_id') if isinstance(doc, dict) else doc!r}"
+
+
+def test_unknown_engine_is_rejected():
+    with pytest.raises(ValueError):
+        get_engine("lxml-fast")
+
+
+def test_markup_free_fast_path():
+    """
+    Strings without '<' or '&' skip the parser but must clean to exactly what
+    the full parse returns (whitespace-only strings collapse the same way).
+    """
+    transformer = DataTransformer()
+    engine = get_engine("soup")
+
+    for text in ["Sports", "  Padded title \n", "Line one\nLine two", "   ", "\n\t\n", "", "5 > 3"]:
+        assert transformer.clean_text(text) == engine.get_text(text, separator="\n")
+        if text:
+            assert transformer.clean_html(text)[0] == engine.get_text(text, separator="\n", strip=True)
+
+    assert transformer.stats["html_fast_path"] > 0
+    assert transformer.stats["html_full_parse"] == 0
+
+    transformer.clean_text("<b>Sports</b> &amp; Leisure")
+    assert transformer.stats["html_full_parse"] == 1
@@ -120,4 +120,41 @@ def test_full_ingestion_integration_real_api():
     assert len(vector) == 1536, f"Vector dimension mismatch. Expected 1536 (text-embedding-3-small), got {len(vector)}"
     assert any(x != 0 for x in vector), "Vector contains real data (not empty)"
     
-    print(f"   ✅ Step 5: Success! Received valid {len(vector)}-d vector from OpenAI.")
\ No newline at end of file
+    print(f"   ✅ Step 5: Success! Received valid {len(vector)}-d vector from OpenAI.")
+
+@pytest.mark.filterwarnings("ignore:Payload indexes have no effect")
+def test_full_ingestion_integration_offline():
+    """
+    Same path as above without network access: transform the whole corpus,
+    embed with the deterministic hashing backend, index into an in-memory
+    Qdrant, and check that searching with a document's own text finds it.
+    """
+    from qdrant_client import QdrantClient
+    from embedding_v3 import HashingBackend
+    from vectordb_v3 import VectorDatabase
+
+    transformer = DataTransformer()
+    docs = {}
+    for raw in RAW_DATA:
+        result, _ = transformer.process_document(raw)
+        if result:
+            docs[result["metadata"]["external_id"]] = result
+    docs = list(docs.values())
+
+    embedder = EmbeddingModel(backend=HashingBackend(dimension=256))
+    vectors, errors = embedder.generate_embeddings([d["text"] for d in docs])
+    assert errors == {}
+    again, _ = embedder.generate_embeddings([d["text"] for d in docs])
+    assert again == vectors  # deterministic
+    for doc, vector in zip(docs, vectors):
+        assert len(vector) == 256
+        assert abs(sum(x * x for x in vector) - 1.0) < 1e-6
+        doc["vector"] = vector
+
+    vector_db = VectorDatabase("offline", client=QdrantClient(":memory:"))
+    vector_db.get_or_create_collection(vector_size=embedder.vector_size)
+    vector_db.upsert_documents(docs)
+
+    hits = vector_db.search(embedder.generate_embedding(docs[3]["text"]), limit=1)
+    assert hits[0]["metadata"]["external_id"] == docs[3]["metadata"]["external_id"]
+    assert hits[0]["score"] > 0.99
@@ -0,0 +1,81 @@
+import pytest
+import sys
+import os
+import json
+import logging
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import DataTransformer
+
+# Load raw data
+with open("data/raw_customer_api.json", "r") as f:
+    RAW_DATA = json.load(f)
+
+
+def document_records(caplog):
+    return [r for r in caplog.records if r.name == "CapitolPipeline" and hasattr(r, "document")]
+
+
+def test_import_does_not_configure_log_file():
+    """Importing pipeline must not attach handlers (and so must not truncate output/pipeline.log)."""
+    assert logging.getLogger("CapitolPipeline").handlers == []
+    assert not any(getattr(h, "baseFilename", "").endswith("pipeline.log") for h in logging.getLogger().handlers)
+
+
+def test_successes_are_sampled(caplog):
+    caplog.set_level(logging.INFO, logger="CapitolPipeline")
+    transformer = DataTransformer(log_every=10)
+    for doc in RAW_DATA:
+        transformer.process_document(doc)
+
+    records = document_records(caplog)
+    assert len(records) == (len(RAW_DATA) + 9) // 10
+    entry = records[0].document
+    assert entry["status"] == "SUCCESS"
+    assert {"url", "text"} <= set(entry["found"])
+    assert set(entry["found"]).isdisjoint(entry["missing"])
+    assert json.loads(records[0].getMessage().split(" ", 1)[1]) == entry
+
+
+def test_failures_are_always_logged(caplog):
+    caplog.set_level(logging.INFO, logger="CapitolPipeline")
+    transformer = DataTransformer(log_every=0)
+    doc = dict(RAW_DATA[0], website_url=None, canonical_url=None)
+
+    transformer.process_document(RAW_DATA[0])
+    _, report = transformer.process_document(doc)
+    transformer.process_document("not a dict")
+
+    records = document_records(caplog)
+    assert report["reason"] == "Missing URL"
+    assert [r.document["status"] for r in records] == ["SKIPPED", "SKIPPED"]
+    assert records[0].levelno == logging.WARNING and records[0].document["missing"] == ["url"]
+    assert records[1].levelno == logging.ERROR
+
+
+def test_setup_logging_twice_stops_only_the_active_listener(tmp_path, monkeypatch):
+    import atexit
+    import pipeline
+
+    registered = []
+    monkeypatch.setattr(atexit, "register", registered.append)
+    monkeypatch.setattr(pipeline, "_stop_registered", False)
+    log = logging.getLogger("CapitolPipeline")
+    saved = (log.handlers[:], log.propagate, log.level)
+    try:
+        first = pipeline.setup_logging(str(tmp_path / "first.log"), console=False)
+        second = pipeline.setup_logging(str(tmp_path / "second.log"), console=False)
+        assert first is not second and first._thread is None
+        log.info("after reconfigure")
+
+        # What atexit runs at interpreter exit, plus a second time for good measure
+        pipeline._stop_log_listener()
+        pipeline._stop_log_listener()
+        assert registered == [pipeline._stop_log_listener]
+        assert "after reconfigure" in (tmp_path / "second.log").read_text()
+        assert "after reconfigure" not in (tmp_path / "first.log").read_text()
+    finally:
+        log.handlers, log.propagate = saved[0], saved[1]
+        log.setLevel(saved[2])
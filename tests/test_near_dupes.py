@@ -0,0 +1,52 @@
+import pytest
+import sys
+import os
+import json
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import DataTransformer
+from near_dupes import NearDuplicateDetector, group_near_duplicates, shingles
+
+# Load raw data
+with open("data/raw_customer_api.json", "r") as f:
+    RAW_DATA = json.load(f)
+
+
+def corpus_texts():
+    transformer = DataTransformer()
+    return [doc["text"] for doc in (transformer.process_document(d)[0] for d in RAW_DATA) if doc]
+
+
+def republished(text):
+    """A syndicated copy: new byline up front, wire credit at the end."""
+    return "By Staff Writer, Associated Wire. " + text + " Distributed by the wire desk."
+
+
+def test_republished_copies_join_the_original_group():
+    texts = corpus_texts()
+    copies = [republished(t) for t in texts[:5]]
+    representative, report = group_near_duplicates(texts + copies, threshold=0.8)
+
+    originals = representative[:len(texts)]
+    for i in range(5):
+        assert representative[len(texts) + i] == originals[i]
+    assert report["embeddings_saved"] == len(texts) + 5 - report["unique"]
+    assert report["embeddings_saved"] >= 5
+
+
+def test_distinct_articles_are_not_grouped():
+    texts = corpus_texts()
+    detector = NearDuplicateDetector(threshold=0.9)
+    reps = [detector.add(t) for t in texts]
+    # Every grouping must be a verified high-similarity pair
+    for i, rep in enumerate(reps):
+        if rep != i:
+            exact = len(shingles(texts[i]) & shingles(texts[rep])) / len(shingles(texts[i]) | shingles(texts[rep]))
+            assert exact > 0.8
+
+
+def test_threshold_is_validated():
+    with pytest.raises(ValueError):
+        NearDuplicateDetector(threshold=0)
@@ -0,0 +1,46 @@
+import pytest
+import sys
+import os
+import json
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import DataTransformer, transform_documents, execute_transformation_step, available_cpus
+
+# Load raw data
+with open("data/raw_customer_api.json", "r") as f:
+    RAW_DATA = json.load(f)
+
+
+def test_parallel_matches_serial():
+    """
+    Sharding across worker processes must not change anything downstream:
+    same documents, same reports, same order.
+    """
+    serial = list(transform_documents(RAW_DATA, DataTransformer(), workers=1))
+
+    transformer = DataTransformer()
+    parallel = list(transform_documents(RAW_DATA, transformer, workers=2, chunk_size=7))
+
+    assert [(p, r) for _, p, r in parallel] == [(p, r) for _, p, r in serial]
+    assert [d for d, _, _ in parallel] == RAW_DATA
+    # Worker counters and cache entries come back to the parent
+    stats = transformer.run_stats()
+    assert stats["html_fast_path"] + stats["html_full_parse"] > 0
+    assert len(transformer.cache) > 0
+
+
+def test_execute_transformation_step_workers(tmp_path):
+    serial_out = tmp_path / "serial.json"
+    parallel_out = tmp_path / "parallel.json"
+
+    serial = execute_transformation_step("data/raw_customer_api.json", str(serial_out))
+    parallel = execute_transformation_step("data/raw_customer_api.json", str(parallel_out), workers=3)
+
+    assert parallel == serial
+    assert parallel_out.read_bytes() == serial_out.read_bytes()
+
+
+def test_available_cpus_is_positive():
+    assert available_cpus() >= 1
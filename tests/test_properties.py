@@ -178,4 +178,39 @@ def test_pipeline_resilience_to_garbage_data(doc):
         print("######################################################################\n")
         
         # Fail the test with the error
-        pytest.fail(f"Pipeline CRASHED on specific input. Error: {e}")
\ No newline at end of file
+        pytest.fail(f"Pipeline CRASHED on specific input. Error: {e}")
+
+# --- 3. BODY BUILDER PARITY ---
+# Markup-heavy alphabet so element boundaries land inside tags, entities and comments
+
+markup_piece_strategy = st.sampled_from([
+    "a", "b", " ", "\n", "<b>", "</b>", "<i>", "</i>", "<br>", "<p>", "</p>", "<", ">",
+    "&", "&amp;", "&amp", "&#65;", "&#", "&#x", "#", "x", "1", ";", "<!--", "-->", '<a href="x>y">', '<a title="q', '"', "</", "</>",
+    "<rt>", "</rt>", "<script>", "</script>", "\xa0", "é",
+])
+
+@settings(max_examples=300)
+@given(contents=st.lists(st.lists(markup_piece_strategy, max_size=6).map("".join), max_size=5))
+def test_single_pass_body_matches_legacy(contents):
+    """
+    Property Test: get_text_body must match get_text_body_legacy byte-for-byte
+    for any sequence of text elements.
+    """
+    transformer = DataTransformer()
+    doc = {"content_elements": [{"type": "text", "content": c} for c in contents]}
+
+    assert transformer.get_text_body(doc) == transformer.get_text_body_legacy(doc)
+
+
+# --- 4. HTML ENGINE PARITY ---
+
+@settings(max_examples=300)
+@given(markup=st.lists(markup_piece_strategy, max_size=12).map("".join))
+def test_streaming_engine_matches_soup(markup):
+    """
+    Property Test: the streaming HTMLParser engine must yield exactly the
+    text nodes BeautifulSoup yields for arbitrary tag/entity soup.
+    """
+    from html_text import get_engine
+
+    assert get_engine("stream").parse(markup) == get_engine("soup").parse(markup)
@@ -0,0 +1,61 @@
+import pytest
+import sys
+import os
+import io
+import json
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from raw_reader import iter_json_array, read_raw_documents, detect_format
+from pipeline import execute_transformation_step
+
+# Load raw data
+with open("data/raw_customer_api.json", "r") as f:
+    RAW_DATA = json.load(f)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 13, 4096])
+def test_streamed_array_matches_json_load(chunk_size):
+    """Elements split across read chunks must decode exactly like json.load."""
+    for text in (json.dumps(RAW_DATA), json.dumps(RAW_DATA, indent=2)):
+        assert list(iter_json_array(io.StringIO(text), chunk_size)) == RAW_DATA
+
+    mixed = '\ufeff [ 12345 , "a,]" , null,{"x":[1,2]} ,-0.5e3]'
+    assert list(iter_json_array(io.StringIO(mixed), chunk_size)) == [12345, "a,]", None, {"x": [1, 2]}, -500.0]
+
+
+@pytest.mark.parametrize("chunk_size", range(1, 9))
+def test_numbers_split_across_chunks(chunk_size):
+    """Every chunk boundary inside a number ("1." | "5e3") must still decode the whole number."""
+    numbers = [1.5e3, -0.25, 12345678, 6.02e-23, 0, -7, 1e10, 3.14159, 2.5E+2]
+    for text in ("[1.5e3,-0.25,12345678,6.02e-23,0,-7,1e10,3.14159,2.5E+2]",
+                 "[ 1.5e3 , -0.25 , 12345678 , 6.02e-23 , 0 , -7 , 1e10 , 3.14159 , 2.5E+2 ]"):
+        for offset in range(chunk_size):
+            # A leading pad shifts every boundary, so each split point is hit
+            padded = " " * offset + text
+            assert list(iter_json_array(io.StringIO(padded), chunk_size)) == numbers
+
+
+@pytest.mark.parametrize("bad", ["", '{"a": 1}', "[1 2]", "[1,", "[1,]", "[1.5x]"])
+def test_malformed_array_raises(bad):
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO(bad), 2))
+
+
+def test_jsonl_input_matches_array(tmp_path):
+    jsonl_path = tmp_path / "raw.jsonl"
+    jsonl_path.write_text("\n".join(json.dumps(doc) for doc in RAW_DATA) + "\n\n", encoding="utf-8")
+
+    assert detect_format(str(jsonl_path)) == "jsonl"
+    assert detect_format("data/raw_customer_api.json") == "array"
+    assert list(read_raw_documents(str(jsonl_path))) == RAW_DATA
+
+    from_jsonl = execute_transformation_step(str(jsonl_path), str(tmp_path / "a.json"))
+    from_array = execute_transformation_step("data/raw_customer_api.json", str(tmp_path / "b.json"))
+    assert from_jsonl == from_array
+
+
+def test_missing_input_fails_eagerly():
+    with pytest.raises(FileNotFoundError):
+        read_raw_documents("data/does_not_exist.json")
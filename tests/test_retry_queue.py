@@ -0,0 +1,37 @@
+import pytest
+import sys
+import os
+import json
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import DataTransformer
+from retry_queue import RetryQueue
+
+# Load raw data
+with open("data/raw_customer_api.json", "r") as f:
+    RAW_DATA = json.load(f)
+
+
+def test_queue_survives_reopen_and_counts_attempts(tmp_path):
+    transformer = DataTransformer()
+    docs = [d for d in (transformer.process_document(raw)[0] for raw in RAW_DATA[:5]) if d]
+    path = str(tmp_path / "retry.sqlite")
+
+    queue = RetryQueue(path)
+    for doc in docs:
+        queue.push(doc["metadata"]["external_id"], dict(doc, vector=[0.0]), "timeout")
+    queue.push(docs[0]["metadata"]["external_id"], docs[0], "timeout again")
+    queue.close()
+
+    queue = RetryQueue(path)
+    assert len(queue) == len(docs)
+    pending = {doc_id: (doc, attempts) for doc_id, doc, attempts in queue.pending()}
+    first_id = docs[0]["metadata"]["external_id"]
+    assert pending[first_id] == (docs[0], 2)
+    assert all("vector" not in doc for doc, _ in pending.values())
+
+    queue.remove([first_id])
+    assert len(queue) == len(docs) - 1
+    queue.close()
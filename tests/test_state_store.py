@@ -0,0 +1,61 @@
+import pytest
+import sys
+import os
+import json
+import copy
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import DataTransformer
+from state_store import IngestionState, document_fingerprint
+
+# Load raw data
+with open("data/raw_customer_api.json", "r") as f:
+    RAW_DATA = json.load(f)
+
+
+def run(state, raw_docs):
+    """One incremental pass: returns the IDs that were (re)processed."""
+    transformer = DataTransformer()
+    processed = []
+    for doc in state.filter_changed(raw_docs):
+        result, _ = transformer.process_document(doc)
+        if result:
+            state.record(doc)
+            processed.append(result["metadata"]["external_id"])
+    state.commit()
+    return processed
+
+
+def test_unchanged_documents_are_skipped(tmp_path):
+    state = IngestionState(str(tmp_path / "state.sqlite"))
+    assert len(run(state, RAW_DATA)) == len(RAW_DATA)
+    assert state.skipped == 0
+
+    # Second run over the same export: nothing to do
+    state = IngestionState(str(tmp_path / "state.sqlite"))
+    assert run(state, RAW_DATA) == []
+    assert state.skipped == len(RAW_DATA)
+
+    # A new revision of one document is picked up again
+    edited = copy.deepcopy(RAW_DATA)
+    edited[3]["revision"]["revision_id"] = "NEWREVISION"
+    state = IngestionState(str(tmp_path / "state.sqlite"))
+    assert run(state, edited) == [str(edited[3]["_id"])]
+    assert state.skipped == len(RAW_DATA) - 1
+
+
+def test_failed_documents_are_retried(tmp_path):
+    state = IngestionState(str(tmp_path / "state.sqlite"))
+    broken = dict(RAW_DATA[0], website_url=None, canonical_url=None)
+    assert run(state, [broken]) == []
+    assert not state.is_unchanged(broken)
+
+
+def test_fingerprint_falls_back_to_content_hash():
+    doc = {"_id": "A", "content_elements": [{"type": "text", "content": "one"}]}
+    changed = {"_id": "A", "content_elements": [{"type": "text", "content": "two"}]}
+    assert document_fingerprint(doc).startswith("sha256:")
+    assert document_fingerprint(doc) != document_fingerprint(changed)
+    assert document_fingerprint(RAW_DATA[0]).startswith("rev:")
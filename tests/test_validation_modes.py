@@ -0,0 +1,37 @@
+import pytest
+import sys
+import os
+import json
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import DataTransformer
+
+# Load raw data
+with open("data/raw_customer_api.json", "r") as f:
+    RAW_DATA = json.load(f)
+
+
+def test_trusted_output_matches_validated_output():
+    """The fast path must produce exactly what model_dump(exclude_none=True) does, key order included."""
+    validated = [DataTransformer(validate="always").process_document(d) for d in RAW_DATA]
+    trusted = [DataTransformer(validate="off").process_document(d) for d in RAW_DATA]
+
+    assert trusted == validated
+    assert [json.dumps(t[0]) for t in trusted] == [json.dumps(v[0]) for v in validated]
+
+
+def test_sampled_validation_counts():
+    transformer = DataTransformer(validate="sampled", validate_every=10)
+    results = [transformer.process_document(d) for d in RAW_DATA]
+    successes = sum(1 for doc, _ in results if doc)
+
+    stats = transformer.run_stats()
+    assert stats["schema_validated"] == (successes + 9) // 10
+    assert stats["schema_validated"] + stats["schema_trusted"] == successes
+
+
+def test_unknown_validation_mode():
+    with pytest.raises(ValueError):
+        DataTransformer(validate="sometimes")
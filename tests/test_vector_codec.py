@@ -0,0 +1,51 @@
+import pytest
+import sys
+import os
+import json
+import random
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import DataTransformer
+from vector_codec import encode_documents, decode_npz, document_vector, encode_vector_b64, decode_vector_b64
+
+# Load raw data
+with open("data/raw_customer_api.json", "r") as f:
+    RAW_DATA = json.load(f)
+
+
+def embedded_corpus(dims=1536):
+    """Transformed corpus docs with float32-representable random vectors."""
+    rng = random.Random(7)
+    transformer = DataTransformer()
+    docs = [d for d in (transformer.process_document(raw)[0] for raw in RAW_DATA) if d]
+    for doc in docs:
+        doc["vector"] = decode_vector_b64(encode_vector_b64([rng.uniform(-1, 1) for _ in range(dims)]))
+    return docs
+
+
+def test_base64_round_trip_is_smaller_than_json():
+    docs = embedded_corpus()
+    encoded = encode_documents(docs, "base64")
+    assert [document_vector(doc) for doc in encoded] == [doc["vector"] for doc in docs]
+    assert all("vector" not in doc and doc["text"] for doc in encoded)
+    assert len(json.dumps(encoded)) < len(json.dumps(docs)) / 2
+
+
+@pytest.mark.parametrize("ids_only", [False, True])
+def test_npz_round_trip(ids_only):
+    docs = embedded_corpus(dims=64)
+    decoded = decode_npz(encode_documents(docs, "npz", ids_only=ids_only))
+    if ids_only:
+        assert decoded == [{"external_id": d["metadata"]["external_id"], "vector": d["vector"]} for d in docs]
+    else:
+        assert decoded == docs
+
+
+def test_ids_only_json_drops_text():
+    docs = embedded_corpus(dims=8)
+    encoded = encode_documents(docs, "float", ids_only=True)
+    assert encoded[0] == {"external_id": docs[0]["metadata"]["external_id"], "vector": docs[0]["vector"]}
+    with pytest.raises(ValueError):
+        encode_documents(docs, "msgpack")
@@ -0,0 +1,283 @@
+import pytest
+import sys
+import os
+import json
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+from pipeline import DataTransformer
+from embedding_v3 import EmbeddingModel, HashingBackend
+from vectordb_v3 import VectorDatabase, point_id, to_epoch, DEFAULT_INDEXING_THRESHOLD
+
+# Load raw data
+with open("data/raw_customer_api.json", "r") as f:
+    RAW_DATA = json.load(f)
+
+DIMS = 32
+
+# The in-memory client accepts payload indexes but warns they do nothing locally
+pytestmark = pytest.mark.filterwarnings("ignore:Payload indexes have no effect")
+
+
+def embedded_corpus():
+    transformer = DataTransformer()
+    docs = {}
+    for raw in RAW_DATA:
+        doc, _ = transformer.process_document(raw)
+        if doc:
+            docs[doc["metadata"]["external_id"]] = doc
+    docs = list(docs.values())
+    vectors, _ = EmbeddingModel(backend=HashingBackend(dimension=DIMS)).generate_embeddings([d["text"] for d in docs])
+    for doc, vector in zip(docs, vectors):
+        doc["vector"] = vector
+    return docs
+
+
+@pytest.fixture
+def vector_db():
+    db = VectorDatabase("test", client=QdrantClient(":memory:"))
+    yield db
+    db.close()
+
+
+def test_reingest_updates_points_in_place(vector_db):
+    docs = embedded_corpus()
+    vector_db.get_or_create_collection(vector_size=DIMS)
+    vector_db.upsert_documents(docs[:30])
+    vector_db.get_or_create_collection(vector_size=DIMS)  # keeps what is there
+    vector_db.upsert_documents(docs[20:])
+
+    edited = dict(docs[0], text="corrected: " + docs[0]["text"])
+    vector_db.upsert_documents([edited])
+
+    assert vector_db.client.count("test").count == len(docs)
+    point = vector_db.client.retrieve("test", [point_id(docs[0])])[0]
+    assert point.payload["text"].startswith("corrected: ")
+
+
+def test_recreate_drops_and_size_mismatch_is_rejected(vector_db):
+    docs = embedded_corpus()
+    vector_db.get_or_create_collection(vector_size=DIMS)
+    vector_db.upsert_documents(docs)
+
+    with pytest.raises(ValueError):
+        vector_db.get_or_create_collection(vector_size=DIMS * 2)
+
+    vector_db.get_or_create_collection(vector_size=DIMS, recreate=True)
+    assert vector_db.client.count("test").count == 0
+
+
+def test_point_ids_are_stable():
+    doc = {"text": "x", "metadata": {"external_id": "ABC"}}
+    assert point_id(doc) == point_id({"text": "other", "metadata": {"external_id": "ABC"}})
+    assert point_id(doc) != point_id({"text": "x", "metadata": {"external_id": "ABD"}})
+
+
+def test_chunked_parallel_upload_from_a_generator(vector_db):
+    docs = embedded_corpus()
+    vector_db.get_or_create_collection(vector_size=DIMS)
+    report = vector_db.upsert_documents((d for d in docs), batch_size=7, parallel=3, wait=False)
+
+    assert report["points"] == len(docs)
+    assert report["batches"] == len(report["batch_seconds"]) == -(-len(docs) // 7)
+    assert report["total_seconds"] >= report["barrier_seconds"]
+    assert vector_db.client.count("test").count == len(docs)
+
+
+def test_later_version_wins_across_parallel_batches(vector_db, monkeypatch):
+    import time
+    docs = embedded_corpus()[:10]
+    vector_db.get_or_create_collection(vector_size=DIMS)
+    newer = dict(docs[0], text="NEWER " + docs[0]["text"])
+    older_in_batch = dict(docs[1], text="stale")
+
+    upsert = vector_db.client.upsert
+
+    def slow_first_batch(collection_name, points, wait=True):
+        if any(p.payload["text"] == docs[0]["text"] for p in points):
+            time.sleep(0.2)  # the older version's request arrives last
+        return upsert(collection_name, points=points, wait=wait)
+
+    monkeypatch.setattr(vector_db.client, "upsert", slow_first_batch)
+    stream = [docs[0], older_in_batch, docs[1], *docs[2:4], newer, *docs[4:]]
+    report = vector_db.upsert_documents(stream, batch_size=3, parallel=4, wait=False)
+
+    stored = {h.id: h.payload["text"] for h in vector_db.client.scroll("test", limit=20)[0]}
+    assert stored[point_id(docs[0])] == newer["text"]
+    assert stored[point_id(docs[1])] == docs[1]["text"]
+    assert report["points"] == len(stream) - 1
+
+
+def test_bulk_load_reports_index_build(vector_db):
+    docs = embedded_corpus()
+    vector_db.get_or_create_collection(vector_size=DIMS)
+    with vector_db.bulk_load(poll_interval=0.01) as report:
+        vector_db.upsert_documents(docs, batch_size=16, wait=False)
+
+    assert report["points_count"] == len(docs)
+    assert report["index_build_seconds"] >= 0
+
+
+def track_indexing_threshold(vector_db, monkeypatch, initial):
+    """The in-memory client ignores optimizer updates: keep the threshold here instead."""
+    client = vector_db.client
+    state = {"threshold": initial, "updates": []}
+    get_collection, update_collection = client.get_collection, client.update_collection
+
+    def tracked_get(name):
+        info = get_collection(name)
+        info.config.optimizer_config.indexing_threshold = state["threshold"]
+        return info
+
+    def tracked_update(collection_name, optimizers_config=None, **kwargs):
+        if optimizers_config is not None and optimizers_config.indexing_threshold is not None:
+            state["threshold"] = optimizers_config.indexing_threshold
+            state["updates"].append(optimizers_config.indexing_threshold)
+        return update_collection(collection_name, optimizers_config=optimizers_config, **kwargs)
+
+    monkeypatch.setattr(client, "get_collection", tracked_get)
+    monkeypatch.setattr(client, "update_collection", tracked_update)
+    return state
+
+
+def test_overlapping_bulk_loads_restore_indexing_once(vector_db, monkeypatch):
+    vector_db.get_or_create_collection(vector_size=DIMS)
+    state = track_indexing_threshold(vector_db, monkeypatch, initial=10000)
+
+    with vector_db.bulk_load(poll_interval=0.01) as first:
+        with vector_db.bulk_load(poll_interval=0.01) as second:
+            assert state["threshold"] == 0
+        assert state["threshold"] == 0  # the first load is still running
+    assert second["deferred"] and "deferred" not in first
+    assert state["threshold"] == 10000
+    assert state["updates"] == [0, 10000]
+
+
+def test_failed_bulk_load_start_does_not_count_as_running(vector_db, monkeypatch):
+    with pytest.raises(Exception, match="not found"):
+        vector_db.begin_bulk_load()  # no collection yet
+    vector_db.get_or_create_collection(vector_size=DIMS)
+    state = track_indexing_threshold(vector_db, monkeypatch, initial=10000)
+
+    with vector_db.bulk_load(poll_interval=0.01) as report:
+        assert state["threshold"] == 0
+    assert "deferred" not in report and state["threshold"] == 10000
+
+
+def test_bulk_load_after_a_crashed_one_turns_indexing_back_on(vector_db, monkeypatch):
+    vector_db.get_or_create_collection(vector_size=DIMS)
+    state = track_indexing_threshold(vector_db, monkeypatch, initial=0)  # left paused by a dead process
+
+    with vector_db.bulk_load(poll_interval=0.01):
+        pass
+    assert state["threshold"] == DEFAULT_INDEXING_THRESHOLD
+
+
+@pytest.mark.skipif(not os.getenv("QDRANT_TEST_URL"), reason="set QDRANT_TEST_URL to run against a Qdrant server")
+def test_bulk_load_against_server():
+    """Indexing is really paused during the load and rebuilt afterwards (local Qdrant, e.g. docker)."""
+    db = VectorDatabase("bulk_load_test", client=QdrantClient(url=os.getenv("QDRANT_TEST_URL")))
+    docs = embedded_corpus()
+    try:
+        db.get_or_create_collection(vector_size=DIMS, recreate=True)
+        with db.bulk_load(poll_interval=0.1) as report:
+            assert db.client.get_collection("bulk_load_test").config.optimizer_config.indexing_threshold == 0
+            db.upsert_documents(docs, batch_size=16, parallel=2, wait=False)
+        info = db.client.get_collection("bulk_load_test")
+        assert info.status == models.CollectionStatus.GREEN
+        assert info.config.optimizer_config.indexing_threshold > 0
+        assert report["points_count"] == len(docs)
+    finally:
+        db.client.delete_collection("bulk_load_test")
+        db.close()
+
+
+def test_filtered_search_runs_inside_qdrant(vector_db):
+    docs = embedded_corpus()
+    vector_db.get_or_create_collection(vector_size=DIMS)
+    vector_db.upsert_documents(docs)
+
+    section = docs[-1]["metadata"]["sections"][0]
+    matching = {d["metadata"]["external_id"] for d in docs if section in d["metadata"]["sections"]}
+    hits = vector_db.search(docs[0]["vector"], limit=len(docs), sections=section)
+    assert {h["metadata"]["external_id"] for h in hits} == matching
+
+    website = docs[0]["metadata"]["website"]
+    hits = vector_db.search(docs[0]["vector"], limit=3, website=[website, "elsewhere"], sections=[section])
+    assert all(h["metadata"]["website"] == website and section in h["metadata"]["sections"] for h in hits)
+
+    assert vector_db.search(docs[0]["vector"], limit=3, tags="no-such-tag") == []
+    assert VectorDatabase.metadata_filter() is None
+
+
+def test_time_window_search_uses_epoch_fields(vector_db):
+    docs = embedded_corpus()
+    vector_db.get_or_create_collection(vector_size=DIMS)
+    vector_db.upsert_documents(docs)
+
+    stamps = sorted(to_epoch(d["metadata"]["datetime"]) for d in docs)
+    since, until = stamps[len(stamps) // 2], stamps[-5]
+    hits = vector_db.search(docs[0]["vector"], limit=len(docs), since=since, until=until)
+    assert sorted(h["metadata"]["datetime_ts"] for h in hits) == [s for s in stamps if since <= s <= until]
+
+    iso = docs[0]["metadata"]["datetime"]
+    hits = vector_db.search(docs[0]["vector"], limit=len(docs), since=iso)
+    assert hits and all(h["metadata"]["datetime_ts"] >= to_epoch(iso) for h in hits)
+    assert vector_db.search(docs[0]["vector"], limit=3, since="1h") == []
+    with pytest.raises(ValueError):
+        VectorDatabase.metadata_filter(since="yesterday-ish")
+
+
+def test_to_epoch_formats():
+    assert to_epoch("2025-07-02T00:00:00Z") == to_epoch("2025-07-02T00:00:00") == 1751414400
+    assert to_epoch("2025-07-02T05:18:20.88Z") == 1751433500
+    assert to_epoch(1751414400) == to_epoch("1751414400") == 1751414400
+    assert to_epoch("7d", now=1751414400) == 1751414400 - 7 * 86400
+    assert to_epoch(None) is None and to_epoch("not a date") is None
+
+
+def test_points_indexed_before_timestamps_are_backfilled(vector_db):
+    docs = embedded_corpus()
+    vector_db.get_or_create_collection(vector_size=DIMS)
+    vector_db.upsert_documents(docs)
+    # Points as an older version stored them: no *_ts fields
+    vector_db.client.delete_payload(
+        "test", keys=["metadata.datetime_ts", "metadata.publish_date_ts"],
+        points=models.Filter(must=[]))
+    assert vector_db.search(docs[0]["vector"], limit=3, since=0) == []
+
+    # A fresh process opens the existing collection and adds the missing indexes
+    reopened = VectorDatabase("test", client=vector_db.client)
+    reopened.get_or_create_collection(vector_size=DIMS)
+    hits = reopened.search(docs[0]["vector"], limit=len(docs), since=0)
+    assert len(hits) == len(docs)
+    assert all(h["metadata"]["datetime_ts"] == to_epoch(h["metadata"]["datetime"]) for h in hits)
+    assert reopened.backfill_timestamps() == 0
+
+    # Later instances see nothing to backfill and skip the full scroll
+    assert not reopened.needs_timestamp_backfill()
+    again = VectorDatabase("test", client=vector_db.client)
+    again.backfill_timestamps = lambda: pytest.fail("backfill scroll repeated")
+    again.get_or_create_collection(vector_size=DIMS)
+
+
+def test_collection_dropped_outside_the_app_is_recreated(vector_db):
+    docs = embedded_corpus()
+    vector_db.get_or_create_collection(vector_size=DIMS)
+    vector_db.upsert_documents(docs[:5])
+    vector_db.client.delete_collection("test")  # e.g. by an operator
+
+    with pytest.raises(Exception, match="not found"):
+        vector_db.upsert_documents(docs[:5])
+    assert not vector_db.collection_exists()
+    vector_db.get_or_create_collection(vector_size=DIMS)
+    assert vector_db.upsert_documents(docs[:5])["points"] == 5
+
+    # A stale positive answer is also corrected by an uncached check
+    vector_db.client.delete_collection("test")
+    assert vector_db.collection_exists() and not vector_db.collection_exists(cached=False)
+    vector_db.get_or_create_collection(vector_size=DIMS)
+    assert vector_db.client.count("test").count == 0
@@ -0,0 +1,104 @@
+"""
+Compact encodings for handing vectors between /pipeline/embed and
+/pipeline/index.
+
+A 1536-dim vector as a JSON list of floats is ~30 KB of text that has to
+be formatted on one side and parsed again on the other. The same vector as
+little-endian float32 is 6 KB raw / 8 KB in base64 (the layout the OpenAI
+API uses for encoding_format="base64"), and decoding it is a memcpy.
+
+- "float":  vector as a JSON list (the original format)
+- "base64": vector as "vector_b64", base64 of little-endian float32
+- "npz":    binary numpy .npz body: `external_id` (str), `vectors`
+            (float32, n x dims) and, unless ids_only, `documents` (UTF-8
+            JSON array of the documents without their vectors)
+"""
+import io
+import sys
+import json
+import array
+import base64
+from typing import Any, Dict, List, Sequence
+
+VECTOR_FORMATS = ("float", "base64", "npz")
+NPZ_MEDIA_TYPE = "application/x-npz"
+
+
+def encode_vector_b64(vector: Sequence[float]) -> str:
+    packed = array.array("f", vector)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return base64.b64encode(packed.tobytes()).decode("ascii")
+
+
+def decode_vector_b64(data: str) -> List[float]:
+    vector = array.array("f")
+    vector.frombytes(base64.b64decode(data))
+    if sys.byteorder == "big":
+        vector.byteswap()
+    return vector.tolist()
+
+
+def document_vector(doc: Dict[str, Any]):
+    """The vector of an embedded document in either JSON format, or None."""
+    if doc.get("vector_b64"):
+        return decode_vector_b64(doc["vector_b64"])
+    return doc.get("vector") or doc.get("embedding")
+
+
+def _external_id(doc: Dict[str, Any]) -> str:
+    return str(doc.get("metadata", {}).get("external_id", ""))
+
+
+def encode_documents(docs: List[Dict[str, Any]], vector_format: str = "float", ids_only: bool = False):
+    """
+    Embedded documents (with "vector") in the requested format: a list of
+    dicts for the JSON formats, bytes for "npz". ids_only drops the text
+    and metadata and keeps only external_id next to the vector (not
+    indexable: /pipeline/index needs the text for the point payload).
+    """
+    if vector_format not in VECTOR_FORMATS:
+        raise ValueError(f"Unknown vector format '{vector_format}'. Choose from: {', '.join(VECTOR_FORMATS)}")
+    if vector_format == "npz":
+        return _pack_npz(docs, ids_only)
+
+    encoded = []
+    for doc in docs:
+        out = {"external_id": _external_id(doc)} if ids_only else {k: v for k, v in doc.items() if k != "vector"}
+        if vector_format == "base64":
+            out["vector_b64"] = encode_vector_b64(doc["vector"])
+        else:
+            out["vector"] = doc["vector"]
+        encoded.append(out)
+    return encoded
+
+
+def _pack_npz(docs: List[Dict[str, Any]], ids_only: bool) -> bytes:
+    import numpy as np
+
+    arrays = {
+        "external_id": np.array([_external_id(doc) for doc in docs], dtype=str),
+        "vectors": np.array([doc["vector"] for doc in docs], dtype="<f4").reshape(len(docs), -1),
+    }
+    if not ids_only:
+        payload = json.dumps([{k: v for k, v in doc.items() if k != "vector"} for doc in docs], ensure_ascii=False)
+        arrays["documents"] = np.frombuffer(payload.encode("utf-8"), dtype=np.uint8)
+    buf = io.BytesIO()
+    np.savez(buf, **arrays)
+    return buf.getvalue()
+
+
+def decode_npz(body: bytes) -> List[Dict[str, Any]]:
+    """Documents with "vector" lists back from an npz body; ids-only bodies give {external_id, vector}."""
+    import numpy as np
+
+    with np.load(io.BytesIO(body), allow_pickle=False) as npz:
+        ids = npz["external_id"].tolist()
+        vectors = npz["vectors"].astype(np.float32).tolist()
+        if "documents" in npz.files:
+            docs = json.loads(npz["documents"].tobytes().decode("utf-8"))
+        else:
+            docs = [{"external_id": ext_id} for ext_id in ids]
+    for doc, vector in zip(docs, vectors):
+        doc["vector"] = vector
+    return docs
@@ -1,30 +1,155 @@
 import os
+import time
+import uuid
 import logging
-from typing import List, Dict, Any
+import threading
+from datetime import datetime, timezone
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import List, Dict, Any, Iterable, Iterator, Optional
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
 
 # Configure Logging
 logger = logging.getLogger("CapitolPipeline")
 
+# Keyword payload indexes, so metadata filters are applied inside the HNSW search
+KEYWORD_INDEX_FIELDS = ("metadata.website", "metadata.sections", "metadata.categories", "metadata.tags")
+
+# Qdrant's default indexing_threshold; what a bulk load restores when the live value is 0
+DEFAULT_INDEXING_THRESHOLD = 20000
+
+# ISO date fields also stored as epoch seconds ("<field>_ts") with range indexes
+TIMESTAMP_FIELDS = ("datetime", "publish_date")
+TIME_FILTER_FIELD = "metadata.datetime_ts"
+_RELATIVE_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def to_epoch(value, now: float = None) -> Optional[int]:
+    """
+    Epoch seconds from an int/float, a datetime, an ISO 8601 string (naive
+    means UTC) or a relative age like "24h" / "7d" (that long before now).
+    None for None or an unparseable value.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, datetime):
+        return int((value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp())
+    text = str(value).strip()
+    if text.isdigit():
+        return int(text)
+    if text[:-1].isdigit() and text[-1:] in _RELATIVE_UNITS:
+        return int((time.time() if now is None else now) - int(text[:-1]) * _RELATIVE_UNITS[text[-1]])
+    try:
+        return to_epoch(datetime.fromisoformat(text.replace("Z", "+00:00")))
+    except ValueError:
+        return None
+
+
+def _is_not_found(error: Exception) -> bool:
+    """Qdrant's "collection not found": a 404 over HTTP, a NOT_FOUND / ValueError message otherwise."""
+    return getattr(error, "status_code", None) == 404 or "not found" in str(error).lower()
+
+
+# Point IDs are UUIDv5(namespace, external_id): the same article always maps to the same point
+POINT_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "capitol-pipeline/external_id")
+
+
+def point_id(doc: Dict[str, Any]) -> str:
+    """Stable point ID from metadata.external_id (from the text when a doc has none)."""
+    external_id = (doc.get("metadata") or {}).get("external_id")
+    key = f"external_id:{external_id}" if external_id else f"text:{doc.get('text', '')}"
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, key))
+
+
 class VectorDatabase:
-    def __init__(self, collection_name: str):
+    def __init__(self, collection_name: str, client: QdrantClient = None):
         self.collection_name = collection_name
         
-        # 1. Connect
+        # 1. Connect (or reuse a given client, e.g. QdrantClient(":memory:") offline)
         self.host = "localhost"
         self.api_key = os.getenv("QDRANT_API_KEY")
         
-        self.client = QdrantClient(host="localhost", port=6333)
-        logger.info(f"✅ Connected to Qdrant at {self.host}")
-
+        self.client = client or QdrantClient(host="localhost", port=6333)
+        # Collections known to exist; only positive answers are cached
+        self._existing = set()
+        self._checked_size = None
+        # Bulk loads in progress through this instance; only the last one to end re-enables indexing
+        self._bulk_lock = threading.Lock()
+        self._bulk_loads = 0
+        self._restore_threshold = DEFAULT_INDEXING_THRESHOLD
+        logger.info(f"✅ Connected to Qdrant at {self.host if client is None else 'the given client'}")
 
-    def get_or_create_collection(self, vector_size: int = 1536):
+    def collection_exists(self, cached: bool = True) -> bool:
         """
-        Recreates collection to ensure fresh state.
+        Cached: asks Qdrant only until the collection has been seen once.
+        cached=False always asks (and updates the cache with the answer).
         """
+        if cached and self.collection_name in self._existing:
+            return True
         if self.client.collection_exists(self.collection_name):
+            self._existing.add(self.collection_name)
+            return True
+        self._forget_collection()
+        return False
+
+    def _forget_collection(self):
+        self._existing.discard(self.collection_name)
+        self._checked_size = None
+
+    @contextmanager
+    def _forget_if_missing(self):
+        """Drops the cached "exists" answer when Qdrant says the collection is gone (dropped behind our back)."""
+        try:
+            yield
+        except Exception as e:
+            if _is_not_found(e):
+                logger.warning(f"Collection '{self.collection_name}' not found; it will be re-checked")
+                self._forget_collection()
+            raise
+
+    def close(self):
+        self.client.close()
+
+
+    def get_or_create_collection(self, vector_size: int = 1536, recreate: bool = False):
+        """
+        Creates the collection if it is missing and otherwise keeps it, so an
+        index call only costs its own batch (points are updated in place by
+        their external_id-based IDs). recreate=True drops and rebuilds it.
+        """
+        if recreate and self.collection_exists():
             self.client.delete_collection(self.collection_name)
+            self._forget_collection()
+
+        if self.collection_exists():
+            if self._checked_size != vector_size:
+                try:
+                    info = self.client.get_collection(self.collection_name)
+                except Exception as e:
+                    if not _is_not_found(e):
+                        raise
+                    # Cached as existing but dropped since: create it below
+                    self._forget_collection()
+                    return self.get_or_create_collection(vector_size)
+                existing_size = info.config.params.vectors.size
+                if existing_size != vector_size:
+                    raise ValueError(
+                        f"Collection '{self.collection_name}' holds {existing_size}-dim vectors, got {vector_size}; "
+                        "re-index with recreate=True to switch models"
+                    )
+                # Collections created before the indexes existed get them now, and
+                # points indexed before the *_ts fields existed get those filled in
+                created = self.ensure_payload_indexes(existing=info.payload_schema)
+                # (local mode reports no payload schema, so the cheap check decides)
+                if any(field.endswith("_ts") for field in created) and self.needs_timestamp_backfill():
+                    self.backfill_timestamps()
+                self._checked_size = vector_size
+            return
 
         self.client.create_collection(
             collection_name=self.collection_name,
@@ -33,14 +158,96 @@ class VectorDatabase:
                 distance=models.Distance.COSINE,
             ),
         )
-        logger.info(f"Created/Reset collection '{self.collection_name}'")
+        self._existing.add(self.collection_name)
+        self._checked_size = vector_size
+        self.ensure_payload_indexes()
+        logger.info(f"Created collection '{self.collection_name}'")
 
-    def upsert_documents(self, docs: List[Dict[str, Any]]):
+    def ensure_payload_indexes(self, existing: Dict[str, Any] = None) -> List[str]:
         """
-        Uploads documents to Qdrant.
+        Creates the keyword (KEYWORD_INDEX_FIELDS) and timestamp range indexes
+        the collection doesn't have yet. Returns the fields it indexed.
         """
-        points = []
-        for i, doc in enumerate(docs):
+        existing = existing or {}
+        created = []
+        for field in KEYWORD_INDEX_FIELDS:
+            if field not in existing:
+                self.client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field,
+                    field_schema=models.PayloadSchemaType.KEYWORD,
+                )
+                created.append(field)
+        for field in TIMESTAMP_FIELDS:
+            if f"metadata.{field}_ts" not in existing:
+                # Range-only integer index: time windows, no exact-match lookups
+                self.client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=f"metadata.{field}_ts",
+                    field_schema=models.IntegerIndexParams(type=models.IntegerIndexType.INTEGER,
+                                                           lookup=False, range=True),
+                )
+                created.append(f"metadata.{field}_ts")
+        return created
+
+    @staticmethod
+    def _missing_timestamps_filter() -> models.Filter:
+        """Points that have a date field but not its *_ts twin."""
+        return models.Filter(should=[
+            models.Filter(
+                must=[models.IsEmptyCondition(is_empty=models.PayloadField(key=f"metadata.{field}_ts"))],
+                must_not=[models.IsEmptyCondition(is_empty=models.PayloadField(key=f"metadata.{field}"))],
+            )
+            for field in TIMESTAMP_FIELDS
+        ])
+
+    def needs_timestamp_backfill(self) -> bool:
+        """One limit=1 scroll: does any point still lack a *_ts field it could have?"""
+        points, _ = self.client.scroll(collection_name=self.collection_name, limit=1,
+                                       scroll_filter=self._missing_timestamps_filter(),
+                                       with_payload=False, with_vectors=False)
+        return bool(points)
+
+    def backfill_timestamps(self, batch_size: int = 1000) -> int:
+        """
+        Adds the epoch-second *_ts fields to points stored without them (indexed
+        before since / until existed), one batched set_payload per scroll page,
+        so time-window searches don't silently skip them. Only points missing
+        a field are scrolled. Safe to re-run; returns how many were updated.
+        """
+        updated = 0
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=self._missing_timestamps_filter(),
+                limit=batch_size,
+                offset=offset,
+                with_payload=models.PayloadSelectorInclude(include=["metadata"]),
+                with_vectors=False,
+            )
+            operations = []
+            for point in points:
+                metadata = (point.payload or {}).get("metadata") or {}
+                missing = {f"{field}_ts": to_epoch(metadata.get(field)) for field in TIMESTAMP_FIELDS
+                           if f"{field}_ts" not in metadata}
+                missing = {k: v for k, v in missing.items() if v is not None}
+                if missing:
+                    operations.append(models.SetPayloadOperation(
+                        set_payload=models.SetPayload(payload=missing, points=[point.id], key="metadata")))
+            if operations:
+                self.client.batch_update_points(collection_name=self.collection_name,
+                                                update_operations=operations)
+                updated += len(operations)
+            if offset is None:
+                break
+        if updated:
+            logger.info(f"🕒 Backfilled timestamp fields on {updated} points in '{self.collection_name}'")
+        return updated
+
+    @staticmethod
+    def _points(docs: Iterable[Dict[str, Any]]) -> Iterator[models.PointStruct]:
+        for doc in docs:
             vector = doc.get("vector") or doc.get("embedding")
             text = doc.get("text")
             metadata = doc.get("metadata", {})
@@ -50,38 +257,226 @@ class VectorDatabase:
 
             # --- CRITICAL FIX: Keep Structure Intact ---
             # We store 'metadata' as a nested object, exactly like your input JSON.
+            # ISO dates also go in as epoch seconds for range filters (since / until).
+            timestamps = {f"{field}_ts": to_epoch(metadata.get(field)) for field in TIMESTAMP_FIELDS}
             payload = {
                 "text": text,
-                "metadata": metadata
+                "metadata": {**metadata, **{k: v for k, v in timestamps.items() if v is not None}}
             }
             
-            point = models.PointStruct(
-                id=i, 
+            yield models.PointStruct(
+                id=point_id(doc),
                 vector=vector,
                 payload=payload
             )
-            points.append(point)
 
-        if points:
-            self.client.upsert(
-                collection_name=self.collection_name, 
-                points=points
-            )
-            logger.info(f"✅ Uploaded {len(points)} points to collection '{self.collection_name}'")
+    def upsert_documents(self, docs: Iterable[Dict[str, Any]], batch_size: int = 256, parallel: int = 1,
+                         wait: bool = True) -> Dict[str, Any]:
+        """
+        Uploads documents to Qdrant. Point IDs come from point_id(doc), so
+        re-ingesting an article overwrites its existing point.
+
+        docs can be any iterable: points are built lazily and sent in
+        batches of batch_size with up to `parallel` requests in flight, so
+        memory holds a few batches rather than the whole upload. With
+        wait=False Qdrant acknowledges each batch once queued and a single
+        wait=True request at the end acts as the consistency barrier
+        (updates are applied in order, so it returns once all are).
+        A later version of a document wins: duplicates within a batch are
+        collapsed to the last one, and a batch repeating an ID that is still
+        in flight is sent only after that batch is acknowledged.
+        Returns timings: per-batch seconds, barrier and total.
+        """
+        report = {"points": 0, "batches": 0, "batch_seconds": [], "barrier_seconds": 0.0}
+        start = time.perf_counter()
+
+        def send(batch):
+            t0 = time.perf_counter()
+            self.client.upsert(collection_name=self.collection_name, points=batch, wait=wait)
+            return len(batch), time.perf_counter() - t0
+
+        def record(future):
+            count, seconds = future.result()
+            report["points"] += count
+            report["batches"] += 1
+            report["batch_seconds"].append(round(seconds, 4))
+            logger.debug(f"Upserted batch of {count} points in {seconds:.3f}s")
+
+        last_point = None
+        with self._forget_if_missing(), ThreadPoolExecutor(max_workers=max(1, parallel)) as pool:
+            in_flight = deque()  # (future, point IDs in that batch)
+            points = self._points(docs)
+            while True:
+                # Same ID twice in one batch: keep the last occurrence
+                batch = list({p.id: p for p in islice(points, batch_size)}.values())
+                if not batch:
+                    break
+                last_point = batch[-1]
+                # Concurrent batches may be applied in any order, so a batch that
+                # repeats an ID still in flight waits until those are acknowledged
+                ids = {p.id for p in batch}
+                if any(ids & pending for _, pending in in_flight):
+                    while in_flight:
+                        record(in_flight.popleft()[0])
+                # At most `parallel` batches in flight, so memory stays bounded
+                if len(in_flight) >= max(1, parallel):
+                    record(in_flight.popleft()[0])
+                in_flight.append((pool.submit(send, batch), ids))
+            while in_flight:
+                record(in_flight.popleft()[0])
+
+        if last_point is not None and not wait:
+            t0 = time.perf_counter()
+            # Idempotent re-write of the last point, acknowledged only once applied
+            with self._forget_if_missing():
+                self.client.upsert(collection_name=self.collection_name, points=[last_point], wait=True)
+            report["barrier_seconds"] = round(time.perf_counter() - t0, 4)
+
+        report["total_seconds"] = round(time.perf_counter() - start, 4)
+        if report["points"]:
+            report["points_per_second"] = round(report["points"] / max(report["total_seconds"], 1e-9), 1)
+            logger.info(f"✅ Uploaded {report['points']} points to collection '{self.collection_name}' "
+                        f"in {report['batches']} batches ({report['total_seconds']:.2f}s)")
+        return report
+
+    def begin_bulk_load(self) -> int:
+        """
+        Turns HNSW indexing off (indexing_threshold=0) so a backfill only
+        appends to segments. Returns the threshold to restore afterwards.
+
+        Overlapping loads share one pause: only the first reads the live
+        threshold. A live value of 0 (a load in another process, or one that
+        crashed) is not worth restoring, so DEFAULT_INDEXING_THRESHOLD is used.
+        """
+        with self._bulk_lock:
+            self._bulk_loads += 1
+            if self._bulk_loads > 1:
+                return self._restore_threshold
+            try:
+                with self._forget_if_missing():
+                    info = self.client.get_collection(self.collection_name)
+                previous = info.config.optimizer_config.indexing_threshold
+                self._restore_threshold = previous or DEFAULT_INDEXING_THRESHOLD
+                self.client.update_collection(
+                    collection_name=self.collection_name,
+                    optimizers_config=models.OptimizersConfigDiff(indexing_threshold=0),
+                )
+            except Exception:
+                # Not paused, so no end_bulk_load will come for this one
+                self._bulk_loads -= 1
+                raise
+        logger.info(f"⏸️ Indexing paused on '{self.collection_name}' for bulk load")
+        return self._restore_threshold
 
-    def search(self, query_vector: List[float], limit: int = 3):
+    def end_bulk_load(self, indexing_threshold: int = None, timeout: float = 3600.0,
+                      poll_interval: float = 0.5) -> Dict[str, Any]:
+        """
+        Switches indexing back on (to indexing_threshold, or Qdrant's default
+        when None or 0) and waits until the collection reports green, i.e. the
+        optimizer has finished building the index. Returns how long that took.
+        While other bulk loads through this instance are still running,
+        indexing stays off and the report has "deferred": True instead.
+        """
+        start = time.perf_counter()
+        with self._bulk_lock:
+            self._bulk_loads = max(0, self._bulk_loads - 1)
+            still_loading = self._bulk_loads
+            if not still_loading:
+                self.client.update_collection(
+                    collection_name=self.collection_name,
+                    optimizers_config=models.OptimizersConfigDiff(
+                        indexing_threshold=indexing_threshold or DEFAULT_INDEXING_THRESHOLD),
+                )
+        if still_loading:
+            info = self.client.get_collection(self.collection_name)
+            logger.info(f"⏸️ {still_loading} other bulk load(s) still running on '{self.collection_name}'; "
+                        f"the last one rebuilds the index")
+            return {"index_build_seconds": 0.0, "deferred": True, "points_count": info.points_count,
+                    "indexed_vectors_count": info.indexed_vectors_count}
+        while True:
+            info = self.client.get_collection(self.collection_name)
+            if info.status == models.CollectionStatus.GREEN:
+                break
+            if info.status == models.CollectionStatus.GREY:
+                # Optimizations pending but not started: an empty config update kicks them off
+                self.client.update_collection(collection_name=self.collection_name,
+                                              optimizers_config=models.OptimizersConfigDiff())
+            elif info.status == models.CollectionStatus.RED:
+                raise RuntimeError(f"Collection '{self.collection_name}' turned red while indexing")
+            if time.perf_counter() - start > timeout:
+                raise TimeoutError(f"Collection '{self.collection_name}' still {info.status} after {timeout:.0f}s")
+            time.sleep(poll_interval)
+
+        report = {
+            "index_build_seconds": round(time.perf_counter() - start, 3),
+            "points_count": info.points_count,
+            "indexed_vectors_count": info.indexed_vectors_count,
+        }
+        logger.info(f"▶️ Index on '{self.collection_name}' rebuilt in {report['index_build_seconds']:.2f}s "
+                    f"({info.indexed_vectors_count} vectors indexed)")
+        return report
+
+    @contextmanager
+    def bulk_load(self, **kwargs):
+        """
+        with vector_db.bulk_load() as report: upload...
+        Indexing is off inside the block; on exit it is restored and the
+        index build is awaited, with its timing added to `report`.
+        """
+        report: Dict[str, Any] = {}
+        previous = self.begin_bulk_load()
+        try:
+            yield report
+        finally:
+            report.update(self.end_bulk_load(previous, **kwargs))
+
+    @staticmethod
+    def metadata_filter(website=None, sections=None, categories=None, tags=None,
+                        since=None, until=None) -> Optional[models.Filter]:
+        """
+        Qdrant filter over the indexed metadata fields. Each keyword argument
+        is a value or a list of values (match any); different fields must all
+        match. since / until bound metadata.datetime (inclusive), in any form
+        to_epoch() accepts.
+        """
+        conditions = []
+        since_ts, until_ts = to_epoch(since), to_epoch(until)
+        if since not in (None, "") and since_ts is None or until not in (None, "") and until_ts is None:
+            raise ValueError("since / until must be epoch seconds, an ISO 8601 date or an age like '24h'")
+        if since_ts is not None or until_ts is not None:
+            conditions.append(models.FieldCondition(key=TIME_FILTER_FIELD,
+                                                    range=models.Range(gte=since_ts, lte=until_ts)))
+        for field, values in (("website", website), ("sections", sections),
+                              ("categories", categories), ("tags", tags)):
+            if values is None or values == []:
+                continue
+            values = [values] if isinstance(values, str) else list(values)
+            conditions.append(models.FieldCondition(key=f"metadata.{field}", match=models.MatchAny(any=values)))
+        return models.Filter(must=conditions) if conditions else None
+
+    def search(self, query_vector: List[float], limit: int = 3, website=None, sections=None,
+               categories=None, tags=None, since=None, until=None):
         """
         Searches and returns the FULL document structure.
+        website / sections / categories / tags and the since / until time
+        window restrict the search inside Qdrant (see metadata_filter), so
+        `limit` hits come back even when few documents match.
         """
-        if not self.client.collection_exists(self.collection_name):
+        if not self.collection_exists():
             logger.warning("Collection does not exist.")
             return []
 
-        results = self.client.query_points(
-            collection_name=self.collection_name,
-            query=query_vector,
-            limit=limit,
-        )
+        try:
+            results = self.client.query_points(
+                collection_name=self.collection_name,
+                query=query_vector,
+                query_filter=self.metadata_filter(website, sections, categories, tags, since, until),
+                limit=limit,
+            )
+        except Exception:
+            # e.g. dropped behind our back: check again next time
+            self._forget_collection()
+            raise
         
         hits = results.points or []
         formatted_results = []